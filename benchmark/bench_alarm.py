@@ -0,0 +1,249 @@
+"""
+报警链路压测 (完全离线)：本地替身服务器 + 真实的 FeishuNotifier / AliyunNotifier / Communication
+
+用法:
+    python -m benchmark.bench_alarm --incidents 50 --latency 0.05 --jitter 0.02
+    python -m benchmark.bench_alarm --error-rate 0.05 --throttle-rps 20 --json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import math
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import config
+from benchmark.mock_server import MockServer
+from core.communication.aliyun import AliyunNotifier
+from core.communication.communication import Communication
+from core.communication.feishu import FeishuNotifier
+from utils import metrics
+from utils.logger import configure_logging
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_IMAGE = PROJECT_ROOT / "test" / "test_imgs" / "test1.jpg"
+
+
+def percentile(values, q):
+    """最近秩分位数 (q: 0 ~ 100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(samples):
+    """耗时样本 (秒) -> 毫秒统计"""
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+def bench_policy(ack_timeout, poll_interval):
+    """压测用的升级策略：阶段与 config.ESCALATION_POLICY 相同，只把时间缩短"""
+    base = config.ESCALATION_POLICY
+    last_after = max(stage.get("after", 0) for stage in base["stages"]) or 1
+    stages = [dict(stage, after=stage.get("after", 0) * ack_timeout / last_after) for stage in base["stages"]]
+    return dict(base, poll_interval=poll_interval, fallback_poll_interval=poll_interval,
+                ack_timeout=ack_timeout, stages=stages)
+
+
+@contextlib.contextmanager
+def mock_environment(server, admins=3, sms_phones=5):
+    """生成指向替身服务器的临时 .env，并让 config.get_env() 使用它；退出时恢复"""
+    workdir = Path(tempfile.mkdtemp(prefix="fire_bench_"))
+    lines = [
+        f"cache_dir={workdir / 'cache'}",
+        f"feishu_app_id=cli_bench_{server.port}",
+        "feishu_app_secret=bench",
+        "feishu_group_chat_id=oc_bench_group",
+        f"feishu_api_base={server.feishu_api_base}",
+        "ALI_ACCESS_KEY_ID=bench",
+        "ALI_ACCESS_KEY_SECRET=bench",
+        "ALI_SMS_SIGN_NAME=bench",
+        "ALI_SMS_TEMPLATE_CODE=SMS_BENCH",
+        f"ALI_SMS_ENDPOINT={server.aliyun_endpoint}",
+        "ALI_SMS_PROTOCOL=http",
+        "ALI_VOICE_TTS_CODE=TTS_BENCH",
+        f"ALI_VOICE_ENDPOINT={server.aliyun_endpoint}",
+    ]
+    lines += [f"admin_phone{i}=+86139{i:08d}" for i in range(1, admins + 1)]
+    lines += [f"sms_phone{i}=138{i:08d}" for i in range(1, sms_phones + 1)]
+    env_path = workdir / ".env"
+    env_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    previous = config.set_env_config(config.EnvConfig(env_path))
+    try:
+        yield workdir
+    finally:
+        config.set_env_config(previous)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def make_images(workdir, count):
+    """每个报警一张内容不同的截图 (避免 image_key 缓存让上传耗时失真)"""
+    data = SAMPLE_IMAGE.read_bytes()
+    paths = []
+    for i in range(count):
+        path = Path(workdir) / f"fire_{i}.jpg"
+        path.write_bytes(data + i.to_bytes(4, "big"))
+        paths.append(str(path))
+    return paths
+
+
+def _timed(fn, *args, **kwargs):
+    begin = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - begin
+
+
+def bench_feishu(notifier, images):
+    """逐条发送群卡片 (带图) 并检查一次回复"""
+    send, poll, failed = [], [], 0
+    begin = time.perf_counter()
+    for image in images:
+        msg_id, elapsed = _timed(notifier.send_card_to_group, "压测", "benchmark", image)
+        send.append(elapsed)
+        failed += not msg_id
+        _, elapsed = _timed(notifier.check_chat_reply, time.time(), incident_id=f"bench-{image}")
+        notifier.release_reply_cursor(f"bench-{image}")
+        poll.append(elapsed)
+    total = time.perf_counter() - begin
+    return {"send_card": latency_summary(send), "check_reply": latency_summary(poll), "failed": failed,
+            "throughput_per_s": round(len(images) / total, 2) if total else None}
+
+
+def bench_aliyun(aliyun, rounds):
+    samples, failed = [], 0
+    begin = time.perf_counter()
+    for _ in range(rounds):
+        ok, elapsed = _timed(aliyun.send_sms_to_all, {"time": time.strftime("%H:%M")})
+        samples.append(elapsed)
+        failed += not ok
+    total = time.perf_counter() - begin
+    return {"send_sms_to_all": latency_summary(samples), "failed": failed,
+            "throughput_per_s": round(rounds / total, 2) if total else None}
+
+
+def bench_escalation(communication, images, timeout):
+    """同时发起多个报警，统计首次通知 / 确认耗时"""
+    begin = time.perf_counter()
+    states = [communication.start_fire_alarm(image) for image in images]
+    finished = {}
+    deadline = time.time() + timeout
+    while len(finished) < len(states) and time.time() < deadline:
+        now = time.time()
+        for state in states:
+            if state.done and state.incident_id not in finished:
+                finished[state.incident_id] = now
+        time.sleep(0.005)
+    total = time.perf_counter() - begin
+
+    first_notify = [s.notified_at - s.start_time for s in states if s.notified_at]
+    ack = [finished[s.incident_id] - s.start_time for s in states if s.acked and s.incident_id in finished]
+    statuses = {}
+    for state in states:
+        statuses[state.status] = statuses.get(state.status, 0) + 1
+    return {"incidents": len(states), "status": statuses,
+            "time_to_first_notification": latency_summary(first_notify),
+            "time_to_ack": latency_summary(ack),
+            "throughput_per_s": round(len(states) / total, 2) if total else None}
+
+
+def stage_breakdown():
+    """按接口 / 阶段的耗时 (来自 utils.metrics，分位数为分桶估算)"""
+    snap = metrics.snapshot()["histograms"]
+    result = {}
+    for name in ("feishu_api_seconds", "aliyun_api_seconds", "alarm_stage_seconds"):
+        for labels, summary in snap.get(name, {}).items():
+            result[f"{name.rsplit('_seconds', 1)[0]}[{labels}]"] = {
+                "count": summary["count"], "avg_ms": round(summary["avg"] * 1000, 2),
+                "p50_ms": round(summary["p50"] * 1000, 2), "p99_ms": round(summary["p99"] * 1000, 2)}
+    return result
+
+
+def run_benchmark(incidents=20, latency=0.02, jitter=0.01, error_rate=0.0, throttle_rps=None, ack_after=0.3,
+                  admins=3, sms_phones=5, ack_timeout=2.0, poll_interval=0.1, seed=1):
+    """
+    跑一轮完整压测，返回结果 dict
+    :param ack_after: 替身服务器在卡片发出后多少秒模拟有人回复；None 表示全部超时升级
+    """
+    metrics.get_registry().reset()
+    report = {"config": {"incidents": incidents, "latency": latency, "jitter": jitter, "error_rate": error_rate,
+                         "throttle_rps": throttle_rps, "ack_after": ack_after, "admins": admins,
+                         "sms_phones": sms_phones}}
+    with MockServer(latency=latency, jitter=jitter, error_rate=error_rate, throttle_rps=throttle_rps,
+                    ack_after=ack_after, seed=seed) as server:
+        with mock_environment(server, admins, sms_phones) as workdir:
+            images = make_images(workdir, incidents * 2)
+
+            notifier = FeishuNotifier()
+            aliyun = AliyunNotifier()
+            server.reset()
+            report["feishu"] = bench_feishu(notifier, images[:incidents])
+            report["aliyun"] = bench_aliyun(aliyun, incidents)
+
+            communication = Communication(policy=bench_policy(ack_timeout, poll_interval))
+            server.reset()
+            report["escalation"] = bench_escalation(communication, images[incidents:], timeout=ack_timeout * 5 + 10)
+            with server._lock:
+                counts = dict(server.counts)
+            report["requests_per_incident"] = {
+                "total": round(sum(counts.values()) / incidents, 2),
+                **{name: round(n / incidents, 2) for name, n in sorted(counts.items())}}
+            report["stages"] = stage_breakdown()
+    return report
+
+
+def print_report(report):
+    cfg = report["config"]
+    print(f"\n== 报警链路压测 (incidents={cfg['incidents']}, latency={cfg['latency']}s, "
+          f"error_rate={cfg['error_rate']}, throttle_rps={cfg['throttle_rps']}) ==")
+    for section in ("feishu", "aliyun", "escalation"):
+        print(f"\n[{section}]")
+        for key, value in report[section].items():
+            print(f"  {key:<28} {value}")
+    print("\n[requests_per_incident]")
+    for key, value in report["requests_per_incident"].items():
+        print(f"  {key:<28} {value}")
+    print("\n[stages] (分位数为直方图分桶估算)")
+    for key, value in report["stages"].items():
+        print(f"  {key:<48} {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="报警链路离线压测 (本地替身服务器)")
+    parser.add_argument("--incidents", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="替身服务器每个请求的固定延迟 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="额外随机延迟上限 (秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rps", type=float, default=None, help="每个接口每秒请求上限")
+    parser.add_argument("--ack-after", type=float, default=0.3, help="多少秒后模拟有人回复，负数表示没人回复")
+    parser.add_argument("--admins", type=int, default=3)
+    parser.add_argument("--sms-phones", type=int, default=5)
+    parser.add_argument("--ack-timeout", type=float, default=2.0)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args(argv)
+
+    configure_logging(level=logging.WARNING)
+    report = run_benchmark(incidents=args.incidents, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, throttle_rps=args.throttle_rps,
+                           ack_after=args.ack_after if args.ack_after >= 0 else None,
+                           admins=args.admins, sms_phones=args.sms_phones, ack_timeout=args.ack_timeout)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+微批推理压测：不同批大小 / 等待时间下的吞吐 (帧/秒) 和每帧延迟
+
+每路摄像头一个线程，拿到上一帧的结果后立即提交下一帧 (闭环)，与检测进程的实际用法一致。
+没有导出的模型时用 --synthetic：NumPy 实现的替身模型 (池化 + 两层 1x1 卷积)，计算量固定，
+可以离线比较批处理本身带来的收益。
+
+用法:
+    python -m benchmark.bench_inference --synthetic --cameras 8 --batches 1 2 4 8 --delays 5 20
+    python -m benchmark.bench_inference --weights weights/best.onnx --threads 4 --int8 --json
+    python -m benchmark.bench_inference --weights weights/best.onnx --tune-threads
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+import config
+from benchmark.bench_alarm import latency_summary
+from core.yolo.detector import load_backend, to_tensor, tune_threads
+from core.yolo.inference import BatchInferenceEngine
+from utils.logger import configure_logging
+
+
+class SyntheticBackend:
+    """
+    替身模型：8x8 平均池化后做两层 1x1 卷积 (批量矩阵乘法)，输出与 YOLOv8 相同的 (B, 4 + 类别数, 候选数)
+    批越大矩阵乘法越能用满 SIMD，趋势与真实模型一致，绝对数值没有参考意义
+    """
+
+    def __init__(self, hidden=256, classes=2, seed=0):
+        rng = np.random.default_rng(seed)
+        self.w1 = rng.standard_normal((hidden, 3 * 64), dtype=np.float32) / 8
+        self.w2 = rng.standard_normal((4 + classes, hidden), dtype=np.float32) / 16
+
+    def __call__(self, batch):
+        n, c, h, w = batch.shape
+        # (B, 3, H, W) -> (B, 3 * 8 * 8, H/8 * W/8)：每个 8x8 块作为一个候选位置的特征
+        patches = batch.reshape(n, c, h // 8, 8, w // 8, 8).transpose(0, 1, 3, 5, 2, 4).reshape(n, c * 64, -1)
+        hidden = np.maximum(self.w1 @ patches, 0)
+        out = self.w2 @ hidden
+        # 类别分数过 sigmoid 并整体压低，和真实模型一样只有少数候选超过置信度阈值 (否则 NMS 耗时失真)
+        out[:, 4:] = 1 / (1 + np.exp(8 - out[:, 4:]))
+        return out
+
+
+def random_frames(cameras, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, size=shape, dtype=np.uint8) for _ in range(cameras)]
+
+
+def bench_engine(backend, frames, max_batch, max_delay_ms, duration, imgsz):
+    """闭环压测一组参数：每路摄像头等上一帧结果回来再提交下一帧"""
+    samples = [[] for _ in frames]
+    stop = threading.Event()
+
+    def camera(i, engine):
+        while not stop.is_set():
+            begin = time.perf_counter()
+            engine.submit(f"cam{i}", frames[i]).result()
+            samples[i].append(time.perf_counter() - begin)
+
+    # 暂存区放得下所有摄像头的一帧，闭环压测时不会丢帧
+    engine = BatchInferenceEngine(backend, max_batch=max_batch, max_delay_ms=max_delay_ms, imgsz=imgsz,
+                                  capacity=max(len(frames), 2 * max_batch)).start()
+    engine.submit("warmup", frames[0]).result()
+    threads = [threading.Thread(target=camera, args=(i, engine), daemon=True) for i in range(len(frames))]
+    begin = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - begin
+    engine.stop()
+
+    latencies = [s for per_camera in samples for s in per_camera]
+    stats = engine.stats()
+    return {"max_batch": max_batch, "max_delay_ms": max_delay_ms,
+            "fps": round(len(latencies) / elapsed, 1),
+            "avg_batch": stats["avg_batch"], "infer_ms": stats["infer_ms"],
+            "latency": latency_summary(latencies)}
+
+
+def run_benchmark(backend, cameras=8, batches=(1, 2, 4, 8), delays=(5, 20), duration=3.0, imgsz=640,
+                  frame_shape=(480, 640, 3)):
+    frames = random_frames(cameras, frame_shape)
+    rows = []
+    for max_batch in batches:
+        # 批大小为 1 时等待时间没有意义，只跑一次
+        for max_delay_ms in (delays if max_batch > 1 else delays[:1]):
+            rows.append(bench_engine(backend, frames, max_batch, max_delay_ms, duration, imgsz))
+    return {"config": {"backend": getattr(backend, "path", type(backend).__name__),
+                       "threads": getattr(backend, "threads", None), "cameras": cameras, "imgsz": imgsz,
+                       "duration": duration},
+            "results": rows}
+
+
+def print_report(report):
+    cfg = report["config"]
+    print(f"\n== 微批推理压测 (backend={cfg['backend']}, threads={cfg['threads']}, cameras={cfg['cameras']}, "
+          f"imgsz={cfg['imgsz']}) ==")
+    print(f"  {'batch':>5} {'delay_ms':>8} {'fps':>8} {'avg_batch':>9} {'infer_ms':>9} {'p50_ms':>8} {'p99_ms':>8}")
+    for row in report["results"]:
+        lat = row["latency"]
+        print(f"  {row['max_batch']:>5} {row['max_delay_ms']:>8} {row['fps']:>8} {row['avg_batch']!s:>9} "
+              f"{row['infer_ms']!s:>9} {lat.get('p50_ms')!s:>8} {lat.get('p99_ms')!s:>8}")
+    if "threads" in report:
+        print("\n[intra-op 线程数] 每批耗时 (ms):", report["threads"])
+
+
+def main(argv=None):
+    cfg = config.DETECTOR
+    parser = argparse.ArgumentParser(description="微批推理压测 (帧/秒、每帧延迟)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--weights", default=str(config.PROJECT_ROOT / cfg["weights"]),
+                        help="模型 (best.pt 会自动找同目录导出的 best.onnx / best.torchscript)")
+    source.add_argument("--synthetic", action="store_true", help="使用 NumPy 替身模型 (不需要模型文件)")
+    parser.add_argument("--threads", type=int, default=cfg["intra_op_threads"], help="intra-op 线程数")
+    parser.add_argument("--tune-threads", action="store_true", help="先实测各线程数的单批耗时，选最快的")
+    parser.add_argument("--int8", action="store_true", help="使用 INT8 量化模型")
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--delays", type=float, nargs="+", default=[5, 20], help="最长等待时间 (毫秒)")
+    parser.add_argument("--duration", type=float, default=3.0, help="每组参数压测多少秒")
+    parser.add_argument("--imgsz", type=int, default=cfg["imgsz"])
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args(argv)
+
+    configure_logging(level=logging.WARNING)
+    threads, timings = args.threads, None
+    if args.synthetic:
+        backend = SyntheticBackend()
+    else:
+        if args.tune_threads:
+            sample = to_tensor(np.stack(random_frames(max(args.batches), (args.imgsz, args.imgsz, 3))))
+            threads, timings = tune_threads(lambda n: load_backend(args.weights, n, args.int8), sample)
+        backend = load_backend(args.weights, threads, args.int8)
+
+    report = run_benchmark(backend, cameras=args.cameras, batches=args.batches, delays=args.delays,
+                           duration=args.duration, imgsz=args.imgsz)
+    if timings:
+        report["threads"] = {n: round(t * 1000, 2) for n, t in timings.items()}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils.logger import setup_logger
+
+# 飞书错误码
+FEISHU_RATE_LIMITED = 99991400
+FEISHU_INTERNAL_ERROR = 1
+
+
+class _TokenBucket:
+    """按接口限流 (每秒 rate 个请求，允许 rate 个突发)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    本地飞书 / 阿里云替身服务器 (只用于测试和压测，不需要网络和账号)
+    飞书: tenant_access_token, images, messages (发送 / 拉取), urgent_*, batch_get_id, batch_send, chat_p2p, bot/info
+    阿里云: 根路径上的 OpenAPI 请求
+           (SendSms / SendBatchSms / QuerySmsSign / SingleCallByTts / QueryCallDetailByCallId)
+
+    可调参数 (运行中也可以直接修改属性):
+    :param latency: 每个请求固定延迟 (秒)
+    :param jitter: 额外的随机延迟上限 (秒)
+    :param error_rate: 随机返回服务端错误的比例 (0 ~ 1)
+    :param throttle_rps: 每个接口每秒最多处理多少请求，超出返回限流错误；None 表示不限
+    :param ack_after: 机器人消息发出多少秒后，模拟有人在同一会话回复 "1"；None 表示没人回复
+    :param voice_state: 语音通知呼出 voice_after 秒后通话记录里的状态码 (200000 为已接听)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rps=None,
+                 ack_after=None, voice_state="200000", voice_after=0.0, seed=None):
+        self.logger = setup_logger("MockServer")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self.ack_after = ack_after
+        self.voice_state = voice_state
+        self.voice_after = voice_after
+
+        self.counts = Counter()          # 接口名 -> 请求数
+        self.sms_recipients = Counter()  # 手机号 -> 收到的短信数
+        self.voice_recipients = Counter()  # 手机号 -> 接到的语音电话数
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._messages = {}              # chat_id -> [消息]
+        self._calls = {}                 # CallId -> 呼出时间
+        self._thread = None
+        super().__init__((host, port), _MockHandler)
+
+    # ---------------- 对外接口 ----------------
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def feishu_api_base(self):
+        return f"http://{self.server_address[0]}:{self.port}/open-apis"
+
+    @property
+    def aliyun_endpoint(self):
+        return f"{self.server_address[0]}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset(self):
+        """清空计数和消息 (压测每一轮之间调用)"""
+        with self._lock:
+            self.counts.clear()
+            self.sms_recipients.clear()
+            self.voice_recipients.clear()
+            self._messages.clear()
+            self._calls.clear()
+            self._buckets.clear()
+
+    def total_requests(self):
+        with self._lock:
+            return sum(self.counts.values())
+
+    def post_user_message(self, chat_id, text="1", delay=0.0):
+        """模拟用户在会话里发一条消息 (delay 秒后可见)"""
+        content = json.dumps({"text": text}, ensure_ascii=False)
+        self._append_message(chat_id, "user", content, time.time() + delay)
+
+    # ---------------- 内部实现 ----------------
+
+    def _next_id(self, prefix):
+        return f"{prefix}_{next(self._ids)}"
+
+    def _append_message(self, chat_id, sender_type, content, created):
+        msg = {
+            "message_id": self._next_id("om"),
+            "create_time": str(int(created * 1000)),
+            "sender": {"sender_type": sender_type},
+            "body": {"content": content},
+        }
+        with self._lock:
+            self._messages.setdefault(chat_id, []).append(msg)
+        return msg
+
+    def _admit(self, endpoint):
+        """
+        计数 + 延迟 + 限流 / 错误注入
+        :return: None 表示正常处理；"throttled" / "error" 表示要返回错误
+        """
+        with self._lock:
+            self.counts[endpoint] += 1
+            throttled = False
+            if self.throttle_rps:
+                bucket = self._buckets.get(endpoint)
+                if bucket is None:
+                    bucket = self._buckets[endpoint] = _TokenBucket(self.throttle_rps)
+                throttled = not bucket.take()
+            failed = self.error_rate and self._random.random() < self.error_rate
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if throttled:
+            return "throttled"
+        if failed:
+            return "error"
+        return None
+
+    def list_messages(self, chat_id, start_sec, page_size, offset):
+        now_ms = time.time() * 1000
+        start_ms = start_sec * 1000
+        with self._lock:
+            visible = [m for m in self._messages.get(chat_id, ())
+                       if start_ms <= int(m["create_time"]) <= now_ms]
+        visible.sort(key=lambda m: int(m["create_time"]))
+        page = visible[offset:offset + page_size]
+        has_more = offset + page_size < len(visible)
+        data = {"items": page, "has_more": has_more}
+        if has_more:
+            data["page_token"] = str(offset + page_size)
+        return data
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头和正文分两次写，不关 Nagle 的话每个请求会多出约 40ms 的延迟确认
+    disable_nagle_algorithm = True
+
+    # ---------------- 路由 ----------------
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_HEAD(self):
+        self._reply(200, b"")
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self._read_body()
+        path = url.path
+        if path.startswith("/open-apis"):
+            path = path[len("/open-apis"):]
+
+        # 阿里云 OpenAPI：接口名在 x-acs-action 头 (新版 SDK) 或 Action 参数里，参数在 query 或表单里
+        action = self.headers.get("x-acs-action") or query.get("Action")
+        if path in ("", "/") and action:
+            if body and b"=" in body:
+                query.update({k: v[-1] for k, v in parse_qs(body.decode("utf-8")).items()})
+            query["Action"] = action
+            return self._aliyun(query)
+
+        route = self._feishu_route(method, path)
+        if route is None:
+            return self._json(404, {"code": 404, "msg": f"mock: unknown {method} {path}"})
+        name, handler = route
+        outcome = self.server._admit(name)
+        if outcome == "throttled":
+            return self._json(429, {"code": FEISHU_RATE_LIMITED, "msg": "request trigger frequency limit"})
+        if outcome == "error":
+            return self._json(500, {"code": FEISHU_INTERNAL_ERROR, "msg": "internal error"})
+        return handler(path, query, body)
+
+    def _feishu_route(self, method, path):
+        if method == "POST" and path == "/auth/v3/tenant_access_token/internal":
+            return "token", self._token
+        if method == "POST" and path == "/im/v1/images":
+            return "upload_image", self._upload_image
+        if method == "POST" and path == "/im/v1/messages":
+            return "send_message", self._send_message
+        if method == "GET" and path == "/im/v1/messages":
+            return "list_messages", self._list_messages
+        if method == "PATCH" and path.startswith("/im/v1/messages/") and "/urgent_" in path:
+            return f"urgent_{path.rsplit('_', 1)[-1]}", self._urgent
+        if method == "POST" and path == "/contact/v3/users/batch_get_id":
+            return "batch_get_id", self._batch_get_id
+        if method == "POST" and path.rstrip("/") == "/message/v4/batch_send":
+            return "batch_send", self._batch_send
+        if method == "POST" and path == "/im/v1/chat_p2p/batch_query":
+            return "p2p_batch_query", self._p2p_batch_query
+        if method == "GET" and path == "/bot/v3/info":
+            return "bot_info", self._bot_info
+        return None
+
+    # ---------------- 飞书接口 ----------------
+
+    def _token(self, path, query, body):
+        return self._json(200, {"code": 0, "msg": "ok", "tenant_access_token": "t-mock", "expire": 7200})
+
+    def _upload_image(self, path, query, body):
+        return self._json(200, {"code": 0, "data": {"image_key": self.server._next_id("img")}})
+
+    def _send_message(self, path, query, body):
+        payload = json.loads(body or b"{}")
+        receive_id = payload.get("receive_id")
+        if query.get("receive_id_type") == "open_id":
+            chat_id = f"oc_p2p_{receive_id}"
+        else:
+            chat_id = receive_id
+        msg = self.server._append_message(chat_id, "app", payload.get("content", "{}"), time.time())
+        if self.server.ack_after is not None:
+            self.server.post_user_message(chat_id, "1", delay=self.server.ack_after)
+        return self._json(200, {"code": 0, "data": {"message_id": msg["message_id"], "chat_id": chat_id}})
+
+    def _list_messages(self, path, query, body):
+        data = self.server.list_messages(query.get("container_id"), int(query.get("start_time", 0)),
+                                         int(query.get("page_size", 20)), int(query.get("page_token") or 0))
+        return self._json(200, {"code": 0, "data": data})
+
+    def _urgent(self, path, query, body):
+        return self._json(200, {"code": 0, "data": {"invalid_user_id_list": []}})
+
+    def _batch_get_id(self, path, query, body):
+        mobiles = json.loads(body or b"{}").get("mobiles") or []
+        users = [{"mobile": m.lstrip("+"), "user_id": f"ou_{m.lstrip('+')}"} for m in mobiles]
+        return self._json(200, {"code": 0, "data": {"user_list": users}})
+
+    def _batch_send(self, path, query, body):
+        open_ids = json.loads(body or b"{}").get("open_ids") or []
+        for open_id in open_ids:
+            self.server._append_message(f"oc_p2p_{open_id}", "app", "{}", time.time())
+        return self._json(200, {"code": 0, "data": {"message_id": self.server._next_id("bm"),
+                                                    "invalid_open_ids": []}})
+
+    def _p2p_batch_query(self, path, query, body):
+        chatter_ids = json.loads(body or b"{}").get("chatter_ids") or []
+        chats = [{"chatter_id": uid, "chat_id": f"oc_p2p_{uid}"} for uid in chatter_ids]
+        return self._json(200, {"code": 0, "data": {"p2p_chats": chats}})
+
+    def _bot_info(self, path, query, body):
+        return self._json(200, {"code": 0, "msg": "ok", "bot": {"app_name": "mock", "activate_status": 2}})
+
+    # ---------------- 阿里云接口 ----------------
+
+    def _aliyun(self, params):
+        action = params.get("Action")
+        request_id = self.server._next_id("req")
+        outcome = self.server._admit(f"aliyun_{action}")
+        if outcome == "throttled":
+            return self._json(200, {"Code": "isv.BUSINESS_LIMIT_CONTROL", "Message": "触发流控",
+                                    "RequestId": request_id})
+        if outcome == "error":
+            return self._json(200, {"Code": "isp.SYSTEM_ERROR", "Message": "系统错误", "RequestId": request_id})
+
+        if action == "SingleCallByTts":
+            return self._single_call(params, request_id)
+        if action == "QueryCallDetailByCallId":
+            return self._query_call(params, request_id)
+        if action == "QuerySmsSign":
+            return self._json(200, {"Code": "OK", "Message": "OK", "SignName": params.get("SignName"),
+                                     "SignStatus": 1, "RequestId": request_id})
+        if action == "SendSms":
+            phones = params.get("PhoneNumbers", "").split(",")
+        elif action == "SendBatchSms":
+            phones = json.loads(params.get("PhoneNumberJson", "[]"))
+        else:
+            return self._json(404, {"Code": "InvalidAction.NotFound", "Message": action, "RequestId": request_id})
+        with self.server._lock:
+            for phone in phones:
+                self.server.sms_recipients[phone] += 1
+        return self._json(200, {"Code": "OK", "Message": "OK", "BizId": self.server._next_id("biz"),
+                                "RequestId": request_id})
+
+    def _single_call(self, params, request_id):
+        call_id = self.server._next_id("call")
+        with self.server._lock:
+            self.server.voice_recipients[params.get("CalledNumber")] += 1
+            self.server._calls[call_id] = time.time()
+        return self._json(200, {"Code": "OK", "Message": "OK", "CallId": call_id, "RequestId": request_id})
+
+    def _query_call(self, params, request_id):
+        with self.server._lock:
+            placed = self.server._calls.get(params.get("CallId"))
+        # 通话结束前查不到记录 (Data 为空)
+        data = ""
+        if placed is not None and time.time() - placed >= self.server.voice_after and self.server.voice_state:
+            data = json.dumps({"callId": params.get("CallId"), "state": self.server.voice_state})
+        return self._json(200, {"Code": "OK", "Message": "OK", "Data": data, "RequestId": request_id})
+
+    # ---------------- 工具 ----------------
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json(self, status, payload):
+        self._reply(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
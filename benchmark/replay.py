@@ -0,0 +1,646 @@
+"""
+回放压测：把录制的检测事件 (或视频文件) 按 1~100 倍速送进完整的报警链路
+    时序确认 (AlarmGate) -> 报警调度 (AlarmDispatcher) -> 升级流程 (Communication / FeishuNotifier / AliyunNotifier)
+不用点火，也不会调用真实接口：通知渠道换成进程内替身 (--notifiers fake) 或本地替身服务器 (--notifiers mock)。
+
+输入:
+- 检测事件轨迹 (JSONL，每行一帧): {"t": 秒, "camera": 摄像头, "seq": 帧序号, "det": [[x1, y1, x2, y2, conf, cls], ...]}
+  没有检测框的帧省略 "det"；可以用 TraceWriter 从 MultiCameraCapture 的结果录制，或用 --synthetic-trace 生成
+- 视频文件 (--video)：逐帧经过微批推理引擎检测后再送入报警链路 (需要 opencv-python)
+
+倍速只压缩"人的时间" (升级阶段间隔、确认超时、轮询间隔、冷却期、替身的回复时间)，
+接口延迟、检测和跟踪耗时都是真实的，所以倍速越高越能看出主机撑不撑得住。
+报告每秒处理的事件数、报警新建 / 合并 / 冷却 / 丢弃次数、回放滞后、定时器调度延迟和内存增长。
+
+用法:
+    python -m benchmark.replay --synthetic-trace --cameras 16 --minutes 60 --speed 100
+    python -m benchmark.replay --synthetic-trace --minutes 10 --write-trace traces/synthetic.jsonl
+    python -m benchmark.replay --trace traces/lab.jsonl --speed 20 --notifiers mock --latency 0.05 --json
+    python -m benchmark.replay --video cam0.mp4 cam1.mp4 --weights weights/best.onnx --speed 1
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+import config
+from benchmark.bench_alarm import SAMPLE_IMAGE, latency_summary, mock_environment
+from benchmark.mock_server import MockServer
+from core.communication.communication import Communication
+from core.communication.dispatcher import AlarmDispatcher
+from core.communication.scheduler import TimerScheduler
+from core.yolo.capture import VideoSource, open_source
+from core.yolo.tracker import AlarmGate
+from utils import metrics
+from utils.logger import configure_logging
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 ** 2
+
+
+# ---------------- 输入：检测事件轨迹 / 视频 ----------------
+
+def _event_line(t, camera_id, seq, detections):
+    line = {"t": round(t, 4), "camera": camera_id, "seq": seq}
+    if len(detections):
+        line["det"] = [[round(float(v), 4) for v in row] for row in np.asarray(detections).tolist()]
+    return json.dumps(line, ensure_ascii=False)
+
+
+class TraceWriter:
+    """
+    把检测结果录制成 JSONL 轨迹 (t 从第一帧开始计时)
+    用法:
+        with TraceWriter("traces/lab.jsonl") as trace:
+            for result in capture.results():
+                trace.write(result)
+    """
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+        self._start = None
+        self.count = 0
+
+    def write(self, result):
+        """:param result: capture.FrameResult"""
+        self.write_event(result.ts, result.camera_id, result.seq, result.detections)
+
+    def write_event(self, ts, camera_id, seq, detections):
+        if self._start is None:
+            self._start = ts
+        self._file.write(_event_line(ts - self._start, camera_id, seq, detections) + "\n")
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_trace(events, path):
+    """把 (t, camera_id, seq, detections) 事件写成 JSONL，返回条数"""
+    with TraceWriter(path) as trace:
+        for t, camera_id, seq, detections in events:
+            trace.write_event(t, camera_id, seq, detections)
+    return trace.count
+
+
+def read_trace(path):
+    """逐行读取 JSONL 轨迹 (生成器，长轨迹不会一次读进内存)，产出 (t, camera_id, seq, detections)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                event = json.loads(line)
+                yield event["t"], event["camera"], event.get("seq"), event.get("det", ())
+
+
+def synthetic_trace(cameras=8, duration=600, fps=10, fires_per_hour=6, fire_seconds=30, false_positive_rate=0.005,
+                    miss_rate=0.1, seed=0):
+    """
+    生成检测事件轨迹 (生成器)：每个摄像头随机出现持续 fire_seconds 秒的火情 (框有抖动、偶尔漏检)，
+    平时偶尔有单帧误检
+    :param fires_per_hour: 每个摄像头每小时平均几次火情
+    :param false_positive_rate: 每帧出现单帧误检的概率
+    :param miss_rate: 火情期间每帧漏检的概率
+    """
+    rng = random.Random(seed)
+    start_prob = fires_per_hour / 3600 / fps
+    fire_frames = int(fire_seconds * fps)
+    remaining = [0] * cameras
+    boxes = [None] * cameras
+    for seq in range(int(duration * fps)):
+        t = seq / fps
+        for i in range(cameras):
+            detections = []
+            if not remaining[i] and rng.random() < start_prob:
+                remaining[i] = fire_frames
+                x, y = rng.uniform(0, 500), rng.uniform(0, 340)
+                boxes[i] = (x, y, x + rng.uniform(40, 140), y + rng.uniform(40, 140))
+            if remaining[i]:
+                remaining[i] -= 1
+                if rng.random() >= miss_rate:
+                    dx, dy = rng.uniform(-3, 3), rng.uniform(-3, 3)
+                    x1, y1, x2, y2 = boxes[i]
+                    detections.append([x1 + dx, y1 + dy, x2 + dx, y2 + dy, rng.uniform(0.5, 0.95), 0])
+            elif rng.random() < false_positive_rate:
+                x, y = rng.uniform(0, 580), rng.uniform(0, 420)
+                detections.append([x, y, x + 60, y + 60, rng.uniform(0.3, 0.7), rng.randint(0, 1)])
+            yield t, f"cam{i}", seq, detections
+
+
+def video_fps(source, default=25.0):
+    """视频文件的帧率 (读不到时用 default)"""
+    if cv2 is not None and isinstance(source, VideoSource):
+        fps = source.cap.get(cv2.CAP_PROP_FPS)
+        if fps and fps > 0:
+            return fps
+    return getattr(source, "fps", None) or default
+
+
+def video_events(sources, engine, frame_shape=(480, 640, 3), fps=None):
+    """
+    逐帧解码视频并检测 (生成器)，产出 (t, camera_id, seq, detections)
+    所有摄像头同一帧号的画面一起提交给推理引擎 (凑成一批)，某个视频播完后其余的继续
+    :param sources: {camera_id: 视频路径 / 带 read_into(out) 的对象}
+    :param engine: BatchInferenceEngine (已 start)
+    :param fps: 回放时间轴的帧率，默认取第一个视频的帧率
+    """
+    readers = {camera_id: open_source(source) for camera_id, source in sources.items()}
+    fps = fps or video_fps(next(iter(readers.values())))
+    buffers = {camera_id: np.empty(frame_shape, dtype=np.uint8) for camera_id in readers}
+    seq = 0
+    try:
+        while readers:
+            frames = {}
+            for camera_id, reader in list(readers.items()):
+                if reader.read_into(buffers[camera_id]):
+                    frames[camera_id] = buffers[camera_id]
+                else:
+                    reader.close()
+                    del readers[camera_id]
+            futures = engine.submit_all(frames)
+            for camera_id, future in futures.items():
+                yield seq / fps, camera_id, seq, future.result()
+            seq += 1
+    finally:
+        for reader in readers.values():
+            reader.close()
+
+
+# ---------------- 通知渠道替身 ----------------
+
+class _FakeChannel:
+    """进程内通知替身的公共部分：按接口计数，每次调用固定延迟 (模拟网络往返)"""
+
+    def __init__(self, calls=None, latency=0.0, lock=None):
+        self.calls = Counter() if calls is None else calls
+        self.latency = latency
+        self._lock = lock or threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+            n = self.calls[name]
+        if self.latency:
+            time.sleep(self.latency)
+        return n
+
+
+class FakeFeishu(_FakeChannel):
+    """
+    FeishuNotifier 的进程内替身 (实现 EscalationEngine 用到的接口)
+    :param ack_after: 报警开始多少秒后模拟有人回复确认；None 表示没人回复
+    """
+
+    def __init__(self, calls=None, latency=0.0, ack_after=None, admins=3, lock=None):
+        super().__init__(calls, latency, lock)
+        self.ack_after = ack_after
+        self.admin_ids = [f"ou_replay_admin{i}" for i in range(1, admins + 1)]
+        self.group_chat_id = "oc_replay_group"
+
+    def send_card_to_group(self, title, content, image_path=None, on_send=None):
+        if on_send:
+            on_send()
+        return f"om_replay_{self._call('send_card')}"
+
+    def send_to_all_admins(self, title, content, image_path=None, urgent_type=None):
+        self._call(f"admin_card_{urgent_type}" if urgent_type else "admin_card")
+        return True
+
+    def buzz_message(self, message_id, user_id_list, urgent_type="sms"):
+        self._call(f"urgent_{urgent_type}")
+        return True
+
+    def get_p2p_chat_ids(self, user_ids):
+        self._call("chat_p2p")
+        return {user_id: f"oc_p2p_{user_id}" for user_id in user_ids}
+
+    def check_chat_reply(self, start_time_ts, incident_id=None, chat_id=None):
+        self._call("check_reply")
+        return self.ack_after is not None and time.time() - start_time_ts >= self.ack_after
+
+    def check_admin_replies(self, chat_ids, start_time_ts, incident_id=None):
+        return self.check_chat_reply(start_time_ts, incident_id)
+
+    def release_reply_cursor(self, incident_id):
+        pass
+
+
+class FakeAliyun(_FakeChannel):
+    """AliyunNotifier 的进程内替身"""
+
+    def send_sms_to_all(self, params=None):
+        self._call("sms")
+        return True
+
+
+class _FakeCallBatch:
+    ok = True
+
+
+class FakeVoice(_FakeChannel):
+    """AliyunVoiceNotifier 的进程内替身"""
+
+    def call_all(self, params=None):
+        self._call("voice")
+        return _FakeCallBatch()
+
+
+def fake_notifiers(latency=0.0, ack_after=None, admins=3):
+    """一组共用调用计数的替身：(calls, feishu, aliyun, voice)"""
+    calls, lock = Counter(), threading.Lock()
+    return (calls, FakeFeishu(calls, latency, ack_after, admins, lock), FakeAliyun(calls, latency, lock),
+            FakeVoice(calls, latency, lock))
+
+
+# ---------------- 报警链路 ----------------
+
+def replay_policy(speed, base=None):
+    """
+    升级策略里"人的时间" (阶段间隔、确认超时、轮询间隔) 按倍速压缩
+    对冲等待 (hedge.after_ms) 针对的是接口慢，和接口延迟一样不压缩
+    """
+    policy = copy.deepcopy(base or config.ESCALATION_POLICY)
+    for key in ("ack_timeout", "poll_interval", "fallback_poll_interval"):
+        if key in policy:
+            policy[key] /= speed
+    for stage in policy["stages"]:
+        stage["after"] = stage.get("after", 0) / speed
+    return policy
+
+
+class AlarmPipeline:
+    """
+    回放用的报警链路，与 main.py 的接法相同:
+        AlarmGate -> AlarmDispatcher.submit -> Communication.start_fire_alarm
+    使用独立的定时器 (统计调度延迟)，冷却期按倍速压缩
+    """
+
+    def __init__(self, communication, scheduler, speed=1.0, tracker_config=None, cooldown=60, workers=4,
+                 image_path=SAMPLE_IMAGE):
+        self.communication = communication
+        self.scheduler = scheduler
+        self.image_path = str(image_path)
+        self.gate = AlarmGate(self._on_alarm, tracker_config)
+        self.dispatcher = AlarmDispatcher(self._handle, max_workers=workers, cooldown=cooldown / speed)
+        self.events = 0
+        self.detections = 0
+
+    def _on_alarm(self, event):
+        self.dispatcher.submit(event.camera_id, self.image_path)
+
+    def _handle(self, incident):
+        return self.communication.start_fire_alarm(incident.image_path, source=incident.source)
+
+    def feed(self, camera_id, detections, seq=None, ts=None):
+        self.events += 1
+        if len(detections):
+            self.detections += 1
+        self.gate.update(camera_id, detections, seq, ts)
+
+    def drain(self, timeout=30):
+        """等待已发起的报警全部走完升级流程，返回是否在超时前结束"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            data = self.dispatcher.metrics()
+            if not data["queue_depth"] and not data["active"] and not data["open_incidents"]:
+                return True
+            time.sleep(0.02)
+        return False
+
+    def close(self):
+        self.dispatcher.shutdown(wait=False)
+        self.scheduler.shutdown(wait=False)
+
+    def stats(self):
+        trackers = self.gate.stats().values()
+        cost = [s["cost_us"] for s in trackers if s["cost_us"] is not None]
+        return {"confirmed": sum(s["alarms"] for s in trackers),
+                "tracker_us": round(sum(cost) / len(cost), 2) if cost else None,
+                "dispatcher": self.dispatcher.metrics(),
+                "scheduler": self.scheduler.stats()}
+
+
+# ---------------- 资源采样 ----------------
+
+def rss_bytes():
+    """当前进程常驻内存 (Linux 读 /proc；其他平台退化为峰值 RSS)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # Linux 上单位是 KB，macOS 上是字节
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if os.uname().sysname == "Darwin" else usage * 1024
+    return None
+
+
+class ResourceSampler:
+    """
+    后台线程定时采样内存 (RSS，可选 tracemalloc) 和链路状态，长时间回放时用来发现泄漏
+    :param probes: {名称: 无参函数}，每次采样时调用 (例如已处理事件数、队列深度)
+    """
+
+    def __init__(self, interval=1.0, probes=None, trace_python=False):
+        self.interval = interval
+        self.probes = probes or {}
+        self.trace_python = trace_python
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._begin = None
+
+    def start(self):
+        if self.trace_python and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._begin = time.perf_counter()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="replay-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+        if self.trace_python:
+            tracemalloc.stop()
+
+    def sample(self):
+        rss = rss_bytes()
+        row = {"t": round(time.perf_counter() - self._begin, 3),
+               "rss_mb": round(rss / MB, 2) if rss is not None else None}
+        if self.trace_python and tracemalloc.is_tracing():
+            row["python_mb"] = round(tracemalloc.get_traced_memory()[0] / MB, 2)
+        for name, probe in self.probes.items():
+            row[name] = probe()
+        self.samples.append(row)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+
+def memory_growth(samples, key="rss_mb", warmup=0.2):
+    """
+    内存增长摘要：跳过前 warmup 比例的样本 (缓存、线程池还在建立)，之后按最小二乘估计每分钟增长
+    持续为正的斜率通常意味着泄漏
+    """
+    values = [(s["t"], s[key]) for s in samples if s.get(key) is not None]
+    if not values:
+        return {}
+    steady = values[int(len(values) * warmup):] if len(values) > 4 else values
+    summary = {"start_mb": values[0][1], "end_mb": values[-1][1], "peak_mb": max(v for _, v in values),
+               "growth_mb": round(values[-1][1] - steady[0][1], 2)}
+    if len(steady) >= 3 and steady[-1][0] > steady[0][0]:
+        t, v = np.array(steady, dtype=np.float64).T
+        summary["slope_mb_per_min"] = round(float(np.polyfit(t, v, 1)[0]) * 60, 3)
+    return summary
+
+
+# ---------------- 回放 ----------------
+
+class _Reservoir:
+    """定长随机抽样 (长时间回放时按固定内存估计分位数)"""
+
+    def __init__(self, size=100_000, seed=0):
+        self.size = size
+        self.values = []
+        self.seen = 0
+        self._random = random.Random(seed)
+
+    def add(self, value):
+        self.seen += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            i = self._random.randrange(self.seen)
+            if i < self.size:
+                self.values[i] = value
+
+
+def replay(events, pipeline, speed=10.0, max_seconds=None, late_after=0.001):
+    """
+    按倍速把事件送进报警链路 (在调用线程里执行)
+    跟不上时间轴时不跳帧，记录滞后 (实际送入时间 - 按倍速应送入的时间)
+    :param speed: 倍速，<= 0 表示不限速 (尽快送入)
+    :param max_seconds: 最多回放多少秒 (墙上时间)
+    :param late_after: 滞后超过多少秒算作"跟不上"
+    :return: 统计 dict
+    """
+    lags = _Reservoir()
+    late, lag_max, last_t = 0, 0.0, 0.0
+    wall_ts = time.time()
+    begin = time.perf_counter()
+    for t, camera_id, seq, detections in events:
+        now = time.perf_counter()
+        if max_seconds is not None and now - begin >= max_seconds:
+            break
+        if speed > 0:
+            lag = now - (begin + t / speed)
+            if lag < 0:
+                time.sleep(-lag)
+                lag = 0.0
+            elif lag > late_after:
+                late += 1
+            if lag > lag_max:
+                lag_max = lag
+            lags.add(lag)
+        pipeline.feed(camera_id, detections, seq, wall_ts + t)
+        last_t = t
+    elapsed = time.perf_counter() - begin
+    summary = latency_summary(lags.values)
+    summary.pop("count", None)
+    summary["max_ms"] = round(lag_max * 1000, 2)
+    return {"events": pipeline.events, "frames_with_detections": pipeline.detections,
+            "trace_seconds": round(last_t, 2), "elapsed_s": round(elapsed, 3),
+            "events_per_s": round(pipeline.events / elapsed, 1) if elapsed else None,
+            "effective_speed": round(last_t / elapsed, 1) if elapsed else None,
+            "late_events": late,
+            "lag": summary}
+
+
+def _alarm_report(stats):
+    d = stats["dispatcher"]
+    submitted = d["opened"] + d["coalesced"] + d["suppressed"] + d["dropped"]
+    return {"confirmed_by_tracker": stats["confirmed"], "raised": d["opened"], "coalesced": d["coalesced"],
+            "suppressed": d["suppressed"], "dropped": d["dropped"], "failed": d["failed"],
+            "coalesce_ratio": round((d["coalesced"] + d["suppressed"]) / submitted, 3) if submitted else None}
+
+
+def _escalation_report():
+    counters = metrics.snapshot()["counters"]
+    return {labels.split("=", 1)[1]: n for labels, n in counters.get("alarm_incidents_total", {}).items()}
+
+
+def run_replay(events, speed=10.0, notifiers="fake", latency=0.0, ack_after=30.0, tracker_config=None,
+               cooldown=60, workers=4, max_seconds=None, drain_timeout=30, sample_interval=1.0, trace_python=False,
+               admins=3, sms_phones=5, policy=None):
+    """
+    回放一组事件，返回报告 dict
+    :param notifiers: "fake" 进程内替身；"mock" 真实的 FeishuNotifier / AliyunNotifier + 本地替身服务器
+    :param latency: 每次接口调用的延迟 (秒，不按倍速压缩)
+    :param ack_after: 报警开始多少秒后有人确认 (按倍速压缩)；None 表示没人确认，全部升级到电话
+    """
+    metrics.get_registry().reset()
+    ack = ack_after / speed if ack_after is not None and speed > 0 else ack_after
+    factor = speed if speed > 0 else 1.0
+    report = {"config": {"speed": speed, "notifiers": notifiers, "latency": latency, "ack_after": ack_after,
+                         "cooldown": cooldown, "workers": workers}}
+
+    def run(communication, requests):
+        scheduler = communication.escalation.scheduler
+        pipeline = AlarmPipeline(communication, scheduler, factor, tracker_config, cooldown, workers)
+        sampler = ResourceSampler(sample_interval, {
+            "events": lambda: pipeline.events,
+            "queue_depth": lambda: pipeline.dispatcher.metrics()["queue_depth"],
+            "pending_timers": scheduler.pending,
+        }, trace_python=trace_python).start()
+        try:
+            report["replay"] = replay(events, pipeline, speed, max_seconds)
+            report["drained"] = pipeline.drain(drain_timeout)
+        finally:
+            sampler.stop()
+            pipeline.close()
+        stats = pipeline.stats()
+        report["alarms"] = _alarm_report(stats)
+        report["escalation"] = _escalation_report()
+        report["tracker_us"] = stats["tracker_us"]
+        sched = stats["scheduler"]
+        report["scheduler"] = {"fired": sched["fired"], "pending": sched["pending"],
+                               "avg_lag_ms": round(sched["avg_lag"] * 1000, 2),
+                               "max_lag_ms": round(sched["max_lag"] * 1000, 2)}
+        report["requests"] = dict(sorted(requests().items()))
+        report["memory"] = memory_growth(sampler.samples)
+        if trace_python:
+            report["python_memory"] = memory_growth(sampler.samples, key="python_mb")
+        report["samples"] = sampler.samples
+
+    policy = replay_policy(factor, policy)
+    if notifiers == "fake":
+        calls, feishu, aliyun, voice = fake_notifiers(latency, ack, admins)
+        run(Communication(policy=policy, scheduler=TimerScheduler(name="replay"), notifier=feishu, aliyun=aliyun,
+                          voice=voice), lambda: calls)
+    elif notifiers == "mock":
+        with MockServer(latency=latency, ack_after=ack) as server:
+            with mock_environment(server, admins, sms_phones):
+                def requests():
+                    with server._lock:
+                        return dict(server.counts)
+                run(Communication(policy=policy, scheduler=TimerScheduler(name="replay")), requests)
+    else:
+        raise ValueError(f"未知的通知渠道: {notifiers}")
+    return report
+
+
+def print_report(report):
+    cfg = report["config"]
+    print(f"\n== 回放压测 (speed={cfg['speed']}x, notifiers={cfg['notifiers']}, latency={cfg['latency']}s, "
+          f"ack_after={cfg['ack_after']}s) ==")
+    for section in ("replay", "alarms", "escalation", "scheduler", "memory", "python_memory", "requests"):
+        if section in report:
+            print(f"\n[{section}]")
+            for key, value in report[section].items():
+                print(f"  {key:<24} {value}")
+    print(f"\n  tracker_us               {report['tracker_us']}")
+    if not report["drained"]:
+        print("\n⚠️ 回放结束时仍有报警在升级中 (可调大 --drain-timeout)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检测事件 / 视频回放压测 (报警链路吞吐、合并、调度延迟、内存增长)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trace", help="检测事件轨迹 (JSONL)")
+    source.add_argument("--video", nargs="+", help="视频文件，每个文件当作一个摄像头")
+    source.add_argument("--synthetic-trace", action="store_true", help="生成随机火情 / 误检的检测事件")
+    parser.add_argument("--speed", type=float, default=10.0, help="倍速 (1~100)，0 表示不限速")
+    parser.add_argument("--max-seconds", type=float, default=None, help="最多回放多少秒 (墙上时间)")
+    parser.add_argument("--notifiers", choices=("fake", "mock"), default="fake",
+                        help="fake: 进程内替身；mock: 真实通知类 + 本地替身服务器")
+    parser.add_argument("--latency", type=float, default=0.0, help="每次接口调用的延迟 (秒)")
+    parser.add_argument("--ack-after", type=float, default=30.0, help="报警后多少秒有人确认，负数表示没人确认")
+    parser.add_argument("--cooldown", type=float, default=60, help="报警结束后的冷却期 (秒，按倍速压缩)")
+    parser.add_argument("--workers", type=int, default=4, help="报警调度线程数")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="回放结束后最多等报警走完多少秒")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="内存采样间隔 (秒)")
+    parser.add_argument("--tracemalloc", action="store_true", help="同时统计 Python 对象内存 (有额外开销)")
+    # 合成轨迹
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--minutes", type=float, default=10, help="合成轨迹的时长 (分钟)")
+    parser.add_argument("--fps", type=float, default=10, help="合成轨迹每个摄像头的帧率")
+    parser.add_argument("--fires-per-hour", type=float, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--write-trace", help="只把合成轨迹写到文件，不回放")
+    # 视频
+    parser.add_argument("--weights", default=str(config.PROJECT_ROOT / config.DETECTOR["weights"]))
+    parser.add_argument("--synthetic-model", action="store_true", help="视频检测使用 NumPy 替身模型")
+    parser.add_argument("--json", action="store_true", help="输出 JSON (包含内存采样序列)")
+    args = parser.parse_args(argv)
+
+    # 高倍速下每次火情确认都会打一条 WARNING 日志，回放时只保留错误
+    configure_logging(level=logging.ERROR)
+    if args.synthetic_trace:
+        events = synthetic_trace(args.cameras, args.minutes * 60, args.fps, args.fires_per_hour, seed=args.seed)
+        if args.write_trace:
+            print(f"已写入 {write_trace(events, args.write_trace)} 条事件: {args.write_trace}")
+            return None
+    elif args.trace:
+        events = read_trace(args.trace)
+
+    engine = None
+    if args.video:
+        from benchmark.bench_inference import SyntheticBackend
+        from core.yolo.detector import load_backend
+        from core.yolo.inference import BatchInferenceEngine
+
+        cfg = config.DETECTOR
+        backend = SyntheticBackend() if args.synthetic_model else load_backend(args.weights,
+                                                                               cfg["intra_op_threads"], cfg["int8"])
+        engine = BatchInferenceEngine(backend, max_batch=max(len(args.video), 1), max_delay_ms=cfg["max_delay_ms"],
+                                      imgsz=cfg["imgsz"], conf=cfg["conf"], iou=cfg["iou"]).start()
+        events = video_events({f"cam{i}": path for i, path in enumerate(args.video)}, engine)
+
+    try:
+        report = run_replay(events, speed=args.speed, notifiers=args.notifiers, latency=args.latency,
+                            ack_after=args.ack_after if args.ack_after >= 0 else None, cooldown=args.cooldown,
+                            workers=args.workers, max_seconds=args.max_seconds, drain_timeout=args.drain_timeout,
+                            sample_interval=args.sample_interval, trace_python=args.tracemalloc)
+    finally:
+        if engine is not None:
+            engine.stop()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,211 @@
 # 配置文件
+import os
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+
+from dotenv import dotenv_values
+
+# ---------------- .env 配置 ----------------
+PROJECT_ROOT = Path(__file__).resolve().parent
+ENV_PATH = PROJECT_ROOT / ".env"
+# 检查 .env 是否被修改的最小间隔 (秒)，间隔内直接返回缓存的快照，不做任何文件操作
+ENV_CHECK_INTERVAL = 2.0
+
+
+class EnvSnapshot:
+    """
+    .env 的只读快照
+    - 解析一次，所有模块共用；文件修改后生成新的快照，旧快照保持不变
+    - .env 里没有的键回退到进程环境变量 (方便容器部署)
+    """
+
+    __slots__ = ("values", "mtime", "version")
+
+    def __init__(self, values=None, mtime=None, version=0):
+        object.__setattr__(self, "values", MappingProxyType(dict(values or {})))
+        object.__setattr__(self, "mtime", mtime)
+        object.__setattr__(self, "version", version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("EnvSnapshot 是只读的，修改 .env 文件后会自动生成新快照")
+
+    def get(self, key, default=None):
+        value = self.values.get(key)
+        if value is None or value == "":
+            return os.environ.get(key, default)
+        return value
+
+    def prefixed(self, prefix):
+        """按前缀取出所有配置项 (如 admin_phone1, admin_phone2 ...)，返回 ((key, value), ...)"""
+        return tuple((key, value.strip()) for key, value in self.values.items()
+                     if key.startswith(prefix) and value and value.strip())
+
+    @property
+    def admin_phones(self):
+        return self.prefixed("admin_phone")
+
+    @property
+    def sms_phones(self):
+        return self.prefixed("sms_phone")
+
+    @property
+    def group_chat_id(self):
+        return self.get("feishu_group_chat_id")
+
+
+class EnvConfig:
+    """
+    .env 热加载：按 mtime 判断文件是否变化，变化时重新解析并替换快照
+    读取方拿到的是不可变快照，不需要加锁
+    """
+
+    def __init__(self, path=ENV_PATH, check_interval=ENV_CHECK_INTERVAL):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._snapshot = self._parse(version=1)
+
+    def _mtime(self):
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _parse(self, version):
+        mtime = self._mtime()
+        values = dotenv_values(self.path) if mtime is not None else {}
+        return EnvSnapshot(values, mtime, version)
+
+    def get(self):
+        """返回当前快照；距离上次检查超过 check_interval 时顺便检查文件是否变化"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._snapshot
+        return self.reload()
+
+    def reload(self, force=False):
+        """文件 mtime 变化 (或 force) 时重新解析，返回最新快照"""
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            if force or self._mtime() != self._snapshot.mtime:
+                self._snapshot = self._parse(self._snapshot.version + 1)
+            return self._snapshot
+
+
+_env_config = None
+_env_lock = threading.Lock()
+
+
+def get_env_config():
+    """进程内共享的 EnvConfig"""
+    global _env_config
+    if _env_config is None:
+        with _env_lock:
+            if _env_config is None:
+                _env_config = EnvConfig()
+    return _env_config
+
+
+def set_env_config(env_config):
+    """替换进程内共享的 EnvConfig (压测 / 测试时指向临时 .env)，返回原来的"""
+    global _env_config
+    with _env_lock:
+        previous, _env_config = _env_config, env_config
+    return previous
+
+
+def get_env():
+    """获取当前 .env 快照 (notifier 等模块统一从这里读配置)"""
+    return get_env_config().get()
+
+
+
+# 报警升级策略 (声明式，修改这里即可调整报警流程，不用改代码)
+# - stages: 按顺序执行，每个阶段最早在报警开始后 after 秒执行；有人确认后剩余阶段全部取消
+#   action 可选: group_card (群卡片) / sms (阿里云短信) / buzz (飞书加急, urgent_type: app / sms / phone)
+#                / voice (阿里云语音电话，需配置 ALI_VOICE_TTS_CODE；飞书故障时仍能打到人)
+#   required: 该阶段失败时终止整个报警 (后续阶段都依赖群消息 ID)
+# - poll_interval: 群卡片发出后，每隔多少秒检查一次回复 (开启事件回调后自动放宽为兜底间隔)
+# - ack_timeout: 等待确认的时长 (秒)，超时后不再轮询
+# - dispatch: "concurrent" 表示同一时刻到期的阶段并发发出 (加急仍会等群卡片的消息 ID)；不写则按顺序执行
+# - hedge: 群卡片的发送请求 after_ms 毫秒内没有返回消息 ID 时 (不含图片上传)，立即提前执行后面 actions 里
+#   还没执行的下一个阶段 (飞书慢 / 故障时不干等)；短信在 0 秒已和卡片同时发出，所以默认提前的是语音电话
+ESCALATION_POLICY = {
+    "dispatch": "concurrent",
+    "poll_interval": 5,
+    "fallback_poll_interval": 30,
+    "ack_timeout": 180,
+    "stages": [
+        {"after": 0, "action": "group_card", "required": True,
+         "title": "实验室火灾警报", "content": "检测到明火！请成员立即检查!!。",
+         "hedge": {"after_ms": 1500, "actions": ["voice"]}},
+        {"after": 0, "action": "sms"},
+        {"after": 0, "action": "buzz", "urgent_type": "sms"},
+        {"after": 180, "action": "buzz", "urgent_type": "phone"},
+        {"after": 180, "action": "voice"},
+    ],
+}
+
+# 管理员直达报警策略 (main.py 使用)：不经过群聊，直接发卡片给每位管理员
+# - admin_card: urgent_type 为空时走批量发送接口 (一次请求发给所有人)；
+#   需要加急时每位管理员单独发送 (加急需要各自的消息 ID)，并发执行
+# - reply_from: "admins" 表示等待任意一位管理员在单聊里回复确认
+# - on_ack: 有人确认后执行的收尾阶段
+ADMIN_ESCALATION_POLICY = {
+    "poll_interval": 5,
+    "fallback_poll_interval": 30,
+    "ack_timeout": 180,
+    "reply_from": "admins",
+    "stages": [
+        {"after": 0, "action": "admin_card", "urgent_type": "sms", "required": True,
+         "title": "实验室火灾警报", "content": "检测到明火！请在 3 分钟内回复【1】确认，否则将触发电话报警。"},
+        {"after": 180, "action": "admin_card", "urgent_type": "phone",
+         "title": "【紧急】火灾未响应", "content": "您未在规定时间内回复，系统发起自动电话通知！请立即处置！"},
+    ],
+    "on_ack": [
+        {"action": "admin_card", "title": "警报解除", "content": "管理员已响应，流程结束。", "with_image": False},
+    ],
+}
+
+# 报警日志 (core/communication/journal.py)
+# - resume_max_age: 进程重启时只恢复开始不超过这么多秒的报警；更早的记为 stale 结束，不再通知
+#   (避免几天前没结束的报警在重启时给所有人打电话)
+# - compact_every: 每结束多少个报警就清理一次日志里已结束的记录 (日志大小不随运行时间增长)
+INCIDENT_JOURNAL = {
+    "resume_max_age": 30 * 60,
+    "compact_every": 50,
+}
+
+# 火灾检测模型 (core/yolo/detector.py、core/yolo/inference.py)
+# - weights: 训练得到的权重；推理时加载同目录下导出的 best.onnx / best.torchscript
+#   (yolo export model=weights/best.pt format=onnx dynamic=True，dynamic 让同一个模型可以按任意批大小推理)
+# - intra_op_threads: 每个推理引擎的线程数，None 表示用本进程可用的全部核 (可用 benchmark/bench_inference.py 实测最优值)
+# - int8: 使用 INT8 动态量化的 ONNX 模型 (首次启动时自动生成 best.int8.onnx)
+# - max_batch / max_delay_ms: 微批推理时每批最多几帧、一帧最多等多久 (毫秒)
+DETECTOR = {
+    "weights": "weights/best.pt",
+    "imgsz": 640,
+    "conf": 0.25,
+    "iou": 0.45,
+    "intra_op_threads": None,
+    "int8": False,
+    "max_batch": 8,
+    "max_delay_ms": 10,
+}
+
+# 报警取证 (core/yolo/evidence.py)
+# - directory: 报警截图、前后几秒的录像和缩略图条的保存目录
+# - pre_seconds / post_seconds: 录像包含报警前后各多少秒；fps: 历史画面的采样帧率
+#   每个摄像头常驻内存约 (pre_seconds + post_seconds) * fps 帧 (640x480 一帧约 0.9MB)
+# - max_bytes / max_age_days: 目录总大小上限、文件最长保留天数，超出时从最旧的文件开始删除
+EVIDENCE = {
+    "directory": "output/captured_imgs",
+    "pre_seconds": 3,
+    "post_seconds": 2,
+    "fps": 4,
+    "max_bytes": 2 * 1024 ** 3,
+    "max_age_days": 30,
+}
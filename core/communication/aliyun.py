@@ -1,70 +1,79 @@
-import os
 import sys
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-# 引入 dotenv_values 用于直接读取文件
-from dotenv import load_dotenv, dotenv_values
 
 # 引入阿里云 SDK
 from alibabacloud_dysmsapi20170525.client import Client as DysmsApiClient
+from alibabacloud_dyvmsapi20170525.client import Client as DyvmsApiClient
 from alibabacloud_tea_openapi import models as open_api_models
 from alibabacloud_dysmsapi20170525 import models as dysms_models
+from alibabacloud_dyvmsapi20170525 import models as dyvms_models
 from alibabacloud_tea_util import models as util_models
 
-# 强制关闭代理
-os.environ["NO_PROXY"] = "*"
-os.environ["no_proxy"] = "*"
-
 # 引入日志
 current_file_path = Path(__file__).resolve()
 project_root = current_file_path.parent.parent.parent
 sys.path.append(str(project_root))
+import config
+from utils import metrics
 from utils.logger import setup_logger
+from core.communication.sms_fanout import SmsFanout
+from core.communication.watchdog import ALIYUN_SMS, ALIYUN_VOICE, api_call
 
 
 class AliyunNotifier:
     def __init__(self):
         self.logger = setup_logger("AliyunSMS")
 
-        # 1. 确定 .env 路径
-        current_dir = Path(__file__).resolve().parent
-        self.project_root = current_dir.parent.parent
-        self.env_path = self.project_root / ".env"
-
-        # 2. 加载环境变量
-        self._load_env()
+        # 1. 读取 .env 快照 (与飞书共用，只解析一次，文件修改后自动热加载)
+        self.env = config.get_env()
 
-        # 3. 读取配置
-        self.access_key_id = os.getenv("ALI_ACCESS_KEY_ID")
-        self.access_key_secret = os.getenv("ALI_ACCESS_KEY_SECRET")
-        self.sign_name = os.getenv("ALI_SMS_SIGN_NAME")
-        self.template_code = os.getenv("ALI_SMS_TEMPLATE_CODE")
+        # 2. 读取配置
+        self.access_key_id = self.env.get("ALI_ACCESS_KEY_ID")
+        self.access_key_secret = self.env.get("ALI_ACCESS_KEY_SECRET")
+        self.sign_name = self.env.get("ALI_SMS_SIGN_NAME")
+        self.template_code = self.env.get("ALI_SMS_TEMPLATE_CODE")
 
-        # 4. 初始化客户端
+        # 3. 初始化客户端
         self.client = self._create_client()
+        self.fanout = SmsFanout(self.client, self.sign_name, self.template_code) if self.client else None
 
-        # 5. 【新增】自动加载短信接收人列表
+        # 4. 【新增】自动加载短信接收人列表
         self.phone_numbers = []
         self._auto_load_phone_numbers()
 
-    def _load_env(self):
-        if self.env_path.exists():
-            load_dotenv(dotenv_path=self.env_path, override=True)
-        else:
-            self.logger.warning("未找到 .env 文件")
+    def refresh_config(self):
+        """
+        .env 有变化时重新加载短信接收人 (群发前自动调用)
+        :return: 配置是否有变化
+        """
+        env = config.get_env()
+        if env is self.env:
+            return False
+        old, self.env = self.env, env
+        if env.sms_phones != old.sms_phones:
+            self.logger.info("🔄 短信接收人配置有变化，重新加载...")
+            self._auto_load_phone_numbers()
+        return True
 
     def _create_client(self):
         if not self.access_key_id or not self.access_key_secret:
             self.logger.error("❌ 未配置阿里云 AccessKey")
             return None
-        config = open_api_models.Config(
+        client_config = open_api_models.Config(
             access_key_id=self.access_key_id,
-            access_key_secret=self.access_key_secret
+            access_key_secret=self.access_key_secret,
+            # 只对这个客户端关闭代理，不再改写整个进程的 NO_PROXY 环境变量
+            no_proxy="*"
         )
-        config.endpoint = f'dysmsapi.aliyuncs.com'
+        # 接口地址 (压测时指向本地替身服务器，见 benchmark/mock_server.py)
+        client_config.endpoint = self.env.get("ALI_SMS_ENDPOINT", "dysmsapi.aliyuncs.com")
+        client_config.protocol = self.env.get("ALI_SMS_PROTOCOL")
         try:
-            return DysmsApiClient(config)
+            return DysmsApiClient(client_config)
         except Exception:
             self.logger.exception("客户端初始化失败")
             return None
@@ -73,72 +82,357 @@ class AliyunNotifier:
         """
         【核心方法】自动扫描 .env 中以 sms_phone 开头的配置
         """
-        if not self.env_path.exists():
-            return
-
-        # 直接读取文件，不依赖系统缓存
-        env_config = dotenv_values(self.env_path)
-
-        count = 0
+        phone_numbers = []
         self.logger.info("正在加载短信接收人...")
 
-        for key, value in env_config.items():
-            # 只要 key 是以 sms_phone 开头的
-            if key.startswith("sms_phone") and value:
-                phone = value.strip()
-                # 简单去重
-                if phone not in self.phone_numbers:
-                    self.phone_numbers.append(phone)
-                    count += 1
-                    self.logger.info(f"✅ 已加载接收人: {key} -> {phone}")
+        # 快照里已筛出 sms_phone 开头的配置
+        for key, phone in self.env.sms_phones:
+            # 简单去重
+            if phone not in phone_numbers:
+                phone_numbers.append(phone)
+                self.logger.info("✅ 已加载接收人: %s -> %s", key, phone)
 
-        self.logger.info(f"短信列表加载完毕，共 {count} 人")
+        # 整体替换，正在群发的线程不受影响
+        self.phone_numbers = phone_numbers
+        self.logger.info("短信列表加载完毕，共 %d 人", len(phone_numbers))
 
-    def send_sms(self, phone_numbers, params=None):
-        """
-        底层发送方法
-        :param phone_numbers: 字符串 "189xxx" 或 列表 ["189xxx"]
-        """
-        if not self.client: return False
+    def probe(self):
+        """健康探测 (见 watchdog.py)：查询短信签名，AccessKey / 签名失效时返回 False"""
+        if not self.client:
+            return False
+        request = dysms_models.QuerySmsSignRequest(sign_name=self.sign_name)
+        with metrics.span("aliyun_api", op="probe_sms") as span:
+            body = self.client.query_sms_sign_with_options(request, util_models.RuntimeOptions()).body
+            if body.code != "OK":
+                span.fail()
+                self.logger.warning("短信通道探测失败: %s %s", body.code, body.message)
+            return body.code == "OK"
 
+    def build_sms_request(self, phone_numbers, params=None):
+        """构造 SendSms 请求 (同步 / 异步版本共用)"""
         # 处理列表转字符串
         if isinstance(phone_numbers, list):
             phone_numbers_str = ",".join(phone_numbers)
         else:
             phone_numbers_str = phone_numbers
 
-        # 构造请求
-        send_sms_request = dysms_models.SendSmsRequest(
+        return dysms_models.SendSmsRequest(
             sign_name=self.sign_name,
             template_code=self.template_code,
             phone_numbers=phone_numbers_str,
             template_param=json.dumps(params) if params else "{}"
         )
+
+    def send_sms(self, phone_numbers, params=None):
+        """
+        底层发送方法
+        :param phone_numbers: 字符串 "189xxx" 或 列表 ["189xxx"]
+        """
+        if not self.client: return False
+
+        send_sms_request = self.build_sms_request(phone_numbers, params)
+        phone_numbers_str = send_sms_request.phone_numbers
         runtime = util_models.RuntimeOptions()
 
-        try:
-            self.logger.info(f"正在发送短信给: {phone_numbers_str} ...")
-            resp = self.client.send_sms_with_options(send_sms_request, runtime)
+        with metrics.span("aliyun_api", op="send_sms") as span:
+            try:
+                self.logger.info("正在发送短信给: %s ...", phone_numbers_str)
+                with api_call(ALIYUN_SMS):
+                    resp = self.client.send_sms_with_options(send_sms_request, runtime)
 
-            if resp.body.code == 'OK':
-                self.logger.info(f"✅ 发送成功! ID: {resp.body.request_id}")
-                return True
-            else:
-                self.logger.error(f"❌ 发送失败: {resp.body.message}")
+                if resp.body.code == 'OK':
+                    self.logger.info("✅ 发送成功! ID: %s", resp.body.request_id)
+                    return True
+                else:
+                    span.fail()
+                    self.logger.error("❌ 发送失败: %s", resp.body.message)
+                    return False
+            except Exception as e:
+                span.fail()
+                self.logger.error("发送异常: %s", e)
                 return False
-        except Exception as e:
-            self.logger.error(f"发送异常: {e}")
-            return False
 
-    def send_sms_to_all(self, params=None):
+    def send_sms_fanout(self, phone_numbers, params=None, per_number_params=None):
+        """
+        并发群发：按接口上限切块并发发送，失败的块自动退避重试
+        :param per_number_params: 可选 {号码: 模板参数}，每人参数不同时使用 (SendBatchSms)
+        :return: SmsDeliveryResult (每个号码一条结果)，客户端未初始化时返回 None
+        """
+        if not self.fanout: return None
+        return self.fanout.send(phone_numbers, params, per_number_params)
+
+    def send_sms_to_all(self, params=None, detailed=False):
         """
         【便捷方法】一键给 .env 里配置的所有人发短信
+        :param detailed: 为 True 时返回 SmsDeliveryResult，否则返回是否全部成功
         """
+        self.refresh_config()
         if not self.phone_numbers:
             self.logger.error("❌ 没有加载到任何手机号，无法群发")
+            return None if detailed else False
+
+        result = self.send_sms_fanout(self.phone_numbers, params)
+        if detailed:
+            return result
+        return bool(result and result.ok)
+
+
+# 语音通知的产品 ID (查询通话记录时使用)
+VOICE_PROD_ID = 11000000300006
+# 通话记录里的状态码：200000 表示用户已接听
+VOICE_ANSWERED = "200000"
+
+
+class VoiceCall:
+    """单个号码的语音通知：呼叫结果 + 通话状态 (轮询得到)"""
+
+    __slots__ = ("phone", "call_id", "code", "state", "placed_at")
+
+    def __init__(self, phone, call_id=None, code=None):
+        self.phone = phone
+        self.call_id = call_id
+        self.code = code
+        self.state = None       # 通话记录里的状态码，查到之前为 None
+        self.placed_at = time.time()
+
+    @property
+    def placed(self):
+        return self.call_id is not None
+
+    @property
+    def pending(self):
+        return self.placed and self.state is None
+
+    @property
+    def answered(self):
+        return self.state == VOICE_ANSWERED
+
+    def __repr__(self):
+        return f"VoiceCall({self.phone}, call_id={self.call_id}, code={self.code}, state={self.state})"
+
+
+class VoiceCallBatch:
+    """一次群呼的结果：每个号码一条记录，finished 在状态收集结束后置位"""
+
+    def __init__(self, calls):
+        self.calls = {call.phone: call for call in calls}
+        self.finished = threading.Event()
+
+    @property
+    def ok(self):
+        """至少有一通电话成功呼出"""
+        return any(call.placed for call in self.calls.values())
+
+    @property
+    def pending(self):
+        return [call for call in self.calls.values() if call.pending]
+
+    @property
+    def answered(self):
+        return [p for p, call in self.calls.items() if call.answered]
+
+    @property
+    def failed(self):
+        return [p for p, call in self.calls.items() if not call.placed]
+
+    def __getitem__(self, phone):
+        return self.calls[phone]
+
+    def __len__(self):
+        return len(self.calls)
+
+    def __repr__(self):
+        return (f"VoiceCallBatch(placed={len(self) - len(self.failed)}, answered={len(self.answered)}, "
+                f"failed={len(self.failed)})")
+
+
+class AliyunVoiceNotifier:
+    """
+    阿里云语音通知 (文本转语音电话)，与飞书电话加急互为备份，飞书故障时仍能打到人
+    - 给 .env 里 sms_phone 开头的号码打电话，线程池限制同时呼出的数量
+    - 通话状态由一个后台线程按轮次查询，不是每通电话一个轮询线程
+      (接口只能按 call_id 逐个查：每轮最多查 QUERY_PER_ROUND 通，未出结果的电话轮流查)
+    """
+
+    CALL_CONCURRENCY = 4
+    POLL_INTERVAL = 5       # 每轮查询间隔 (秒)
+    QUERY_PER_ROUND = 10    # 每轮最多发出的通话记录查询数
+    TRACK_TIMEOUT = 180     # 最多跟踪多久 (秒)，之后仍未出结果的电话按未接通统计
+
+    def __init__(self, max_workers=CALL_CONCURRENCY):
+        self.logger = setup_logger("AliyunVoice")
+        self.env = config.get_env()
+
+        self.access_key_id = self.env.get("ALI_ACCESS_KEY_ID")
+        self.access_key_secret = self.env.get("ALI_ACCESS_KEY_SECRET")
+        self.tts_code = self.env.get("ALI_VOICE_TTS_CODE")
+        self.show_number = self.env.get("ALI_VOICE_SHOW_NUMBER")
+        self.poll_interval = self.POLL_INTERVAL
+        self.query_per_round = self.QUERY_PER_ROUND
+        self.track_timeout = self.TRACK_TIMEOUT
+
+        self.client = self._create_client()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aliyun-voice")
+
+        self.phone_numbers = []
+        self._auto_load_phone_numbers()
+
+    def refresh_config(self):
+        """.env 有变化时重新加载接收人 (群呼前自动调用)"""
+        env = config.get_env()
+        if env is self.env:
             return False
+        old, self.env = self.env, env
+        if env.sms_phones != old.sms_phones:
+            self._auto_load_phone_numbers()
+        return True
 
-        return self.send_sms(self.phone_numbers, params)
+    def _create_client(self):
+        if not self.access_key_id or not self.access_key_secret:
+            self.logger.error("❌ 未配置阿里云 AccessKey")
+            return None
+        client_config = open_api_models.Config(
+            access_key_id=self.access_key_id,
+            access_key_secret=self.access_key_secret,
+            no_proxy="*"
+        )
+        client_config.endpoint = self.env.get("ALI_VOICE_ENDPOINT", "dyvmsapi.aliyuncs.com")
+        client_config.protocol = self.env.get("ALI_VOICE_PROTOCOL") or self.env.get("ALI_SMS_PROTOCOL")
+        try:
+            return DyvmsApiClient(client_config)
+        except Exception:
+            self.logger.exception("语音客户端初始化失败")
+            return None
+
+    def _auto_load_phone_numbers(self):
+        phone_numbers = []
+        for _, phone in self.env.sms_phones:
+            if phone not in phone_numbers:
+                phone_numbers.append(phone)
+        self.phone_numbers = phone_numbers
+        self.logger.info("语音通知列表加载完毕，共 %d 人", len(phone_numbers))
+
+    def probe(self):
+        """
+        健康探测 (见 watchdog.py)：查询一条不存在的通话记录
+        AccessKey 失效 / 网络不通时 SDK 抛异常，接口正常返回就说明通道可用
+        """
+        if not self.client or not self.tts_code:
+            return False
+        request = dyvms_models.QueryCallDetailByCallIdRequest(call_id="probe", prod_id=VOICE_PROD_ID,
+                                                              query_date=int(time.time() * 1000))
+        with metrics.span("aliyun_api", op="probe_voice"):
+            self.client.query_call_detail_by_call_id_with_options(request, util_models.RuntimeOptions())
+        return True
+
+    def call(self, phone, params=None):
+        """
+        给单个号码打一通语音通知
+        :return: VoiceCall (call_id 为空表示呼叫失败)
+        """
+        request = dyvms_models.SingleCallByTtsRequest(
+            called_number=phone,
+            called_show_number=self.show_number,
+            tts_code=self.tts_code,
+            tts_param=json.dumps(params, ensure_ascii=False) if params else None
+        )
+        with metrics.span("aliyun_api", op="single_call_by_tts") as span:
+            try:
+                with api_call(ALIYUN_VOICE):
+                    body = self.client.single_call_by_tts_with_options(request, util_models.RuntimeOptions()).body
+                if body.code == "OK":
+                    return VoiceCall(phone, body.call_id, body.code)
+                span.fail()
+                self.logger.error("❌ 语音呼叫失败 %s: %s %s", phone, body.code, body.message)
+                return VoiceCall(phone, code=body.code)
+            except Exception as e:
+                span.fail()
+                self.logger.error("语音呼叫异常 %s: %s", phone, e)
+                return VoiceCall(phone, code=getattr(e, "code", None) or "InternalError")
+
+    def call_all(self, params=None, track=True):
+        """
+        【便捷方法】给所有接收人并发打电话 (立即返回，不等电话接通)
+        :param track: 为 True 时启动后台线程收集通话状态 (结果写回 VoiceCallBatch)
+        :return: VoiceCallBatch；未配置时返回 None
+        """
+        self.refresh_config()
+        if not self.client or not self.tts_code:
+            self.logger.error("❌ 未配置阿里云语音通知 (ALI_VOICE_TTS_CODE)，无法拨打电话")
+            return None
+        if not self.phone_numbers:
+            self.logger.error("❌ 没有加载到任何手机号，无法拨打电话")
+            return None
+
+        batch = VoiceCallBatch(self._pool.map(lambda phone: self.call(phone, params), self.phone_numbers))
+        if batch.failed:
+            self.logger.error("❌ 语音呼叫失败 %d/%d: %s", len(batch.failed), len(batch), batch.failed)
+        else:
+            self.logger.info("📞 语音通知已全部呼出 (%d 人)", len(batch))
+        if track and batch.ok:
+            threading.Thread(target=self.track, args=(batch,), name="aliyun-voice-track", daemon=True).start()
+        else:
+            batch.finished.set()
+        return batch
+
+    def track(self, batch):
+        """
+        按轮次查询通话状态，直到全部出结果或超时
+        每轮最多查 query_per_round 通，下一轮从上次没轮到的电话接着查，人数多时也不会饿死后面的号码
+        """
+        deadline = time.time() + self.track_timeout
+        order = list(batch.calls.values())
+        cursor = 0
+        while batch.pending and time.time() < deadline:
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.time())))
+            calls = []
+            for _ in range(len(order)):
+                call = order[cursor]
+                cursor = (cursor + 1) % len(order)
+                if call.pending:
+                    calls.append(call)
+                    if len(calls) >= self.query_per_round:
+                        break
+            self.query_states(calls)
+
+        for call in batch.calls.values():
+            if not call.placed:
+                outcome = "failed"
+            else:
+                outcome = "answered" if call.answered else "unanswered"
+            metrics.inc("aliyun_voice_calls_total", outcome=outcome)
+        self.logger.info("📞 语音通知结果: %s", batch)
+        batch.finished.set()
+        return batch
+
+    def query_states(self, calls):
+        """
+        查询一轮通话记录 (每通电话一个 QueryCallDetailByCallId 请求，经线程池并发发出)，把状态写回各 VoiceCall
+        调用方负责控制每轮的数量 (见 track)
+        """
+        list(self._pool.map(self._query_state, calls))
+
+    def _query_state(self, call):
+        request = dyvms_models.QueryCallDetailByCallIdRequest(
+            call_id=call.call_id,
+            prod_id=VOICE_PROD_ID,
+            query_date=int(call.placed_at * 1000)
+        )
+        with metrics.span("aliyun_api", op="query_call_detail") as span:
+            try:
+                with api_call(ALIYUN_VOICE):
+                    body = self.client.query_call_detail_by_call_id_with_options(request,
+                                                                                 util_models.RuntimeOptions()).body
+            except Exception as e:
+                span.fail()
+                self.logger.warning("通话状态查询异常 %s: %s", call.phone, e)
+                return
+            if body.code != "OK":
+                span.fail()
+                return
+        # 通话还没结束时没有记录，下一轮再查
+        if body.data:
+            call.state = str(json.loads(body.data).get("state") or "") or None
 
 
 # --- 测试代码 ---
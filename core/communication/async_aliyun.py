@@ -0,0 +1,66 @@
+import asyncio
+
+from alibabacloud_tea_util import models as util_models
+
+from utils import metrics
+from utils.logger import setup_logger
+from core.communication.aliyun import AliyunNotifier
+from core.communication.watchdog import ALIYUN_SMS, api_call
+
+
+class AsyncAliyunNotifier:
+    """
+    AliyunNotifier 的 asyncio 版本
+    复用同步版的客户端和接收人列表，调用 SDK 自带的 *_async 接口
+    """
+
+    def __init__(self, notifier=None):
+        self.logger = setup_logger("AliyunSMS")
+        self.notifier = notifier or AliyunNotifier()
+
+    @property
+    def phone_numbers(self):
+        return self.notifier.phone_numbers
+
+    async def send_sms(self, phone_numbers, params=None):
+        """
+        底层发送方法
+        :param phone_numbers: 字符串 "189xxx" 或 列表 ["189xxx"]
+        """
+        client = self.notifier.client
+        if not client: return False
+
+        send_sms_request = self.notifier.build_sms_request(phone_numbers, params)
+        runtime = util_models.RuntimeOptions()
+
+        with metrics.span("aliyun_api", op="send_sms") as span:
+            try:
+                self.logger.info("正在发送短信给: %s ...", send_sms_request.phone_numbers)
+                with api_call(ALIYUN_SMS):
+                    resp = await client.send_sms_with_options_async(send_sms_request, runtime)
+                if resp.body.code == 'OK':
+                    self.logger.info("✅ 发送成功! ID: %s", resp.body.request_id)
+                    return True
+                span.fail()
+                self.logger.error("❌ 发送失败: %s", resp.body.message)
+                return False
+            except Exception as e:
+                span.fail()
+                self.logger.error("发送异常: %s", e)
+                return False
+
+    async def send_sms_to_all(self, params=None):
+        """
+        一键给 .env 里配置的所有人发短信
+        切块、并发、限流重试和同步版共用 SmsFanout 的逻辑，请求走 SDK 的 *_async 接口，不占线程
+        """
+        # 和同步版一样先检查 .env 是否有变化 (读文件，放到线程池里)
+        await asyncio.to_thread(self.notifier.refresh_config)
+        if not self.phone_numbers:
+            self.logger.error("❌ 没有加载到任何手机号，无法群发")
+            return False
+        fanout = self.notifier.fanout
+        if not fanout:
+            return False
+        result = await fanout.send_async(self.phone_numbers, params)
+        return bool(result and result.ok)
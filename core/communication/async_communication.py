@@ -0,0 +1,230 @@
+import asyncio
+import threading
+import time
+
+import config
+from utils import metrics
+from utils.logger import setup_logger
+from core.communication.async_feishu import AsyncFeishuNotifier
+from core.communication.async_aliyun import AsyncAliyunNotifier
+from core.communication.delivery import MSG_ID_ACTIONS, NEEDS_MSG_ID
+from core.communication.escalation import NOTIFY_ACTIONS, EscalationState
+
+
+class AsyncCommunication:
+    """
+    报警流程的 asyncio 版本 (对应 Communication.run_fire_alarm_process_feishu)
+    - 阶段、时限、轮询间隔都按升级策略 (默认 config.ESCALATION_POLICY) 执行，和同步版 EscalationEngine 一致
+    - dispatch 为 "concurrent" 时同一时刻到期的阶段同时发出 (短信不等飞书上传 / 发卡片)，加急等卡片的消息 ID
+    - 等待回复用 asyncio.sleep，不占线程；一个事件循环可以同时跑很多个报警
+    - 线程里的调用方用 submit() / run_sync()：报警都交给同一个后台常驻的事件循环
+    """
+
+    def __init__(self, communication=None, feishu=None, aliyun=None, ack_registry=None, policy=None, voice=None):
+        """
+        :param communication: 可选，复用已有同步 Communication 里的通知器和升级策略 (不重复加载配置)
+        :param ack_registry: 可选，飞书事件回调的 AckRegistry，回复实时推送
+        :param policy: 可选，报警升级策略，默认 config.ESCALATION_POLICY
+        :param voice: 可选，AliyunVoiceNotifier (同步版，在线程池里调用)；没有时 voice 阶段记为失败
+        """
+        self.logger = setup_logger("Communication")
+        if communication is not None:
+            feishu = feishu or communication.notifier
+            aliyun = aliyun or communication.aliyun
+            ack_registry = ack_registry or communication.ack_registry
+            policy = policy or communication.escalation.policy
+            voice = voice or communication.voice
+        self.ack_registry = ack_registry
+        self.policy = policy or config.ESCALATION_POLICY
+        self.voice = voice
+        self.feishu = AsyncFeishuNotifier(feishu)
+        self.aliyun = AsyncAliyunNotifier(aliyun)
+        # submit() / run_sync() 用的后台常驻事件循环 (第一次用到时启动)
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+
+    async def close(self):
+        await self.feishu.close()
+
+    async def run_fire_alarm_process_feishu(self, image_path, wait_seconds=None, poll_interval=None):
+        """
+        :param wait_seconds: 可选，覆盖策略里的 ack_timeout；确认超时才执行的阶段 (after >= ack_timeout) 随之提前
+        :param poll_interval: 可选，覆盖策略里的 poll_interval
+        :return: True 表示有人确认，False 表示超时升级或必要阶段失败
+        """
+        self.logger.info("🔥 [协程启动] 执行群聊报警流程...")
+        start_time = time.time()
+        policy = self.policy
+        ack_timeout = policy["ack_timeout"] if wait_seconds is None else wait_seconds
+        poll_interval = policy["poll_interval"] if poll_interval is None else poll_interval
+        stages = policy["stages"]
+        due_at = [start_time + min(stage.get("after", 0), ack_timeout) for stage in stages]
+        ack_deadline = start_time + ack_timeout
+        state = EscalationState(None, str(image_path) if image_path else None, start_time)
+
+        is_confirmed = False
+        try:
+            while True:
+                # 1. 执行所有已到期的阶段
+                batch = []
+                while state.stage_idx < len(stages) and due_at[state.stage_idx] <= time.time():
+                    batch.append(stages[state.stage_idx])
+                    state.stage_idx += 1
+                if batch and not await self._run_batch(state, batch):
+                    metrics.inc("alarm_incidents_total", status="failed")
+                    return False
+
+                if state.waiter is None and state.msg_id and self.ack_registry and self.feishu.group_chat_id:
+                    state.waiter = self.ack_registry.register(state.msg_id, [self.feishu.group_chat_id], start_time)
+                    poll_interval = max(poll_interval, policy.get("fallback_poll_interval", poll_interval))
+
+                # 2. 等回复，直到下一个阶段到期或确认超时
+                idx = state.stage_idx
+                until = min(due_at[idx], ack_deadline) if idx < len(stages) else ack_deadline
+                if state.msg_id and time.time() < ack_deadline:
+                    if await self._wait_for_reply(state.msg_id, start_time, until - start_time,
+                                                  poll_interval, state.waiter):
+                        is_confirmed = True
+                        break
+                elif until > time.time():
+                    await asyncio.sleep(until - time.time())
+                if idx >= len(stages) and time.time() >= ack_deadline:
+                    break
+        finally:
+            if state.waiter:
+                self.ack_registry.unregister(state.waiter)
+            if state.msg_id:
+                self.feishu.release_reply_cursor(state.msg_id)
+
+        # 3. 结果判断 (确认后剩余阶段全部取消)
+        if is_confirmed:
+            self.logger.info("✅ 警报解除：管理员已在群内响应。")
+            metrics.observe("alarm_time_to_ack_seconds", time.time() - start_time)
+        else:
+            self.logger.info("报警升级流程结束 (无人确认)")
+        metrics.inc("alarm_incidents_total", status="acked" if is_confirmed else "timeout")
+        return is_confirmed
+
+    async def _run_batch(self, state, batch):
+        """
+        执行同一时刻到期的阶段：并发策略下同时发出，需要消息 ID 的阶段等产生消息 ID 的阶段结束后再执行
+        :return: False 表示有 required 阶段失败，报警终止
+        """
+        first = [stage for stage in batch if stage["action"] not in NEEDS_MSG_ID]
+        deferred = [stage for stage in batch if stage["action"] in NEEDS_MSG_ID]
+        if not any(stage["action"] in MSG_ID_ACTIONS for stage in first):
+            first, deferred = batch, []
+
+        results = []
+        for group in (first, deferred):
+            if self.policy.get("dispatch") == "concurrent":
+                results += await asyncio.gather(*(self._execute(state, stage) for stage in group))
+            else:
+                for stage in group:
+                    results.append(await self._execute(state, stage))
+        for stage, ok in zip(first + deferred, results):
+            if not ok and stage.get("required"):
+                self.logger.error("❌ 致命错误：%s 阶段失败，无法进行后续加急", stage["action"])
+                return False
+        return True
+
+    async def _execute(self, state, stage):
+        with metrics.span("alarm_stage", stage=stage["action"]) as span:
+            ok = await self._run_stage(state, stage)
+            if not ok:
+                span.fail()
+        if ok and stage["action"] in NOTIFY_ACTIONS and state.notified_at is None:
+            state.notified_at = time.time()
+            metrics.observe("alarm_time_to_first_notification_seconds", state.notified_at - state.start_time)
+        return ok
+
+    async def _run_stage(self, state, stage):
+        action = stage["action"]
+        params = {"time": time.strftime("%H:%M")}
+        if action == "group_card":
+            self.logger.info("Step 1: 发送群卡片...")
+            state.msg_id = await self.feishu.send_card_to_group(
+                title=stage.get("title", "实验室火灾警报"),
+                content=stage.get("content", ""),
+                image_path=state.image_path
+            )
+            return bool(state.msg_id)
+
+        if action == "sms":
+            return await self.aliyun.send_sms_to_all(params)
+
+        if action == "buzz":
+            urgent_type = stage.get("urgent_type", "sms")
+            if urgent_type == "phone":
+                self.logger.info("⚠️ 超时未回复！")
+                self.logger.info("Step 4: 升级为 [电话] 加急报警！")
+            admin_ids = self.feishu.admin_ids
+            if not state.msg_id:
+                return False
+            if not admin_ids:
+                self.logger.info("⚠️ 无管理员 ID，跳过加急")
+                return False
+            self.logger.info("对 %d 位管理员发起 [%s] 加急...", len(admin_ids), urgent_type)
+            return await self.feishu.buzz_message(state.msg_id, admin_ids, urgent_type=urgent_type)
+
+        if action == "voice":
+            if not self.voice:
+                return False
+            batch = await asyncio.to_thread(self.voice.call_all, params)
+            return bool(batch and batch.ok)
+
+        self.logger.error("异步报警流程不支持的阶段: %s", action)
+        return False
+
+    async def _wait_for_reply(self, msg_id, start_time, wait_seconds, poll_interval, waiter=None):
+        deadline = start_time + wait_seconds
+        while True:
+            if await self.feishu.check_chat_reply(start_time, incident_id=msg_id):
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            delay = min(poll_interval, remaining)
+            if waiter:
+                if await waiter.wait_async(delay):
+                    return True
+            else:
+                await asyncio.sleep(delay)
+
+    async def run_many(self, image_paths, **kwargs):
+        """同一个事件循环里并发处理多个报警"""
+        return await asyncio.gather(*(self.run_fire_alarm_process_feishu(p, **kwargs) for p in image_paths))
+
+    def submit(self, image_path, **kwargs):
+        """
+        线程安全：把报警交给后台常驻的事件循环，立即返回 concurrent.futures.Future (结果同 run_fire_alarm_process_feishu)
+        所有报警共用这一个事件循环和一个 aiohttp 会话，不会每次报警都重新建循环、重新握手
+        """
+        coro = self.run_fire_alarm_process_feishu(image_path, **kwargs)
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    def run_sync(self, image_path, **kwargs):
+        """同步调用入口 (阻塞直到流程结束)，给老代码 / 线程里使用；同样跑在后台常驻的事件循环上"""
+        return self.submit(image_path, **kwargs).result()
+
+    def shutdown(self, timeout=5):
+        """关闭 aiohttp 会话并停止后台事件循环 (进程退出或测试时调用)"""
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close(), loop).result(timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        loop.close()
+
+    def _get_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name="alarm-asyncio",
+                                                     daemon=True)
+                self._loop_thread.start()
+            return self._loop
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from utils import metrics
+from utils.logger import setup_logger
+from core.communication.feishu import FeishuNotifier
+from core.communication import watchdog
+from core.communication.http_session import DEFAULT_TIMEOUT, POOL_MAXSIZE, UNTIMED_OPS
+from core.communication.watchdog import FEISHU
+
+
+def _client_timeout(timeout):
+    connect, read = timeout
+    return aiohttp.ClientTimeout(connect=connect, sock_read=read)
+
+
+class AsyncFeishuNotifier:
+    """
+    FeishuNotifier 的 asyncio 版本 (基于 aiohttp)
+    - 配置、管理员列表、token 缓存都直接复用同步版 FeishuNotifier，不重复读取 .env
+    - 一个事件循环可以同时推进多个报警流程
+    """
+
+    def __init__(self, notifier=None):
+        self.logger = setup_logger("Feishu")
+        self.notifier = notifier or FeishuNotifier()
+        self._session = None
+
+    # --- 直接复用同步版的配置 ---
+    @property
+    def api_base(self):
+        return self.notifier.api_base
+
+    @property
+    def admin_ids(self):
+        return self.notifier.admin_ids
+
+    @property
+    def group_chat_id(self):
+        return self.notifier.group_chat_id
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=POOL_MAXSIZE, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=_client_timeout(DEFAULT_TIMEOUT))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _get_tenant_access_token(self):
+        cache = self.notifier.token_cache
+        if not cache:
+            return None
+        # 缓存命中时不切线程；需要刷新时放到线程池里，避免阻塞事件循环
+        return cache.get_cached() or await asyncio.to_thread(cache.get)
+
+    async def _request(self, method, path, timeout=None, op=None, **kwargs):
+        """
+        :param op: 接口名，耗时统计与同步版共用 feishu_api_seconds{op=...}
+        每次调用同时上报给渠道看门狗 (见 watchdog.report)
+        """
+        token = await self._get_tenant_access_token()
+        if not token:
+            return None
+        headers = {"Authorization": f"Bearer {token}"}
+        if timeout:
+            kwargs["timeout"] = _client_timeout(timeout)
+        begin = time.perf_counter()
+        with metrics.span("feishu_api", op=op or "other") as span:
+            try:
+                async with self._get_session().request(method, f"{self.api_base}{path}", headers=headers,
+                                                       **kwargs) as resp:
+                    if resp.status >= 400:
+                        span.fail()
+                    # 和同步版 http_session 同样的口径上报给渠道看门狗：5xx、429 限流算渠道失败
+                    degraded = resp.status >= 500 or resp.status == 429
+                    watchdog.report(FEISHU, not degraded,
+                                    None if op in UNTIMED_OPS else time.perf_counter() - begin,
+                                    f"HTTP {resp.status}" if degraded else None)
+                    return await resp.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                watchdog.report(FEISHU, False, time.perf_counter() - begin, repr(e))
+                raise
+
+    async def upload_image(self, image_path):
+        """上传图片 (与同步版共用 image_key 缓存，同一张图只上传一次)"""
+        return await self._image_key(self.notifier.prefetch_image(image_path))
+
+    async def _image_key(self, future):
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception:
+            self.logger.exception("图片上传异常")
+            return None
+
+    async def buzz_message(self, message_id, user_id_list, urgent_type="sms"):
+        """加急 (同 FeishuNotifier.buzz_message)"""
+        data = {"user_id_list": user_id_list, "urgent_type": urgent_type}
+        try:
+            res = await self._request("PATCH", f"/im/v1/messages/{message_id}/urgent_{urgent_type}",
+                                      op=f"urgent_{urgent_type}", params={"user_id_type": "open_id"}, json=data)
+            if res and res.get("code") == 0:
+                self.logger.info("🚀 [%s] 加急发送成功！", urgent_type)
+                return True
+            self.logger.error("加急失败: %s", res)
+            return False
+        except Exception:
+            self.logger.exception("加急异常")
+            return False
+
+    async def send_card_to_group(self, title, content, image_path=None):
+        """
+        发送卡片到群聊，并返回 message_id
+        """
+        # 图片先开始后台上传，同时和同步版一样检查 .env 是否有变化 (可能要重新加载管理员，放到线程池里)
+        image_future = self.notifier.prefetch_image(image_path) if image_path else None
+        await asyncio.to_thread(self.notifier.refresh_config)
+        if not self.group_chat_id:
+            self.logger.error("❌ 未配置 feishu_group_chat_id")
+            return None
+
+        image_key = await self._image_key(image_future) if image_future else None
+        time_str = time.strftime("%Y-%m-%d %H:%M:%S")
+        card_content = self.notifier.build_alarm_card(title, content, time_str, image_key)
+
+        params = {"receive_id_type": "chat_id"}
+        body = {
+            "receive_id": self.group_chat_id,
+            "msg_type": "interactive",
+            "content": json.dumps(card_content)
+        }
+        try:
+            res = await self._request("POST", "/im/v1/messages", op="send_card", params=params, json=body)
+            if res and res.get("code") == 0:
+                msg_id = res.get("data", {}).get("message_id")
+                self.logger.info("群消息发送成功 ID: %s", msg_id)
+                return msg_id
+            self.logger.error("群发失败: %s", res)
+            return None
+        except Exception:
+            self.logger.exception("发送异常")
+            return None
+
+    async def check_chat_reply(self, start_time_ts, incident_id=None, chat_id=None):
+        """检查群里有没有人回复 (增量轮询，游标与同步版共用)"""
+        chat_id = chat_id or self.group_chat_id
+        if not chat_id:
+            return False
+        cursor = self.notifier.poll_cursors.get(incident_id or start_time_ts, chat_id, start_time_ts)
+        try:
+            for _ in range(cursor.MAX_PAGES_PER_POLL):
+                res = await self._request("GET", "/im/v1/messages", op="list_messages", params=cursor.build_params())
+                if not res or res.get("code") != 0:
+                    self.logger.warning("轮询接口报错: %s", res)
+                    return False
+                confirmed, has_more = cursor.consume(res.get("data", {}), FeishuNotifier.is_confirm_message)
+                if confirmed:
+                    self.logger.info("✅ 检测到确认回复")
+                    return True
+                if not has_more:
+                    break
+            return False
+        except Exception:
+            self.logger.exception("轮询异常")
+            return False
+
+    def release_reply_cursor(self, incident_id):
+        self.notifier.release_reply_cursor(incident_id)
@@ -0,0 +1,91 @@
+import threading
+
+
+class ChatPollCursor:
+    """
+    单个报警在单个会话上的增量轮询状态
+    - 下次轮询从上次看到的最后一条消息的时间开始拉，而不是每次都拉整个窗口
+    - 跟随 has_more / page_token 翻页，群里消息再多也不会漏掉确认回复
+    - 已处理过的 message_id 不再解析 (只保留边界那一秒的 ID，内存不随窗口增长)
+    """
+
+    __slots__ = ("chat_id", "since_sec", "page_token", "seen_ids", "_boundary_ms")
+
+    # 单次轮询最多翻几页，剩下的留给下一次 (保存 page_token 继续)
+    MAX_PAGES_PER_POLL = 5
+
+    def __init__(self, chat_id, start_time_ts):
+        self.chat_id = chat_id
+        # 与原逻辑一致：往前多看 10 秒
+        self.since_sec = int(start_time_ts - 10)
+        self.page_token = None
+        self.seen_ids = {}
+        self._boundary_ms = self.since_sec * 1000
+
+    def build_params(self):
+        params = {
+            "container_id_type": "chat",
+            "container_id": self.chat_id,
+            "start_time": str(self.since_sec),
+            "sort_type": "ByCreateTimeAsc",
+            "page_size": 50
+        }
+        if self.page_token:
+            params["page_token"] = self.page_token
+        return params
+
+    def consume(self, data, matcher):
+        """
+        处理一页接口返回
+        :param data: 接口返回里的 data 字段
+        :param matcher: 判断单条消息是否为确认回复的函数
+        :return: (是否检测到确认, 是否还需要继续翻页)
+        """
+        confirmed = False
+        for msg in data.get("items") or []:
+            msg_id = msg.get("message_id")
+            if msg_id in self.seen_ids:
+                continue
+            create_ms = int(msg.get("create_time") or 0)
+            self.seen_ids[msg_id] = create_ms
+            if create_ms > self._boundary_ms:
+                self._boundary_ms = create_ms
+            if not confirmed and matcher(msg):
+                confirmed = True
+
+        if data.get("has_more") and data.get("page_token"):
+            self.page_token = data.get("page_token")
+            return confirmed, True
+
+        # 这一轮拉完了：起点推进到最新消息所在的秒，只保留这一秒内的 ID 用于去重
+        self.page_token = None
+        self.since_sec = self._boundary_ms // 1000
+        boundary = self.since_sec * 1000
+        self.seen_ids = {k: v for k, v in self.seen_ids.items() if v >= boundary}
+        return confirmed, False
+
+
+class ChatPollCursors:
+    """按 (报警, 会话) 保存的游标表，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cursors = {}
+
+    def get(self, incident_key, chat_id, start_time_ts):
+        key = (incident_key, chat_id)
+        with self._lock:
+            cursor = self._cursors.get(key)
+            if cursor is None:
+                cursor = ChatPollCursor(chat_id, start_time_ts)
+                self._cursors[key] = cursor
+            return cursor
+
+    def release(self, incident_key):
+        """报警结束后释放该报警的所有游标"""
+        with self._lock:
+            for key in [k for k in self._cursors if k[0] == incident_key]:
+                del self._cursors[key]
+
+    def __len__(self):
+        return len(self._cursors)
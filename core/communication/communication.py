@@ -1,72 +1,75 @@
 import threading
-import time
+
+import config
 from core.communication.feishu import FeishuNotifier
 from utils.logger import setup_logger
-from core.communication.aliyun import AliyunNotifier  # 导入新模块
+from core.communication.aliyun import AliyunNotifier, AliyunVoiceNotifier  # 导入新模块
+from core.communication.async_communication import AsyncCommunication
+from core.communication.escalation import EscalationEngine
 
 
 def get_sms_phones():
-    # 这里返回需要接收短信的管理员手机号列表
-    return ["13800138000", "13900139000"]  # 示例手机号列表
+    # 这里返回需要接收短信的管理员手机号列表 (.env 里 sms_phone 开头的配置，修改后自动生效)
+    return [phone for _, phone in config.get_env().sms_phones]
 
 
 class Communication:
 
-    def __init__(self):
+    def __init__(self, ack_registry=None, policy=None, scheduler=None, journal=None, watchdog=None,
+                 notifier=None, aliyun=None, voice=None):
+        """
+        :param ack_registry: 可选，飞书事件回调的 AckRegistry (见 event_server.py)
+                             传入后回复会被实时推送过来，毫秒级解除等待
+        :param policy: 可选，报警升级策略，默认 config.ESCALATION_POLICY
+        :param scheduler: 可选，定时器，默认进程内共享的单线程定时器
+        :param journal: 可选，IncidentJournal (见 journal.py)
+                        传入后每次阶段变化都会落盘，启动时自动恢复上次未结束的报警
+        :param watchdog: 可选，HealthWatchdog (见 watchdog.py)，报警时绕开已降级的渠道
+                         可用 watchdog.add_notifiers(comm.notifier, comm.aliyun, comm.voice).start() 开始探测
+        :param notifier / aliyun / voice: 可选，替换默认的 FeishuNotifier / AliyunNotifier / AliyunVoiceNotifier
+                                          (压测和回放时换成进程内的替身，见 benchmark/replay.py)
+        """
         self.logger = setup_logger("Communication")
-        self.aliyun = AliyunNotifier()  # 初始化阿里云
-        self.notifier = FeishuNotifier()
-
-    def run_fire_alarm_process_feishu(self, image_path):
-        self.logger.info(f"🔥 [线程启动] 执行群聊报警流程...")
-        start_time = time.time()
-
-        # 1. 发送群消息
-        self.logger.info("Step 1: 发送群卡片...")
-        msg_id = self.notifier.send_card_to_group(
-            title="实验室火灾警报",
-            content="检测到明火！请成员立即检查!!。",
-            image_path=image_path
-        )
-
-        if not msg_id:
-            self.logger.error("❌ 致命错误：群消息发送失败，无法进行后续加急")
-            return
-
-        sms_params = {
-            "time": time.strftime("%H:%M")
-        }
-
-        self.aliyun.send_sms_to_all(sms_params)
-
-        # 2. 短信加急 (Buzz)
-        # 虽然消息在群里，但我们可以指定“只提醒这几个管理员”
-        if self.notifier.admin_ids:
-            self.logger.info(f"Step 2: 对 {len(self.notifier.admin_ids)} 位管理员发起 [短信] 加急...")
-            self.notifier.buzz_message(msg_id, self.notifier.admin_ids, urgent_type="sms")
-        else:
-            self.logger.info("⚠️ 无管理员 ID，跳过加急")
+        self.aliyun = aliyun or AliyunNotifier()  # 初始化阿里云
+        self.voice = voice or AliyunVoiceNotifier()  # 阿里云语音通知 (飞书电话加急之外的第二条电话通道)
+        self.notifier = notifier or FeishuNotifier()
+        self.ack_registry = ack_registry
+        self.escalation = EscalationEngine(self.notifier, self.aliyun, policy=policy,
+                                           scheduler=scheduler, ack_registry=ack_registry, journal=journal,
+                                           voice=self.voice, watchdog=watchdog)
+        if journal:
+            self.escalation.resume()
+        self._async = None
+        self._async_lock = threading.Lock()
 
-        # 3. 等待回复 (3分钟)
-        wait_seconds = 180
-        is_confirmed = False
-        self.logger.info(f"Step 3: 等待群回复 (限时 {wait_seconds} 秒)...")
+    def async_communication(self):
+        """进程内常驻的 AsyncCommunication：所有并发版报警共用一个事件循环和 aiohttp 会话"""
+        with self._async_lock:
+            if self._async is None:
+                self._async = AsyncCommunication(self)
+            return self._async
 
-        for i in range(wait_seconds // 5):
-            if self.notifier.check_chat_reply(start_time):
-                is_confirmed = True
-                break
-            time.sleep(5)
+    def run_fire_alarm_process_concurrent(self, image_path):
+        """
+        并发版报警流程 (asyncio)：按同一份升级策略执行，默认策略下短信与飞书卡片同时发出
+        同步阻塞调用，报警交给常驻的事件循环 (见 async_communication())，多个线程同时调用也共用一个循环
+        """
+        return self.async_communication().run_sync(image_path)
 
-        # 4. 结果判断
-        if is_confirmed:
-            self.logger.info("✅ 警报解除：管理员已在群内响应。")
-            # 可选：再发一条群消息告知大家
-            # notifier.send_card_to_group("警报解除", "管理员已确认。")
-        else:
-            self.logger.info("⚠️ 超时未回复！")
-            self.logger.info("Step 4: 升级为 [电话] 加急报警！")
+    def start_fire_alarm(self, image_path, incident_id=None, source=None):
+        """
+        发起报警并立即返回 (推荐)
+        后续的加急、轮询、电话升级全部由共享定时器驱动，不占用调用方线程
+        :param source: 可选，摄像头 / 区域标识，同一来源进行中的报警不会重复发起
+        :return: EscalationState，可用 state.status 查看进度
+        """
+        return self.escalation.start(image_path, incident_id, source=source)
 
-            # 对同一条消息发起电话加急 (或者你可以发一条新的再加急)
-            if self.notifier.admin_ids:
-                self.notifier.buzz_message(msg_id, self.notifier.admin_ids, urgent_type="phone")
+    def run_fire_alarm_process_feishu(self, image_path, source=None):
+        """
+        同步版：发起报警并阻塞到流程结束 (兼容老代码)
+        :return: True 表示有人确认
+        """
+        state = self.start_fire_alarm(image_path, source=source)
+        self.escalation.wait(state)
+        return state.acked
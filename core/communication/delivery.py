@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from utils import metrics
+from utils.logger import setup_logger
+
+# 会产生飞书消息 ID 的阶段，以及依赖这个消息 ID 的阶段 (加急必须等卡片发出后才能执行)
+MSG_ID_ACTIONS = frozenset(["group_card"])
+NEEDS_MSG_ID = frozenset(["buzz"])
+
+
+class DeliveryCoordinator:
+    """
+    报警渠道并发投递
+    - 同一时刻到期的阶段同时发出 (飞书卡片慢不会拖住阿里云短信)，只有加急等待卡片的消息 ID
+    - 对冲 (hedge)：飞书卡片的发送请求在 after_ms 内没有返回消息 ID，就立即发出指定的后续渠道 (语音电话)
+      只对发送这一步计时：图片上传慢 (读超时 30 秒) 不触发对冲
+    - 报警被确认后 cancel()：还没开始的投递直接取消，已经在执行的请求结束后不再继续
+    """
+
+    def __init__(self, max_workers=8):
+        self.logger = setup_logger("Delivery")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="delivery")
+        self._lock = threading.Lock()
+        self._inflight = {}   # incident_id -> [Future]
+
+    def run(self, state, batch, execute, hedge=None):
+        """
+        并发执行一批阶段并等待全部结束
+        :param batch: [(阶段序号, 阶段配置)]
+        :param execute: execute(state, stage, on_send=None) -> bool，真正执行一个阶段；
+                        产生消息 ID 的阶段在真正发出消息请求前调用 on_send()
+        :param hedge: 可选，(等待秒数, [(阶段序号, 阶段配置)])：卡片超时未返回时提前执行的后续阶段
+        :return: ({阶段序号: True / False / None(已取消)}, 提前执行的阶段序号列表)
+        """
+        futures = {}
+        deferred = []
+        primary = None
+        sending = threading.Event()
+        for idx, stage in batch:
+            if primary is not None and stage["action"] in NEEDS_MSG_ID:
+                deferred.append((idx, stage))
+                continue
+            if primary is None and stage["action"] in MSG_ID_ACTIONS:
+                futures[idx] = primary = self._submit(state, stage, execute, sending)
+            else:
+                futures[idx] = self._submit(state, stage, execute)
+
+        hedged = []
+        if primary is not None and hedge and hedge[1]:
+            delay, stages = hedge
+            if delay > 0:
+                # 从消息请求发出时开始计时 (阶段提前结束也会置位)
+                sending.wait()
+            done, _ = wait([primary], timeout=delay)
+            if not done and not state.done and stages:
+                self.logger.warning("⏱️ [报警 %s] 飞书 %dms 内未返回，提前发出: %s",
+                                    state.incident_id, int(delay * 1000),
+                                    ", ".join(stage["action"] for _, stage in stages))
+                metrics.inc("alarm_hedge_total")
+                for idx, stage in stages:
+                    futures[idx] = self._submit(state, stage, execute)
+                    hedged.append(idx)
+
+        if deferred:
+            wait([primary])
+            for idx, stage in deferred:
+                futures[idx] = self._submit(state, stage, execute)
+
+        wait(futures.values())
+        with self._lock:
+            self._inflight.pop(state.incident_id, None)
+        results = {idx: self._outcome(state, future) for idx, future in futures.items()}
+        return results, hedged
+
+    def cancel(self, incident_id):
+        """取消某个报警还没开始的投递"""
+        with self._lock:
+            futures = self._inflight.pop(incident_id, ())
+        cancelled = sum(future.cancel() for future in futures)
+        if cancelled:
+            metrics.inc("alarm_delivery_cancelled_total", cancelled)
+        return cancelled
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _submit(self, state, stage, execute, sending=None):
+        future = self._executor.submit(self._guard, state, stage, execute, sending)
+        with self._lock:
+            self._inflight.setdefault(state.incident_id, []).append(future)
+        return future
+
+    def _outcome(self, state, future):
+        if future.cancelled():
+            return None
+        error = future.exception()
+        if error is not None:
+            self.logger.error("❌ [报警 %s] 投递异常: %r", state.incident_id, error)
+            return False
+        return future.result()
+
+    @staticmethod
+    def _guard(state, stage, execute, sending=None):
+        try:
+            # 排队期间报警已被确认：不再发出
+            if state.done:
+                return None
+            if sending is None:
+                return execute(state, stage)
+            return execute(state, stage, on_send=sending.set)
+        finally:
+            if sending is not None:
+                sending.set()
@@ -0,0 +1,144 @@
+import itertools
+import queue
+import threading
+import time
+
+from utils.logger import setup_logger
+
+# submit() 的处理结果
+OPENED = "opened"          # 新建报警，已进入队列
+COALESCED = "coalesced"    # 该摄像头已有进行中的报警，只计数，不重复升级
+SUPPRESSED = "suppressed"  # 报警刚结束，处于冷却期
+DROPPED = "dropped"        # 队列已满，丢弃
+
+
+class Incident:
+    """一次报警 (同一摄像头 / 区域连续检测到的火情合并为一个 Incident)"""
+
+    __slots__ = ("incident_id", "source", "opened_at", "last_seen", "image_path", "detections", "closed_at")
+
+    def __init__(self, incident_id, source, image_path):
+        self.incident_id = incident_id
+        self.source = source
+        self.opened_at = time.time()
+        self.last_seen = self.opened_at
+        # 触发报警的截图 (后续检测的前后录像由 EvidenceRecorder 另存，见 core/yolo/evidence.py)
+        self.image_path = image_path
+        self.detections = 1
+        self.closed_at = None
+
+
+class AlarmDispatcher:
+    """
+    报警调度器 (取代"每次检测到火就开一个线程")
+    - 固定数量的工作线程 + 有界队列，线程数和 API 配额不随检测次数增长
+    - 同一摄像头 / 区域在报警进行中再次检测到火：只计数，不重复升级
+    - 报警结束后有冷却期，冷却期内的检测直接忽略
+    """
+
+    def __init__(self, handler, max_workers=4, max_queue=32, cooldown=60):
+        """
+        :param handler: 处理函数，接收 Incident，在工作线程里执行
+                        推荐发起报警后立即返回 EscalationState (例如 Communication.start_fire_alarm)：
+                        工作线程马上空出来，报警保持"进行中"直到升级流程结束；
+                        返回其他值则 handler 返回即视为报警结束
+        :param cooldown: 报警结束后同一来源的冷却秒数
+        """
+        self.logger = setup_logger("Dispatcher")
+        self.handler = handler
+        self.cooldown = cooldown
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._open = {}            # source -> 进行中的 Incident
+        self._cooldown_until = {}  # source -> 冷却结束时间
+        self._ids = itertools.count(1)
+        self._active = 0
+        self._counters = {OPENED: 0, COALESCED: 0, SUPPRESSED: 0, DROPPED: 0, "failed": 0}
+
+        self._workers = []
+        for i in range(max_workers):
+            t = threading.Thread(target=self._worker, name=f"alarm-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def submit(self, source, image_path=None):
+        """
+        提交一次检测结果 (检测线程调用，不阻塞)
+        :param source: 摄像头 / 区域标识
+        :return: (处理结果, Incident 或 None)
+        """
+        now = time.time()
+        with self._lock:
+            incident = self._open.get(source)
+            if incident is not None:
+                incident.last_seen = now
+                incident.detections += 1
+                self._counters[COALESCED] += 1
+                return COALESCED, incident
+
+            if now < self._cooldown_until.get(source, 0):
+                self._counters[SUPPRESSED] += 1
+                return SUPPRESSED, None
+
+            incident = Incident(f"{source}-{next(self._ids)}", source, image_path)
+            try:
+                self._queue.put_nowait(incident)
+            except queue.Full:
+                self._counters[DROPPED] += 1
+                self.logger.error("❌ 报警队列已满，丢弃: %s", source)
+                return DROPPED, None
+            self._open[source] = incident
+            self._counters[OPENED] += 1
+
+        self.logger.info("🔥 新报警 %s 已入队", incident.incident_id)
+        return OPENED, incident
+
+    def metrics(self):
+        """队列深度、进行中数量、各类计数"""
+        with self._lock:
+            data = dict(self._counters)
+            data["queue_depth"] = self._queue.qsize()
+            data["active"] = self._active
+            data["open_incidents"] = len(self._open)
+        return data
+
+    def shutdown(self, wait=True):
+        """停止工作线程 (队列里已有的报警会先处理完)"""
+        for _ in self._workers:
+            self._queue.put(None)
+        if wait:
+            for t in self._workers:
+                t.join()
+
+    def _worker(self):
+        while True:
+            incident = self._queue.get()
+            if incident is None:
+                return
+            with self._lock:
+                self._active += 1
+            result = None
+            try:
+                result = self.handler(incident)
+            except Exception:
+                with self._lock:
+                    self._counters["failed"] += 1
+                self.logger.exception("报警处理异常: %s", incident.incident_id)
+            finally:
+                # handler 只是发起了报警 (返回 EscalationState)：等升级流程结束再关闭，不占用工作线程
+                add_done_callback = getattr(result, "add_done_callback", None)
+                if add_done_callback is not None:
+                    add_done_callback(lambda _, incident=incident: self._close(incident))
+                else:
+                    self._close(incident)
+                with self._lock:
+                    self._active -= 1
+
+    def _close(self, incident):
+        incident.closed_at = time.time()
+        with self._lock:
+            if self._open.get(incident.source) is incident:
+                del self._open[incident.source]
+            self._cooldown_until[incident.source] = incident.closed_at + self.cooldown
+        self.logger.info("报警 %s 结束 (共合并 %d 次检测)", incident.incident_id, incident.detections)
@@ -0,0 +1,519 @@
+import itertools
+import threading
+import time
+
+import config
+from utils import metrics
+from utils.logger import setup_logger, elapsed_ms
+from core.communication import journal as incident_journal
+from core.communication.delivery import DeliveryCoordinator
+from core.communication.scheduler import get_default_scheduler
+from core.communication.watchdog import ACTION_CHANNELS, FEISHU
+
+# 报警状态
+PENDING = "pending"      # 升级中 / 等待确认
+ACKED = "acked"          # 已有人确认
+TIMEOUT = "timeout"      # 所有阶段执行完仍无人确认
+FAILED = "failed"        # 必要阶段失败 (如群消息发不出去)
+STALE = "stale"          # 进程重启时报警已过期太久，不再恢复
+
+# 会真正通知到人的阶段 (用于统计"首次通知耗时")
+NOTIFY_ACTIONS = frozenset(["group_card", "admin_card", "sms", "buzz", "voice"])
+
+# 保护 EscalationState.callbacks (注册和报警结束可能在不同线程同时发生)
+_callbacks_lock = threading.Lock()
+
+
+class EscalationState:
+    """
+    单个报警的升级状态
+    只保存几个字段，由定时器驱动，不占用线程
+    """
+
+    __slots__ = ("incident_id", "image_path", "start_time", "msg_id", "stage_idx", "next_poll",
+                 "status", "waiter", "handle", "chat_ids", "notified_at", "source", "hedged", "callbacks")
+
+    def __init__(self, incident_id, image_path, start_time, source=None):
+        self.incident_id = incident_id
+        self.image_path = image_path
+        self.start_time = start_time
+        self.msg_id = None
+        self.stage_idx = 0
+        self.next_poll = None
+        self.status = PENDING
+        self.waiter = None
+        self.handle = None
+        # 等待确认的会话 (群聊或管理员单聊)
+        self.chat_ids = ()
+        # 第一次成功通知到人的时间
+        self.notified_at = None
+        # 报警来源 (摄像头 / 区域)，同一来源同时只有一个进行中的报警
+        self.source = source
+        # 因对冲提前执行过的阶段序号 (到点时跳过)
+        self.hedged = ()
+        # 报警结束时调用的回调 (见 add_done_callback)
+        self.callbacks = ()
+
+    @property
+    def done(self):
+        return self.status != PENDING
+
+    def add_done_callback(self, fn):
+        """
+        报警结束时调用 fn(state) (在结束报警的线程里执行)；已经结束的报警立即调用
+        用法同 concurrent.futures.Future.add_done_callback，调用方不必占着线程等待
+        """
+        with _callbacks_lock:
+            if not self.done:
+                self.callbacks += (fn,)
+                return
+        fn(self)
+
+    @property
+    def acked(self):
+        return self.status == ACKED
+
+
+class EscalationEngine:
+    """
+    声明式报警升级引擎
+    - 每个报警只在定时器堆里保留"下一步动作" (执行阶段 / 轮询回复 / 结束)
+    - 所有报警共用一个定时线程，取代每个报警一个 sleep 循环线程
+    - 升级策略 (阶段、超时、渠道) 由 config.ESCALATION_POLICY 描述
+    """
+
+    def __init__(self, notifier, aliyun, policy=None, scheduler=None, ack_registry=None, journal=None,
+                 delivery=None, voice=None, watchdog=None, resume_max_age=None):
+        self.logger = setup_logger("Communication")
+        self.notifier = notifier
+        self.aliyun = aliyun
+        # 可选，AliyunVoiceNotifier：voice 阶段用它打语音电话 (不依赖飞书)
+        self.voice = voice
+        # 可选，HealthWatchdog：根据渠道健康度调整顺序、立即对冲、绕开降级渠道
+        self.watchdog = watchdog
+        self.policy = policy or config.ESCALATION_POLICY
+        self.scheduler = scheduler or get_default_scheduler()
+        self.ack_registry = ack_registry
+        # 可选，IncidentJournal：记录每次阶段变化，进程重启后用 resume() 接着执行
+        self.journal = journal
+        # resume() 只恢复开始不超过这么多秒的报警 (默认 config.INCIDENT_JOURNAL["resume_max_age"])
+        self.resume_max_age = (config.INCIDENT_JOURNAL["resume_max_age"] if resume_max_age is None
+                               else resume_max_age)
+        # policy["dispatch"] 为 "concurrent" 时，同一时刻到期的渠道由它并发投递
+        self._delivery = delivery
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._done_cond = threading.Condition(self._lock)
+        self._incidents = {}
+        self._by_source = {}
+
+    # ---------------- 对外接口 ----------------
+
+    def start(self, image_path, incident_id=None, source=None):
+        """
+        发起一个报警 (立即返回)，返回 EscalationState
+        :param source: 可选，报警来源；该来源已有进行中的报警 (包括重启后恢复的) 时直接返回那个报警
+        """
+        incident_id = incident_id or f"alarm-{int(time.time())}-{next(self._ids)}"
+        state = EscalationState(incident_id, image_path, time.time(), source)
+        with self._lock:
+            existing = self._by_source.get(source) if source is not None else None
+            if existing is not None and not existing.done:
+                self.logger.info("[报警 %s] %s 的报警仍在进行，合并本次检测", existing.incident_id, source)
+                return existing
+            self._register(state)
+        if self.journal:
+            self.journal.record(incident_id, incident_journal.START, image_path=image_path,
+                                start_time=state.start_time, source=source)
+        self.logger.info("🔥 [报警 %s] 开始执行群聊报警流程...", incident_id)
+        self._schedule(state, state.start_time)
+        return state
+
+    def resume(self):
+        """
+        回放报警日志，接着执行上次进程退出时还没结束的报警 (程序启动时调用一次)
+        - 已执行的阶段不再重复；重启期间已经到期的阶段立即执行
+        - 确认超时仍从报警最初的开始时间算起
+        - 进程正好在某个阶段执行中退出时，该阶段会再执行一次 (宁可重复通知，不能漏掉)
+        - 开始时间早于 resume_max_age 秒之前的报警记为 STALE 结束，不再通知任何人
+        :return: 恢复的 EscalationState 列表
+        """
+        if not self.journal:
+            return []
+        now = time.time()
+        states = []
+        for record in self.journal.open_incidents():
+            age = now - record["start_time"]
+            if age > self.resume_max_age:
+                self.logger.warning("⌛ [报警 %s] 已过去 %.0f 分钟，不再恢复", record["incident_id"], age / 60)
+                self.journal.record(record["incident_id"], incident_journal.FINISH, status=STALE)
+                metrics.inc("alarm_incidents_total", status=STALE)
+                continue
+            state = EscalationState(record["incident_id"], record.get("image_path"), record["start_time"],
+                                    record.get("source"))
+            state.stage_idx = record.get("stage_idx", 0)
+            state.msg_id = record.get("msg_id")
+            state.chat_ids = tuple(record.get("chat_ids") or ())
+            state.notified_at = record.get("notified_at")
+            state.hedged = tuple(record.get("hedged") or ())
+            with self._lock:
+                if state.incident_id in self._incidents:
+                    continue
+                self._register(state)
+            if state.chat_ids:
+                if self.ack_registry:
+                    state.waiter = self.ack_registry.register(state.incident_id, state.chat_ids, state.start_time)
+                    state.waiter.add_callback(lambda waiter, s=state: self.acknowledge(s.incident_id))
+                # 重启期间可能已经有人回复，先查一次
+                state.next_poll = now
+            self.logger.warning("♻️ [报警 %s] 进程重启后恢复，从第 %d 个阶段继续",
+                                state.incident_id, state.stage_idx + 1,
+                                extra={"incident_id": state.incident_id, "step": "resume",
+                                       "elapsed_ms": elapsed_ms(state.start_time)})
+            metrics.inc("alarm_incidents_resumed_total")
+            self._schedule(state, now)
+            states.append(state)
+        self.journal.compact()
+        return states
+
+    def acknowledge(self, incident_id):
+        """外部确认 (如事件回调)：立即结束该报警，取消后续所有阶段"""
+        with self._lock:
+            state = self._incidents.get(incident_id)
+        if state is None or state.done:
+            return False
+        if state.handle is not None:
+            self.scheduler.cancel(state.handle)
+        self._finish(state, ACKED)
+        return True
+
+    def wait(self, state, timeout=None):
+        """阻塞等待报警结束 (兼容老的同步调用方式)"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._done_cond:
+            while not state.done:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._done_cond.wait(remaining)
+        return state.done
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._incidents)
+
+    # ---------------- 内部实现 ----------------
+
+    @property
+    def delivery(self):
+        if self._delivery is None:
+            with self._lock:
+                if self._delivery is None:
+                    self._delivery = DeliveryCoordinator()
+        return self._delivery
+
+    def _register(self, state):
+        """调用方需持有 self._lock"""
+        self._incidents[state.incident_id] = state
+        if state.source is not None:
+            self._by_source[state.source] = state
+
+    def _schedule(self, state, due):
+        # 阶段和轮询都会阻塞在网络请求上，走定时器的 I/O 线程池
+        state.handle = self.scheduler.call_at(due, self._step, state, io=True)
+
+    def _step(self, state):
+        """定时器到点：执行所有已到期的阶段 / 轮询，然后安排下一次"""
+        if state.done:
+            return
+        now = time.time()
+        stages = self.policy["stages"]
+
+        # 1. 执行到期的阶段
+        batch = []
+        while state.stage_idx < len(stages) and state.start_time + stages[state.stage_idx].get("after", 0) <= now:
+            if state.stage_idx not in state.hedged:
+                batch.append((state.stage_idx, stages[state.stage_idx]))
+            state.stage_idx += 1
+        if self.watchdog and batch:
+            # 降级渠道排到最后：健康渠道先通知到人
+            batch.sort(key=lambda item: not self.watchdog.action_healthy(item[1]["action"]))
+
+        if batch and self.policy.get("dispatch") == "concurrent":
+            # 同一时刻到期的阶段并发发出 (见 DeliveryCoordinator)
+            results, hedged = self.delivery.run(state, batch, self._execute, self._hedge_for(state, batch))
+            if hedged:
+                state.hedged = state.hedged + tuple(hedged)
+            self._record_stage(state)
+            if state.done:
+                return
+            for idx, stage in batch:
+                if results.get(idx) is False and stage.get("required") and not self._reroute(state, stage):
+                    self.logger.error("❌ 致命错误：%s 阶段失败，无法进行后续加急", stage["action"])
+                    self._finish(state, FAILED)
+                    return
+        else:
+            # 同一时刻的多个阶段按顺序执行
+            for idx, stage in batch:
+                ok = self._execute(state, stage)
+                self._record_stage(state)
+                if state.done:
+                    return
+                if not ok and stage.get("required") and not self._reroute(state, stage):
+                    self.logger.error("❌ 致命错误：%s 阶段失败，无法进行后续加急", stage["action"])
+                    self._finish(state, FAILED)
+                    return
+        if batch:
+            self._pull_forward(state)
+            if state.done:
+                return
+
+        # 2. 检查回复
+        ack_deadline = state.start_time + self.policy["ack_timeout"]
+        if state.next_poll is not None and now >= state.next_poll:
+            if self._check_reply(state):
+                self._finish(state, ACKED)
+                return
+            state.next_poll = now + self._poll_interval(state)
+            if state.next_poll >= ack_deadline:
+                state.next_poll = None
+
+        # 3. 计算下一次动作时间
+        candidates = []
+        if state.stage_idx < len(stages):
+            candidates.append(state.start_time + stages[state.stage_idx].get("after", 0))
+        if state.next_poll is not None:
+            candidates.append(state.next_poll)
+        if not candidates:
+            self._finish(state, TIMEOUT)
+            return
+        self._schedule(state, min(candidates))
+
+    def _execute(self, state, stage, on_send=None):
+        """执行一个阶段：计时、日志、首次通知时间 (渠道健康度由接口层逐次上报，见 watchdog.report)"""
+        begin = time.time()
+        with metrics.span("alarm_stage", stage=stage["action"]) as span:
+            ok = self._run_stage(state, stage, on_send)
+            if not ok:
+                span.fail()
+        self._log_step(state, stage["action"], ok, begin)
+        if ok and stage["action"] in NOTIFY_ACTIONS:
+            with self._lock:
+                first = state.notified_at is None
+                if first:
+                    state.notified_at = time.time()
+            if first:
+                metrics.observe("alarm_time_to_first_notification_seconds", state.notified_at - state.start_time)
+        return ok
+
+    def _hedge_for(self, state, batch):
+        """
+        本批中带 hedge 配置的飞书阶段：发送请求超时未返回时，提前执行后面哪个阶段
+        stage["hedge"] = {"after_ms": 1500, "actions": ["voice"]}
+        只提前 actions 里还没执行的下一个阶段 (本批已经发出的不算)；没有可提前的阶段时返回 None，不用等
+        """
+        for _, stage in batch:
+            hedge = stage.get("hedge")
+            if not hedge:
+                continue
+            actions = hedge.get("actions", ())
+            stages = self.policy["stages"]
+            later = [(idx, stages[idx]) for idx in range(state.stage_idx, len(stages))
+                     if stages[idx]["action"] in actions and idx not in state.hedged][:1]
+            if not later:
+                return None
+            delay = hedge.get("after_ms", 1000) / 1000
+            if self.watchdog and not self.watchdog.action_healthy(stage["action"]):
+                # 渠道已降级：不等超时，立即发出后备渠道
+                delay = 0
+            return delay, later
+        return None
+
+    def _reroute(self, state, stage):
+        """
+        必要阶段失败时，如果是因为渠道降级 (看门狗判定)，且后面还有走其他渠道的阶段，就不终止报警，
+        改由其他渠道继续升级 (比如飞书故障时仍按时打阿里云语音电话)
+        """
+        if not self.watchdog or self.watchdog.action_healthy(stage["action"]):
+            return False
+        channel = ACTION_CHANNELS.get(stage["action"])
+        stages = self.policy["stages"]
+        # 已提前执行 (对冲 / 降级提前) 的其他渠道阶段也算：报警已经由它们送达
+        others = [s for i, s in enumerate(stages)
+                  if i >= state.stage_idx and ACTION_CHANNELS.get(s["action"]) != channel]
+        if not others:
+            return False
+        self.logger.warning("⚠️ [报警 %s] %s 渠道已降级，%s 失败，改由其他渠道继续升级",
+                            state.incident_id, channel, stage["action"])
+        metrics.inc("alarm_reroute_total", channel=channel)
+        return True
+
+    def _pull_forward(self, state):
+        """
+        确认渠道 (飞书) 已降级时，没人能及时回复确认，再等 ack_timeout 只会白白耽误：
+        把后面每个健康的其他渠道各自的下一个阶段 (如语音电话) 立即执行，到点不再重复
+        """
+        if not self.watchdog or self.watchdog.is_healthy(FEISHU):
+            return
+        stages = self.policy["stages"]
+        pulled, channels = [], set()
+        for idx in range(state.stage_idx, len(stages)):
+            channel = ACTION_CHANNELS.get(stages[idx]["action"])
+            if (idx in state.hedged or channel in (None, FEISHU) or channel in channels
+                    or not self.watchdog.is_healthy(channel)):
+                continue
+            channels.add(channel)
+            pulled.append((idx, stages[idx]))
+        if not pulled:
+            return
+        self.logger.warning("⚠️ [报警 %s] 飞书已降级，提前执行: %s",
+                            state.incident_id, ", ".join(stage["action"] for _, stage in pulled))
+        metrics.inc("alarm_pull_forward_total", len(pulled))
+        state.hedged = state.hedged + tuple(idx for idx, _ in pulled)
+        for _, stage in pulled:
+            self._execute(state, stage)
+        self._record_stage(state)
+
+    def _record_stage(self, state):
+        if self.journal:
+            self.journal.record(state.incident_id, incident_journal.STAGE, stage_idx=state.stage_idx,
+                                msg_id=state.msg_id, chat_ids=list(state.chat_ids),
+                                notified_at=state.notified_at, hedged=list(state.hedged))
+
+    def _log_step(self, state, action, ok, begin):
+        """每个阶段一条带耗时的日志 (JSON 日志格式下可按 incident_id 检索)"""
+        self.logger.info("[报警 %s] 阶段 %s %s", state.incident_id, action, "完成" if ok else "失败",
+                         extra={"incident_id": state.incident_id, "step": action,
+                                "elapsed_ms": elapsed_ms(state.start_time), "duration_ms": elapsed_ms(begin)})
+
+    def _check_reply(self, state):
+        if len(state.chat_ids) == 1:
+            return self.notifier.check_chat_reply(state.start_time, incident_id=state.incident_id,
+                                                  chat_id=state.chat_ids[0])
+        return self.notifier.check_admin_replies(state.chat_ids, state.start_time, incident_id=state.incident_id)
+
+    def _poll_interval(self, state):
+        if state.waiter is not None:
+            return self.policy.get("fallback_poll_interval", 30)
+        return self.policy["poll_interval"]
+
+    def _run_stage(self, state, stage, on_send=None):
+        action = stage["action"]
+        if action == "group_card":
+            self.logger.info("Step 1: 发送群卡片...")
+            state.msg_id = self.notifier.send_card_to_group(
+                title=stage.get("title", "实验室火灾警报"),
+                content=stage.get("content", ""),
+                image_path=state.image_path,
+                on_send=on_send
+            )
+            if not state.msg_id:
+                return False
+            return self._start_waiting(state)
+
+        if action == "admin_card":
+            # 直接发给每位管理员 (单聊)，urgent_type 为空时走批量接口
+            urgent_type = stage.get("urgent_type")
+            if urgent_type == "phone":
+                self.logger.info("Step 3: 升级为 [电话] 加急报警！")
+            ok = self.notifier.send_to_all_admins(
+                title=stage.get("title", "实验室火灾警报"),
+                content=stage.get("content", ""),
+                image_path=state.image_path if stage.get("with_image", True) else None,
+                urgent_type=urgent_type
+            )
+            if not state.chat_ids and not state.done:
+                return self._start_waiting(state) and ok
+            return ok
+
+        if action == "sms":
+            if not self.aliyun:
+                return False
+            return self.aliyun.send_sms_to_all({"time": time.strftime("%H:%M")})
+
+        if action == "voice":
+            if not self.voice:
+                return False
+            batch = self.voice.call_all({"time": time.strftime("%H:%M")})
+            return bool(batch and batch.ok)
+
+        if action == "buzz":
+            urgent_type = stage.get("urgent_type", "sms")
+            if urgent_type == "phone":
+                self.logger.info("⚠️ 超时未回复！")
+                self.logger.info("Step 4: 升级为 [电话] 加急报警！")
+            if not state.msg_id:
+                return False
+            if not self.notifier.admin_ids:
+                self.logger.info("⚠️ 无管理员 ID，跳过加急")
+                return False
+            self.logger.info("对 %d 位管理员发起 [%s] 加急...", len(self.notifier.admin_ids), urgent_type)
+            return self.notifier.buzz_message(state.msg_id, self.notifier.admin_ids, urgent_type=urgent_type)
+
+        self.logger.error("未知的报警阶段: %s", action)
+        return False
+
+    def _start_waiting(self, state):
+        """
+        报警消息发出后开始等待确认：事件回调 (如有) + 轮询
+        policy["reply_from"] 为 "admins" 时等待管理员单聊回复，否则等待群回复
+        """
+        if state.chat_ids:
+            return True
+        if self.policy.get("reply_from") == "admins":
+            state.chat_ids = tuple(self.notifier.get_p2p_chat_ids(self.notifier.admin_ids).values())
+            if not state.chat_ids:
+                self.logger.error("❌ 警告：无法获取管理员会话 ID，无法接收回复")
+                return False
+        elif self.notifier.group_chat_id:
+            state.chat_ids = (self.notifier.group_chat_id,)
+        else:
+            return False
+
+        self.logger.info("等待回复中 (限时 %s 秒)...", self.policy["ack_timeout"])
+        if self.ack_registry:
+            state.waiter = self.ack_registry.register(state.incident_id, state.chat_ids, state.start_time)
+            state.waiter.add_callback(lambda waiter: self.acknowledge(state.incident_id))
+        state.next_poll = time.time() + self._poll_interval(state)
+        return True
+
+    def _finish(self, state, status):
+        with self._lock:
+            if state.done:
+                return
+            state.status = status
+            self._incidents.pop(state.incident_id, None)
+            if state.source is not None and self._by_source.get(state.source) is state:
+                del self._by_source[state.source]
+            self._done_cond.notify_all()
+
+        if self._delivery is not None:
+            self._delivery.cancel(state.incident_id)
+        if self.journal:
+            self.journal.record(state.incident_id, incident_journal.FINISH, status=status)
+
+        if state.waiter is not None and self.ack_registry:
+            self.ack_registry.unregister(state.waiter)
+        self.notifier.release_reply_cursor(state.incident_id)
+
+        metrics.inc("alarm_incidents_total", status=status)
+        if status == ACKED:
+            metrics.observe("alarm_time_to_ack_seconds", time.time() - state.start_time)
+
+        context = {"incident_id": state.incident_id, "step": status, "elapsed_ms": elapsed_ms(state.start_time)}
+        if status == ACKED:
+            self.logger.info("✅ 警报解除：管理员已响应。", extra=context)
+            # 确认后的收尾动作 (如通知大家警报解除)，放到定时器线程池执行，不阻塞确认方
+            for stage in self.policy.get("on_ack", ()):
+                self.scheduler.call_later(0, self._run_stage, state, stage, io=True)
+        elif status == TIMEOUT:
+            self.logger.info("报警 %s 升级流程结束 (无人确认)", state.incident_id, extra=context)
+
+        with _callbacks_lock:
+            callbacks, state.callbacks = state.callbacks, ()
+        for fn in callbacks:
+            try:
+                fn(state)
+            except Exception:
+                self.logger.exception("报警 %s 结束回调异常", state.incident_id)
@@ -0,0 +1,320 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+import config
+from utils.logger import setup_logger
+from core.communication.feishu import FeishuNotifier
+
+MESSAGE_EVENT = "im.message.receive_v1"
+
+
+class AckWaiter:
+    """
+    一个报警流程的"等待确认"句柄
+    事件服务器收到匹配的回复时 set()，等待方立刻被唤醒 (同步 / 异步都支持)
+    """
+
+    def __init__(self, incident_id, chat_ids, start_time):
+        self.incident_id = incident_id
+        self.chat_ids = frozenset(chat_ids)
+        # 飞书事件里的 create_time 是毫秒；与轮询一样留 10 秒余量
+        self.since_ms = int((start_time - 10) * 1000)
+        self.acked_text = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._futures = []
+        self._callbacks = []
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def add_callback(self, fn):
+        """确认时回调 fn(waiter)，已确认则立即回调"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set(self, text=None):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.acked_text = text
+            self._event.set()
+            futures, self._futures = self._futures, []
+            callbacks, self._callbacks = self._callbacks, []
+        for loop, fut in futures:
+            loop.call_soon_threadsafe(_resolve, fut)
+        for fn in callbacks:
+            fn(self)
+
+    def wait(self, timeout=None):
+        """同步等待，返回是否已确认"""
+        return self._event.wait(timeout)
+
+    async def wait_async(self, timeout=None):
+        """异步等待，不占线程"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._lock:
+            if self._event.is_set():
+                return True
+            self._futures.append((loop, fut))
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._event.is_set()
+
+
+def _resolve(fut):
+    if not fut.done():
+        fut.set_result(True)
+
+
+class AckRegistry:
+    """
+    chat_id -> 正在等待确认的报警
+    事件服务器只负责把消息推进来，由这里决定唤醒哪些报警流程
+    """
+
+    def __init__(self):
+        self.logger = setup_logger("FeishuEvent")
+        self._lock = threading.Lock()
+        self._by_chat = {}
+
+    def register(self, incident_id, chat_ids, start_time):
+        waiter = AckWaiter(incident_id, chat_ids, start_time)
+        with self._lock:
+            for chat_id in waiter.chat_ids:
+                self._by_chat.setdefault(chat_id, set()).add(waiter)
+        return waiter
+
+    def unregister(self, waiter):
+        with self._lock:
+            for chat_id in waiter.chat_ids:
+                waiters = self._by_chat.get(chat_id)
+                if waiters:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._by_chat[chat_id]
+
+    def pending_count(self):
+        with self._lock:
+            return len({w for ws in self._by_chat.values() for w in ws})
+
+    def notify_message(self, event):
+        """
+        处理一条 im.message.receive_v1 事件
+        :return: 被唤醒的报警数量
+        """
+        message = event.get("message", {})
+        chat_id = message.get("chat_id")
+        with self._lock:
+            waiters = list(self._by_chat.get(chat_id, ()))
+        if not waiters:
+            return 0
+
+        # 转成消息列表接口的结构，复用同一套确认判断
+        msg = {"sender": event.get("sender", {}), "body": {"content": message.get("content", "{}")}}
+        if not FeishuNotifier.is_confirm_message(msg):
+            return 0
+
+        create_ms = int(message.get("create_time") or 0)
+        woken = 0
+        for waiter in waiters:
+            if create_ms >= waiter.since_ms and not waiter.is_set():
+                waiter.set(message.get("content"))
+                woken += 1
+                self.logger.info("✅ [事件] 报警 %s 已被确认", waiter.incident_id)
+        return woken
+
+
+class EventDecryptError(Exception):
+    pass
+
+
+def decrypt_event(encrypt_key, encrypted):
+    """
+    解密飞书事件 (AES-256-CBC，key = sha256(Encrypt Key)，前 16 字节为 IV)
+    """
+    try:
+        key = hashlib.sha256(encrypt_key.encode("utf-8")).digest()
+        raw = base64.b64decode(encrypted)
+        iv, data = raw[:16], raw[16:]
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+        padded = decryptor.update(data) + decryptor.finalize()
+        unpadder = padding.PKCS7(128).unpadder()
+        return json.loads(unpadder.update(padded) + unpadder.finalize())
+    except Exception as e:
+        raise EventDecryptError(str(e)) from e
+
+
+def encrypt_event(encrypt_key, payload):
+    """加密 (decrypt_event 的逆操作，给本地模拟飞书推送用)"""
+    key = hashlib.sha256(encrypt_key.encode("utf-8")).digest()
+    iv = os.urandom(16)
+    padder = padding.PKCS7(128).padder()
+    data = padder.update(json.dumps(payload).encode("utf-8")) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    return base64.b64encode(iv + encryptor.update(data) + encryptor.finalize()).decode("utf-8")
+
+
+def sign_event(encrypt_key, timestamp, nonce, body):
+    """飞书请求签名：sha256(timestamp + nonce + encrypt_key + body)"""
+    raw = (timestamp + nonce + encrypt_key).encode("utf-8") + body
+    return hashlib.sha256(raw).hexdigest()
+
+
+class _EventHandler(BaseHTTPRequestHandler):
+    server_version = "FireAlarmEvent/1.0"
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+
+        # 伪造的确认回复会直接取消正在进行的火灾报警升级，所以任何校验不通过都拒绝 (fail closed)
+        signed = False
+        try:
+            payload = json.loads(body or b"{}")
+            if server.encrypt_key:
+                # 配置了 Encrypt Key 时飞书一定加密推送：明文请求一律拒绝
+                if "encrypt" not in payload:
+                    server.logger.warning("拒绝未加密的事件推送")
+                    return self._reply(401, {"msg": "encryption required"})
+                signed = self._check_signature(body)
+                if signed is False:
+                    server.logger.warning("拒绝签名错误的事件推送")
+                    return self._reply(401, {"msg": "bad signature"})
+                payload = decrypt_event(server.encrypt_key, payload["encrypt"])
+            elif "encrypt" in payload:
+                return self._reply(400, {"msg": "encrypt key not configured"})
+        except (ValueError, EventDecryptError):
+            server.logger.warning("收到无法解析的事件推送")
+            return self._reply(400, {"msg": "bad request"})
+
+        # 1. 配置回调地址时的 URL 校验
+        if payload.get("type") == "url_verification":
+            if not server.check_token(payload.get("token"), signed):
+                return self._reply(401, {"msg": "bad token"})
+            return self._reply(200, {"challenge": payload.get("challenge")})
+
+        # 2. 普通事件 (2.0 结构)
+        header = payload.get("header", {})
+        if not server.check_token(header.get("token"), signed):
+            server.logger.warning("拒绝校验失败的事件推送")
+            return self._reply(401, {"msg": "bad token"})
+
+        # 先回 200，飞书要求 3 秒内响应，否则会重推
+        self._reply(200, {})
+        server.dispatch(header, payload.get("event", {}))
+
+    def _check_signature(self, body):
+        """
+        :return: True 签名正确；False 签名错误；None 没有签名头
+                 (没有签名时能解密不代表可信，还要再校验 Verification Token)
+        """
+        signature = self.headers.get("X-Lark-Signature")
+        if not signature:
+            return None
+        timestamp = self.headers.get("X-Lark-Request-Timestamp", "")
+        nonce = self.headers.get("X-Lark-Request-Nonce", "")
+        expected = sign_event(self.server.encrypt_key, timestamp, nonce, body)
+        return hmac.compare_digest(expected.encode("utf-8"), signature.encode("utf-8"))
+
+    def _reply(self, status, data):
+        raw = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(format % args)
+
+
+class FeishuEventServer(ThreadingHTTPServer):
+    """
+    飞书事件订阅回调服务器 (im.message.receive_v1)
+    收到群 / 单聊里的确认回复后，直接唤醒正在等待的报警流程，不用再等下一次轮询
+    """
+
+    daemon_threads = True
+    # 飞书推送失败会重试，按 event_id 去重
+    MAX_SEEN_EVENTS = 1024
+
+    def __init__(self, host=None, port=None, encrypt_key=None, verification_token=None, registry=None):
+        """
+        :param host: 监听地址，默认 .env 的 feishu_event_host，未配置时只监听本机 (127.0.0.1)
+                     由反向代理 / 内网穿透转发飞书推送；确实要对外监听时显式配置 0.0.0.0
+        :param encrypt_key / verification_token: 飞书开放平台"事件订阅"里的 Encrypt Key / Verification Token
+                     至少配置一个，否则所有推送都会被拒绝
+        """
+        self.logger = setup_logger("FeishuEvent")
+        env = config.get_env()
+        self.encrypt_key = encrypt_key if encrypt_key is not None else env.get("feishu_encrypt_key")
+        self.verification_token = (verification_token if verification_token is not None
+                                   else env.get("feishu_verification_token"))
+        self.registry = registry or AckRegistry()
+        self._seen_events = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._thread = None
+        if not self.encrypt_key and not self.verification_token:
+            self.logger.error("❌ 未配置 feishu_encrypt_key / feishu_verification_token，事件推送将全部被拒绝")
+        if host is None:
+            host = env.get("feishu_event_host", "127.0.0.1")
+        if port is None:
+            port = int(env.get("feishu_event_port", "9000"))
+        super().__init__((host, port), _EventHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def check_token(self, token, signed=False):
+        """
+        配置了 Verification Token 时必须一致；没有配置时只接受签名正确的请求
+        :param signed: 请求是否已通过签名校验
+        """
+        if self.verification_token:
+            return isinstance(token, str) and hmac.compare_digest(token.encode("utf-8"),
+                                                                  self.verification_token.encode("utf-8"))
+        return bool(signed)
+
+    def dispatch(self, header, event):
+        event_id = header.get("event_id")
+        if event_id:
+            with self._seen_lock:
+                if event_id in self._seen_events:
+                    return
+                self._seen_events[event_id] = time.time()
+                if len(self._seen_events) > self.MAX_SEEN_EVENTS:
+                    self._seen_events.popitem(last=False)
+
+        if header.get("event_type") == MESSAGE_EVENT:
+            self.registry.notify_message(event)
+
+    def start(self):
+        """后台线程启动"""
+        self._thread = threading.Thread(target=self.serve_forever, name="feishu-event-server", daemon=True)
+        self._thread.start()
+        self.logger.info("📬 飞书事件回调已启动，端口 %s", self.port)
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -1,119 +1,259 @@
-import requests
 import json
+import threading
 import time
-import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 from pathlib import Path
-from dotenv import load_dotenv, dotenv_values
-
-# 强制关闭代理
-os.environ["NO_PROXY"] = "*"
-os.environ["no_proxy"] = "*"
 
 # 引入日志
 current_file_path = Path(__file__).resolve()
 project_root = current_file_path.parent.parent.parent
 sys.path.append(str(project_root))
+import config
 from utils.logger import setup_logger
+from core.communication import http_session
+from core.communication.http_session import FEISHU_API_BASE, UPLOAD_TIMEOUT
+from core.communication.token_cache import TenantTokenCache
+from core.communication.chat_cursor import ChatPollCursors
+from core.communication.open_id_cache import OpenIdCache, normalize_mobile
+from core.communication.image_pipeline import ImagePipeline
+
+# 视为"确认收到"的回复内容
+CONFIRM_KEYWORDS = frozenset(["1", "收到", "ok", "OK", "确认", "知道了"])
+
+# 卡片底部引导语
+GROUP_CARD_HINT = "🔴 **所有成员请注意**：\n收到请在群内回复 **1** 或 **收到** 以解除警报。"
+ADMIN_CARD_HINT = "🔴 **请立即处理**：\n收到请直接回复 **1** 或 **收到** 以解除警报。"
 
 
 class FeishuNotifier:
-    def __init__(self, webhook_url=None):
+    def __init__(self, webhook_url=None, prewarm=False):
+        """
+        :param prewarm: 为 True 时在后台预热连接池和 token，第一次报警不用再握手
+        """
         self.logger = setup_logger("Feishu")
 
-        # 1. 加载 .env
-        current_dir = Path(__file__).resolve().parent
-        self.project_root = current_dir.parent.parent
-        self.env_path = self.project_root / ".env"
-        self._load_env()
+        # 1. 读取 .env 快照 (进程内只解析一次，文件修改后自动热加载)
+        self.env = config.get_env()
         self.headers = {'Content-Type': 'application/json'}
+        # 接口地址 (压测时指向本地替身服务器，见 benchmark/mock_server.py)
+        self.api_base = self.env.get("feishu_api_base", FEISHU_API_BASE)
 
         # 2. 基础配置
-        self.app_id = os.getenv("feishu_app_id")
-        self.app_secret = os.getenv("feishu_app_secret")
-        self.keyword = os.getenv("feishu_keyword", "")
-        self.group_chat_id = os.getenv("feishu_group_chat_id")  # 【新增】群ID
+        self.app_id = self.env.get("feishu_app_id")
+        self.app_secret = self.env.get("feishu_app_secret")
+        self.keyword = self.env.get("feishu_keyword", "")
+        self.group_chat_id = self.env.group_chat_id  # 【新增】群ID
+
+        # token 缓存 (进程内所有实例共享同一个 app 的 token)
+        self.token_cache = None
+        if self.app_id and self.app_secret:
+            self.token_cache = TenantTokenCache.shared(self.app_id, self.app_secret, self.api_base)
+
+        # 报警截图上传 (按内容缓存 image_key)
+        self.images = ImagePipeline(self._upload_image_bytes)
+
+        # 增量轮询游标 (按报警保存)
+        self.poll_cursors = ChatPollCursors()
+
+        # 管理员单聊: open_id -> chat_id (只查一次)；并发发送 / 查回复共用的线程池
+        self.p2p_chat_ids = {}
+        self._admin_pool = ThreadPoolExecutor(max_workers=self.ADMIN_CONCURRENCY, thread_name_prefix="feishu-admin")
 
         # 3. 自动加载管理员 ID
         self.admin_ids = []
+        self.admin_open_ids = {}  # 手机号 -> open_id，热加载时只查新增的手机号
+        self.open_id_cache = None
         if self.app_id and self.app_secret:
             self._auto_load_admins()
         else:
             self.logger.warning("未配置 AppID/Secret，功能受限")
 
-    def _load_env(self):
-        if self.env_path.exists():
-            load_dotenv(dotenv_path=self.env_path, override=True)
+        if prewarm:
+            threading.Thread(target=self.prewarm, daemon=True).start()
+
+    def prewarm(self):
+        """预热：建立到飞书的长连接，并提前拿好 token"""
+        http_session.prewarm(self.api_base)
+        self._get_tenant_access_token()
+
+    def probe(self):
+        """
+        健康探测 (见 watchdog.py)：取 token (快到期时顺便刷新) + 查询机器人信息
+        请求走共享连接池，同时让长连接保持活跃
+        :return: 是否可用
+        """
+        token = self._get_tenant_access_token()
+        if not token:
+            return False
+        headers = {"Authorization": f"Bearer {token}"}
+        resp = http_session.get(f"{self.api_base}/bot/v3/info", op="probe", headers=headers)
+        return resp.json().get("code") == 0
+
+    def refresh_config(self):
+        """
+        .env 有变化时应用新配置 (发送报警前自动调用)
+        只重建受影响的部分：群 ID 直接替换；管理员只查询新增的手机号
+        :return: 配置是否有变化
+        """
+        env = config.get_env()
+        if env is self.env:
+            return False
+        old, self.env = self.env, env
+
+        if env.group_chat_id != old.group_chat_id:
+            self.group_chat_id = env.group_chat_id
+            self.logger.info("🔄 群 ID 已更新: %s", self.group_chat_id)
+        if env.admin_phones != old.admin_phones and self.app_id and self.app_secret:
+            self.logger.info("🔄 管理员配置有变化，重新加载...")
+            self._auto_load_admins()
+        return True
 
     def _get_tenant_access_token(self):
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        data = {"app_id": self.app_id, "app_secret": self.app_secret}
-        try:
-            resp = requests.post(url, json=data, proxies={"http": None, "https": None})
-            if resp.json().get("code") == 0:
-                return resp.json().get("tenant_access_token")
-            self.logger.error(f"Token 获取失败: {resp.text}")
-            return None
-        except Exception:
-            self.logger.exception("获取 Token 异常")
+        """从进程级共享缓存获取 token，缓存有效时不发请求"""
+        if not self.token_cache:
             return None
+        return self.token_cache.get()
+
+    # batch_get_id 单次最多支持 50 个手机号
+    BATCH_GET_ID_LIMIT = 50
+    # 批量发送消息接口单次最多 200 人
+    BATCH_SEND_LIMIT = 200
+    # 对管理员并发发送 / 查回复的并发数
+    ADMIN_CONCURRENCY = 8
 
     def get_open_id_by_mobile(self, mobile):
-        self.logger.info("通过手机号获取 User ID " + mobile)
         """通过手机号查 User ID"""
-        if not mobile.startswith("+"): mobile = f"+{mobile}"
+        self.logger.info("通过手机号获取 User ID %s", mobile)
+        return self.get_open_ids_by_mobiles([mobile]).get(normalize_mobile(mobile))
+
+    def get_open_ids_by_mobiles(self, mobiles):
+        """
+        批量通过手机号查 User ID (每 50 个一次请求)
+        :return: {"+86xxx": open_id}，查不到的手机号不在结果里
+        """
+        mobiles = list(dict.fromkeys(normalize_mobile(m) for m in mobiles))
+        if not mobiles: return {}
         token = self._get_tenant_access_token()
-        if not token: return None
-        url = "https://open.feishu.cn/open-apis/contact/v3/users/batch_get_id"
+        if not token: return {}
+        url = f"{self.api_base}/contact/v3/users/batch_get_id"
         headers = {"Authorization": f"Bearer {token}"}
-        try:
-            resp = requests.post(url, headers=headers, params={"user_id_type": "open_id"}, json={"mobiles": [mobile]},
-                                 proxies={"http": None, "https": None})
-            data = resp.json()
-            if data.get("code") == 0 and data.get("data", {}).get("user_list"):
-                return data.get("data").get("user_list")[0].get("user_id")
-            return None
-        except Exception:
-            self.logger.error("通过手机号获取 User ID 异常" + mobile)
-            return None
 
-    def _auto_load_admins(self):
-        """加载管理员列表 (优化日志版)"""
-        if not self.env_path.exists(): return
+        result = {}
+        for i in range(0, len(mobiles), self.BATCH_GET_ID_LIMIT):
+            chunk = mobiles[i:i + self.BATCH_GET_ID_LIMIT]
+            try:
+                resp = http_session.post(url, op="batch_get_id", headers=headers,
+                                         params={"user_id_type": "open_id"}, json={"mobiles": chunk})
+                data = resp.json()
+                if data.get("code") != 0:
+                    self.logger.error("批量查询 User ID 失败: %s", data)
+                    continue
+                for user in data.get("data", {}).get("user_list") or []:
+                    mobile, uid = user.get("mobile"), user.get("user_id")
+                    if not uid or not mobile:
+                        continue
+                    # 接口返回的手机号可能不带国家码，按后缀对回请求里的号码
+                    digits = mobile.lstrip("+")
+                    for m in chunk:
+                        if m.lstrip("+").endswith(digits) or digits.endswith(m.lstrip("+")):
+                            result[m] = uid
+                            break
+            except Exception:
+                self.logger.exception("批量查询 User ID 异常: %s", chunk)
+        return result
 
-        env_config = dotenv_values(self.env_path)
+    def _auto_load_admins(self):
+        """
+        加载管理员列表
+        1. 优先使用磁盘缓存 (重启后无需联网即可就绪)
+        2. 缓存里没有的手机号，一次批量请求查出来
+        3. 缓存过期的手机号，先用旧值，后台再批量刷新
+        """
+        admin_phones = self.env.admin_phones
+        if not admin_phones:
+            self.admin_ids, self.admin_open_ids = [], {}
+            return
 
         self.logger.info("====== 开始扫描管理员 ======")
 
-        for key, value in env_config.items():
-            if key.startswith("admin_phone") and value:
-                self.logger.info(f"正在查询: {key} -> {value}")
-
-                uid = self.get_open_id_by_mobile(value)
-
-                if uid:
-                    if uid not in self.admin_ids:
-                        self.admin_ids.append(uid)
-                        self.logger.info(f"✅ 成功添加: {key} (ID: {uid})")
-                    else:
-                        self.logger.info(f"⚠️ 跳过重复: {key}")
+        if self.open_id_cache is None:
+            self.open_id_cache = OpenIdCache(self.app_id)
+        # 已解析过的手机号 (热加载时) 直接沿用，不再查缓存或网络
+        wanted = {normalize_mobile(value) for _, value in admin_phones}
+        resolved = {m: uid for m, uid in self.admin_open_ids.items() if m in wanted}
+        missing, stale = [], []
+        for key, value in admin_phones:
+            if normalize_mobile(value) in resolved:
+                continue
+            uid, fresh = self.open_id_cache.lookup(value)
+            if uid:
+                resolved[normalize_mobile(value)] = uid
+                if not fresh:
+                    stale.append(value)
+            else:
+                missing.append(value)
+
+        if missing:
+            self.logger.info("正在批量查询 %d 个手机号...", len(missing))
+            found = self.get_open_ids_by_mobiles(missing)
+            self.open_id_cache.update(found)
+            resolved.update(found)
+
+        admin_ids = []
+        for key, value in admin_phones:
+            uid = resolved.get(normalize_mobile(value))
+            if uid:
+                if uid not in admin_ids:
+                    admin_ids.append(uid)
+                    self.logger.info("✅ 成功添加: %s (ID: %s)", key, uid)
                 else:
-                    # 【新增】这里会告诉你为什么没加载上
-                    self.logger.error(f"❌ 加载失败: {key} - 未找到用户ID (请检查飞书后台'可用范围')")
-
-        self.logger.info(f"====== 扫描结束，共加载 {len(self.admin_ids)} 人 ======")
+                    self.logger.info("⚠️ 跳过重复: %s", key)
+            else:
+                # 【新增】这里会告诉你为什么没加载上
+                self.logger.error("❌ 加载失败: %s - 未找到用户ID (请检查飞书后台'可用范围')", key)
+
+        # 整体替换，正在遍历旧列表的报警线程不受影响
+        self.admin_ids, self.admin_open_ids = admin_ids, resolved
+        self.logger.info("====== 扫描结束，共加载 %d 人 ======", len(self.admin_ids))
+
+        if stale:
+            threading.Thread(target=self._refresh_stale_admins, args=(admin_phones, stale), daemon=True).start()
+
+    def _refresh_stale_admins(self, admin_phones, stale):
+        """后台刷新过期的缓存记录，完成后整体替换 admin_ids"""
+        found = self.get_open_ids_by_mobiles(stale)
+        if not found:
+            return
+        self.open_id_cache.update(found)
+        resolved, admin_ids = {}, []
+        for key, value in admin_phones:
+            uid, _ = self.open_id_cache.lookup(value)
+            if uid:
+                resolved[normalize_mobile(value)] = uid
+                if uid not in admin_ids:
+                    admin_ids.append(uid)
+        # 整体替换列表，正在遍历旧列表的报警线程不受影响
+        self.admin_ids, self.admin_open_ids = admin_ids, resolved
+        self.logger.info("🔄 管理员缓存已后台刷新 (%d 人)", len(found))
 
     def upload_image(self, image_path):
-        """上传图片"""
+        """上传图片 (按内容缓存 image_key，同一张图只上传一次)"""
+        return self.images.get_image_key(image_path)
+
+    def prefetch_image(self, image_path):
+        """截图一产生就开始后台上传，返回 Future；发卡片时直接取结果"""
+        return self.images.prefetch(image_path)
+
+    def _upload_image_bytes(self, image_data):
+        """真正的上传请求 (由 ImagePipeline 调用)"""
         token = self._get_tenant_access_token()
         if not token: return None
-        url = "https://open.feishu.cn/open-apis/im/v1/images"
+        url = f"{self.api_base}/im/v1/images"
         headers = {"Authorization": f"Bearer {token}"}
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
             files = {'image_type': (None, 'message'), 'image': image_data}
-            resp = requests.post(url, headers=headers, files=files, proxies={"http": None, "https": None})
+            resp = http_session.post(url, op="upload_image", headers=headers, files=files, timeout=UPLOAD_TIMEOUT)
             if resp.json().get("code") == 0:
                 return resp.json().get("data", {}).get("image_key")
             return None
@@ -126,39 +266,23 @@ class FeishuNotifier:
         注意：即使消息发在群里，也可以对特定的 User ID 列表进行加急！
         """
         token = self._get_tenant_access_token()
-        url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}/urgent_{urgent_type}"
+        url = f"{self.api_base}/im/v1/messages/{message_id}/urgent_{urgent_type}"
         headers = {"Authorization": f"Bearer {token}"}
         data = {"user_id_list": user_id_list, "urgent_type": urgent_type}
         try:
-            resp = requests.patch(url, headers=headers, params={"user_id_type": "open_id"}, json=data,
-                                  proxies={"http": None, "https": None})
+            resp = http_session.patch(url, op=f"urgent_{urgent_type}", headers=headers,
+                                      params={"user_id_type": "open_id"}, json=data)
             if resp.json().get("code") == 0:
-                self.logger.info(f"🚀 [{urgent_type}] 加急发送成功！")
+                self.logger.info("🚀 [%s] 加急发送成功！", urgent_type)
                 return True
             else:
-                self.logger.error(f"加急失败: {resp.json()}")
+                self.logger.error("加急失败: %s", resp.json())
                 return False
         except Exception:
             return False
 
-    def send_card_to_group(self, title, content, image_path=None):
-        """
-        发送卡片到群聊，并返回 message_id
-        """
-        if not self.group_chat_id:
-            self.logger.error("❌ 未配置 feishu_group_chat_id")
-            return None
-
-        token = self._get_tenant_access_token()
-        if not token: return None
-
-        # 1. 准备图片
-        image_key = None
-        if image_path:
-            image_key = self.upload_image(image_path)
-
-        # 2. 构建卡片
-        time_str = time.strftime("%Y-%m-%d %H:%M:%S")
+    def build_alarm_card(self, title, content, time_str, image_key=None, hint=GROUP_CARD_HINT):
+        """构建报警卡片 (同步 / 异步版本共用)"""
         final_title = f"【{self.keyword}】{title}" if self.keyword else title
 
         elements = [
@@ -170,16 +294,36 @@ class FeishuNotifier:
         # 引导语
         elements.append({"tag": "hr"})
         elements.append({"tag": "div",
-                         "text": {"content": "🔴 **所有成员请注意**：\n收到请在群内回复 **1** 或 **收到** 以解除警报。",
-                                  "tag": "lark_md"}})
+                         "text": {"content": hint, "tag": "lark_md"}})
 
-        card_content = {
+        return {
             "header": {"template": "red", "title": {"content": f"🔥 {final_title}", "tag": "plain_text"}},
             "elements": elements
         }
 
+    def send_card_to_group(self, title, content, image_path=None, on_send=None):
+        """
+        发送卡片到群聊，并返回 message_id
+        :param on_send: 可选，图片准备好、真正发出消息请求前调用 (报警对冲只对发送这一步计时)
+        """
+        # 1. 准备图片 (后台上传，与取 token 并行；上传过的图片直接复用 image_key)
+        image_future = self.images.prefetch(image_path) if image_path else None
+
+        self.refresh_config()
+        if not self.group_chat_id:
+            self.logger.error("❌ 未配置 feishu_group_chat_id")
+            return None
+
+        token = self._get_tenant_access_token()
+        if not token: return None
+
+        # 2. 构建卡片
+        time_str = time.strftime("%Y-%m-%d %H:%M:%S")
+        image_key = self.images.result(image_future) if image_future else None
+        card_content = self.build_alarm_card(title, content, time_str, image_key)
+
         # 3. 发送
-        url = "https://open.feishu.cn/open-apis/im/v1/messages"
+        url = f"{self.api_base}/im/v1/messages"
         headers = {"Authorization": f"Bearer {token}"}
         # receive_id 就是群ID，receive_id_type 选 chat_id
         params = {"receive_id_type": "chat_id"}
@@ -189,79 +333,214 @@ class FeishuNotifier:
             "content": json.dumps(card_content)
         }
 
+        if on_send:
+            on_send()
         try:
-            resp = requests.post(url, headers=headers, params=params, json=body, proxies={"http": None, "https": None})
+            resp = http_session.post(url, op="send_card", headers=headers, params=params, json=body)
             res = resp.json()
             if res.get("code") == 0:
                 msg_id = res.get("data", {}).get("message_id")
-                self.logger.info(f"群消息发送成功 ID: {msg_id}")
+                self.logger.info("群消息发送成功 ID: %s", msg_id)
                 return msg_id
             else:
-                self.logger.error(f"群发失败: {res}")
+                self.logger.error("群发失败: %s", res)
                 return None
         except Exception as e:
             self.logger.exception("发送异常")
             return None
 
-    def check_chat_reply(self, start_time_ts):
+    @staticmethod
+    def is_confirm_message(msg):
+        """判断一条消息是否为用户发出的确认回复"""
+        if msg.get("sender", {}).get("sender_type") != "user":
+            return False
+        # 先判断发送者，机器人的卡片消息就不用解析 JSON 了
+        content_json = msg.get("body", {}).get("content", "{}")
+        try:
+            text = json.loads(content_json).get("text", "").strip()
+        except (ValueError, AttributeError):
+            return False
+        # 只要回复了以下内容
+        return text in CONFIRM_KEYWORDS
+
+    def check_chat_reply(self, start_time_ts, incident_id=None, chat_id=None):
         """
-        检查群里有没有人回复
+        检查群里有没有人回复 (增量轮询：只拉取、只解析上次之后的新消息)
+        :param start_time_ts: 报警开始时间
+        :param incident_id: 报警标识，同一个报警的多次轮询共用游标；默认用 start_time_ts
+        :param chat_id: 要检查的会话，默认是报警群
         """
-        if not self.group_chat_id: return False
+        chat_id = chat_id or self.group_chat_id
+        if not chat_id: return False
 
         token = self._get_tenant_access_token()
-        url = "https://open.feishu.cn/open-apis/im/v1/messages"
+        if not token: return False
+        url = f"{self.api_base}/im/v1/messages"
         headers = {"Authorization": f"Bearer {token}"}
 
-        safe_start_time = str(int(start_time_ts - 10))
-
-        params = {
-            "container_id_type": "chat",
-            "container_id": self.group_chat_id,
-            "start_time": safe_start_time,
-            # "sort_type": "ByCreateTime",
-            "page_size": 50
-        }
+        cursor = self.poll_cursors.get(incident_id or start_time_ts, chat_id, start_time_ts)
 
         try:
-            resp = requests.get(url, headers=headers, params=params, proxies={"http": None, "https": None})
-            data = resp.json()
+            for _ in range(cursor.MAX_PAGES_PER_POLL):
+                resp = http_session.get(url, op="list_messages", headers=headers, params=cursor.build_params())
+                data = resp.json()
+
+                if data.get("code") != 0:
+                    # 如果还有错，打印出来
+                    self.logger.warning("轮询接口报错: %s", data)
+                    return False
+
+                confirmed, has_more = cursor.consume(data.get("data", {}), self.is_confirm_message)
+                if confirmed:
+                    self.logger.info("✅ 检测到确认回复")
+                    return True
+                if not has_more:
+                    break
 
-            if data.get("code") == 0:
-                items = data.get("data", {}).get("items", [])
+            return False
+        except Exception as e:
+            self.logger.exception("轮询异常")
+            return False
 
-                for msg in items:
-                    # 解析
-                    content_json = msg.get("body", {}).get("content", "{}")
-                    content_dict = json.loads(content_json)
-                    text = content_dict.get("text", "").strip()
-                    sender_type = msg.get("sender", {}).get("sender_type")
+    def release_reply_cursor(self, incident_id):
+        """报警结束后释放轮询游标"""
+        self.poll_cursors.release(incident_id)
 
-                    if sender_type != "user":
-                        continue
+    # ---------------- 管理员单聊 ----------------
 
-                    # 只要回复了以下内容
-                    if text in ["1", "收到", "ok", "OK", "确认", "知道了"]:
-                        self.logger.info(f"✅ 检测到确认回复: {text}")
-                        return True
-            else:
-                # 如果还有错，打印出来
-                self.logger.warning(f"轮询接口报错: {data}")
+    def send_to_all_admins(self, title, content, image_path=None, urgent_type=None):
+        """
+        给所有管理员 (admin_ids) 单独发送报警卡片
+        :param urgent_type: None 表示普通消息，走批量发送接口，一次请求送达所有人；
+                            "app" / "sms" / "phone" 表示加急 (加急需要每条消息的 ID，改为并发逐个发送后加急)
+        :return: 是否至少有一位管理员收到卡片 (部分失败只记日志，不影响后续升级)
+        """
+        image_future = self.images.prefetch(image_path) if image_path else None
 
+        self.refresh_config()
+        admin_ids = list(self.admin_ids)
+        if not admin_ids:
+            self.logger.error("❌ 没有管理员 ID，无法发送")
             return False
-        except Exception as e:
-            self.logger.exception("轮询异常")
+
+        token = self._get_tenant_access_token()
+        if not token: return False
+
+        time_str = time.strftime("%Y-%m-%d %H:%M:%S")
+        image_key = self.images.result(image_future) if image_future else None
+        card_content = self.build_alarm_card(title, content, time_str, image_key, hint=ADMIN_CARD_HINT)
+
+        if not urgent_type:
+            delivered = self._batch_send_card(token, admin_ids, card_content)
+        else:
+            futures = [self._admin_pool.submit(self._send_card_and_buzz, token, uid, card_content, urgent_type)
+                       for uid in admin_ids]
+            delivered = sum(f.result() for f in futures)
+            self.logger.info("🚀 已向 %d/%d 位管理员发送 [%s] 加急卡片", delivered, len(admin_ids), urgent_type)
+
+        if not delivered:
+            self.logger.error("❌ 所有管理员都没有收到报警卡片")
             return False
+        if delivered < len(admin_ids):
+            self.logger.warning("⚠️ 部分管理员未送达 (%d/%d 已送达)，继续等待确认和升级",
+                                delivered, len(admin_ids))
+        return True
 
-    def get_tenant_access_token(self):
-        url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-        data = {"app_id": self.app_id, "app_secret": self.app_secret}
+    def _batch_send_card(self, token, open_ids, card_content):
+        """
+        批量发送接口：每 200 人一次请求
+        :return: 送达人数 (去掉请求失败的批次和接口返回的无效 open_id)
+        """
+        url = f"{self.api_base}/message/v4/batch_send/"
+        headers = {"Authorization": f"Bearer {token}"}
+        delivered = 0
+        for i in range(0, len(open_ids), self.BATCH_SEND_LIMIT):
+            chunk = open_ids[i:i + self.BATCH_SEND_LIMIT]
+            body = {"open_ids": chunk, "msg_type": "interactive", "card": card_content}
+            try:
+                res = http_session.post(url, op="batch_send", headers=headers, json=body).json()
+                if res.get("code") != 0:
+                    self.logger.error("批量发送失败: %s", res)
+                    continue
+                invalid = res.get("data", {}).get("invalid_open_ids") or []
+                if invalid:
+                    self.logger.error("批量发送部分失败，无效的 open_id: %s", invalid)
+                delivered += len(set(chunk) - set(invalid))
+            except Exception:
+                self.logger.exception("批量发送异常")
+        if delivered:
+            self.logger.info("📨 已批量发送给 %d 位管理员", delivered)
+        return delivered
+
+    def _send_card_and_buzz(self, token, open_id, card_content, urgent_type):
+        """
+        给单个管理员发卡片并加急；顺便记下单聊 chat_id
+        :return: 卡片是否送达 (卡片已送达但加急失败时只记日志，这位管理员仍然能看到报警)
+        """
+        url = f"{self.api_base}/im/v1/messages"
+        headers = {"Authorization": f"Bearer {token}"}
+        body = {"receive_id": open_id, "msg_type": "interactive", "content": json.dumps(card_content)}
         try:
-            resp = requests.post(url, json=data, proxies={"http": None, "https": None})
-            if resp.json().get("code") == 0:
-                return resp.json().get("tenant_access_token")
-            self.logger.error(f"Token 获取失败: {resp.text}")
-            return None
+            res = http_session.post(url, op="send_card_p2p", headers=headers,
+                                    params={"receive_id_type": "open_id"}, json=body).json()
+            if res.get("code") != 0:
+                self.logger.error("单聊发送失败 %s: %s", open_id, res)
+                return False
+            data = res.get("data", {})
+            if data.get("chat_id"):
+                self.p2p_chat_ids[open_id] = data["chat_id"]
+            if not self.buzz_message(data.get("message_id"), [open_id], urgent_type=urgent_type):
+                self.logger.warning("⚠️ 已给 %s 发送卡片，但 [%s] 加急失败", open_id, urgent_type)
+            return True
         except Exception:
-            self.logger.exception("获取 Token 异常")
-            return None
\ No newline at end of file
+            self.logger.exception("单聊发送异常 %s", open_id)
+            return False
+
+    def get_p2p_chat_id(self, user_id):
+        """获取与某个用户的单聊 chat_id (有缓存)"""
+        return self.get_p2p_chat_ids([user_id]).get(user_id)
+
+    def get_p2p_chat_ids(self, user_ids):
+        """
+        批量获取单聊 chat_id，已缓存的不再请求，其余一次批量查询
+        :return: {open_id: chat_id}
+        """
+        missing = [uid for uid in user_ids if uid not in self.p2p_chat_ids]
+        if missing:
+            token = self._get_tenant_access_token()
+            if token:
+                url = f"{self.api_base}/im/v1/chat_p2p/batch_query"
+                headers = {"Authorization": f"Bearer {token}"}
+                try:
+                    res = http_session.post(url, op="p2p_batch_query", headers=headers,
+                                            params={"user_id_type": "open_id"}, json={"chatter_ids": missing}).json()
+                    if res.get("code") == 0:
+                        for chat in res.get("data", {}).get("p2p_chats") or []:
+                            self.p2p_chat_ids[chat.get("chatter_id")] = chat.get("chat_id")
+                    else:
+                        self.logger.error("查询单聊 ID 失败: %s", res)
+                except Exception:
+                    self.logger.exception("查询单聊 ID 异常")
+        return {uid: self.p2p_chat_ids[uid] for uid in user_ids if uid in self.p2p_chat_ids}
+
+    def check_user_reply(self, chat_id, start_time_ts, incident_id=None):
+        """检查某个单聊里有没有确认回复 (增量轮询)"""
+        return self.check_chat_reply(start_time_ts, incident_id=incident_id, chat_id=chat_id)
+
+    def check_admin_replies(self, chat_ids, start_time_ts, incident_id=None):
+        """
+        并发检查所有管理员单聊，任意一人确认即返回 True
+        管理员再多，一次检查的耗时也接近单次请求
+        """
+        chat_ids = list(chat_ids)
+        if len(chat_ids) <= 1:
+            return bool(chat_ids) and self.check_user_reply(chat_ids[0], start_time_ts, incident_id)
+        futures = [self._admin_pool.submit(self.check_user_reply, cid, start_time_ts, incident_id)
+                   for cid in chat_ids]
+        for fut in as_completed(futures):
+            if fut.result():
+                return True
+        return False
+
+    def get_tenant_access_token(self):
+        return self._get_tenant_access_token()
@@ -1,16 +1,16 @@
 from core.communication.feishu import FeishuNotifier
-import requests
+from core.communication import http_session
 
 
 def get_group_id():
     notifier = FeishuNotifier()
     token = notifier.get_tenant_access_token()
 
-    url = "https://open.feishu.cn/open-apis/im/v1/chats"
+    url = f"{notifier.api_base}/im/v1/chats"
     headers = {"Authorization": f"Bearer {token}"}
 
     # 获取机器人所在的群列表
-    resp = requests.get(url, headers=headers)
+    resp = http_session.get(url, headers=headers)
     print(resp.json())
 
 
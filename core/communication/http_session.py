@@ -0,0 +1,116 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.communication import watchdog
+from utils import metrics
+from utils.logger import setup_logger
+
+# 飞书开放平台接口前缀
+FEISHU_API_BASE = "https://open.feishu.cn/open-apis"
+
+# 默认超时 (连接超时, 读取超时)，防止某个请求卡死整个报警线程
+DEFAULT_TIMEOUT = (3.05, 10)
+# 上传图片之类的大请求，读取超时放宽
+UPLOAD_TIMEOUT = (3.05, 30)
+# 这些接口的耗时取决于请求体大小，只向看门狗报成败，不计入渠道平均耗时
+UNTIMED_OPS = frozenset({"upload_image"})
+
+# 连接池大小：同一个 host 最多保持多少条长连接
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+logger = setup_logger("HTTP")
+
+
+def get_session():
+    """
+    获取进程内共享的 requests.Session
+    - 复用 TCP/TLS 连接 (keep-alive)，报警时不用再握手
+    - 连接池大小有上限，并发再多也不会无限开连接
+    - trust_env=False：不读取系统代理配置 (等价于以前每次传 proxies=None)
+    """
+    global _session
+    if _session is not None:
+        return _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.trust_env = False
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                                  pool_block=False, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def request(method, url, timeout=None, op=None, **kwargs):
+    """
+    所有飞书接口统一走这里，自动带上连接池和超时
+    :param op: 接口名 (如 "send_card")，每次调用的耗时和成败记到 feishu_api_seconds / feishu_api_total{op=...}
+    每次调用同时上报给渠道看门狗：网络异常、5xx、429 限流算飞书渠道失败
+    """
+    begin = time.perf_counter()
+    with metrics.span("feishu_api", op=op or "other") as span:
+        try:
+            resp = get_session().request(method, url, timeout=timeout or DEFAULT_TIMEOUT, **kwargs)
+        except requests.RequestException as e:
+            watchdog.report(watchdog.FEISHU, False, time.perf_counter() - begin, repr(e))
+            raise
+        if resp.status_code >= 400:
+            span.fail()
+        degraded = resp.status_code >= 500 or resp.status_code == 429
+        watchdog.report(watchdog.FEISHU, not degraded,
+                        None if op in UNTIMED_OPS else time.perf_counter() - begin,
+                        f"HTTP {resp.status_code}" if degraded else None)
+        return resp
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def prewarm(url=FEISHU_API_BASE, connections=2):
+    """
+    预热连接池：提前完成 DNS + TCP + TLS 握手，第一次报警时直接复用
+    :param url: 要预热的地址 (只关心 host)
+    :param connections: 预热几条并行连接
+    :return: 成功建立的连接数
+    """
+
+    def _touch(_):
+        try:
+            # 只为建立连接，返回什么状态码都无所谓
+            request("HEAD", url, op="prewarm", allow_redirects=False)
+            return True
+        except requests.RequestException as e:
+            logger.warning("连接预热失败: %s (%s)", url, e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        ok = sum(pool.map(_touch, range(connections)))
+    logger.info("🔌 连接预热完成: %s (%d/%d)", url, ok, connections)
+    return ok
+
+
+def close():
+    """关闭共享 Session (主要给测试和进程退出用)"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,135 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.logger import setup_logger
+
+# Pillow 已在 requirements.txt 里；万一没装，退化为直接上传原图 (第一次压缩时警告一次)
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = setup_logger("Feishu")
+_pillow_warned = threading.Event()
+
+
+def compress_image(data, max_side=1280, quality=80):
+    """
+    缩小并重新编码为 JPEG，减少上传耗时
+    :param data: 原始图片字节
+    :param max_side: 长边最大像素
+    :return: 压缩后的字节 (无法压缩或压缩后更大时返回原图)
+    """
+    if Image is None:
+        if not _pillow_warned.is_set():
+            _pillow_warned.set()
+            logger.warning("⚠️ 未安装 Pillow，报警截图不压缩直接上传 (pip install Pillow)")
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert("RGB")
+            img.thumbnail((max_side, max_side))
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+        compressed = out.getvalue()
+        return compressed if len(compressed) < len(data) else data
+    except Exception:
+        return data
+
+
+class ImagePipeline:
+    """
+    报警截图上传流水线
+    - 按图片内容哈希缓存 image_key：同一张图重发、升级加急都不会重复上传
+    - 截图一产生就可以 prefetch()，上传与其他报警步骤并行
+    - 同一张图并发请求只会上传一次 (其余请求等待同一个 Future)
+    """
+
+    MAX_CACHED_KEYS = 256
+
+    def __init__(self, upload_func, max_side=1280, quality=80, max_workers=2):
+        """
+        :param upload_func: 真正的上传函数，接收图片字节，返回 image_key 或 None
+        """
+        self.logger = setup_logger("Feishu")
+        self.upload_func = upload_func
+        self.max_side = max_side
+        self.quality = quality
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-upload")
+        self._lock = threading.Lock()
+        # 内容哈希 -> Future(image_key)
+        self._keys = OrderedDict()
+        # (路径, mtime, 大小) -> 内容哈希，同一个文件不用每次重新读取计算
+        self._path_digests = OrderedDict()
+        self.upload_count = 0
+
+    def prefetch(self, image_path):
+        """后台开始上传，立即返回 Future；已上传过的图片直接返回已完成的 Future"""
+        path_key = self._path_key(image_path)
+        with self._lock:
+            digest = self._path_digests.get(path_key) if path_key else None
+            if digest and digest in self._keys:
+                self._keys.move_to_end(digest)
+                return self._keys[digest]
+        return self._executor.submit(self._resolve, image_path, path_key)
+
+    def get_image_key(self, image_path, timeout=None):
+        """阻塞获取 image_key，失败返回 None"""
+        return self.result(self.prefetch(image_path), timeout)
+
+    def result(self, future, timeout=None):
+        """等待 prefetch 返回的 Future，失败 (文件不存在、超时等) 返回 None"""
+        try:
+            return future.result(timeout)
+        except Exception:
+            self.logger.exception("图片上传异常")
+            return None
+
+    def _path_key(self, image_path):
+        try:
+            st = os.stat(image_path)
+            return str(image_path), st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _resolve(self, image_path, path_key):
+        with open(image_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            if path_key:
+                self._remember(self._path_digests, path_key, digest)
+            fut = self._keys.get(digest)
+            owner = fut is None
+            if owner:
+                fut = Future()
+                self._remember(self._keys, digest, fut)
+
+        if not owner:
+            # 内容相同的图片正在 / 已经上传
+            return fut.result()
+
+        try:
+            image_key = self.upload_func(compress_image(data, self.max_side, self.quality))
+        except Exception as e:
+            image_key = None
+            self.logger.error("图片上传异常: %s", e)
+        if image_key:
+            self.upload_count += 1
+        else:
+            # 上传失败不缓存，下次重新上传
+            with self._lock:
+                self._keys.pop(digest, None)
+        fut.set_result(image_key)
+        return image_key
+
+    def _remember(self, table, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.MAX_CACHED_KEYS:
+            table.popitem(last=False)
@@ -0,0 +1,153 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import config
+from utils.logger import setup_logger
+
+# 默认日志文件 (项目根目录下 output/journal)
+DEFAULT_JOURNAL_PATH = Path(__file__).resolve().parent.parent.parent / "output" / "journal" / "incidents.db"
+
+# 事件类型
+START = "start"      # 报警开始 (image_path, start_time, source)
+STAGE = "stage"      # 某个阶段执行完 (stage_idx, msg_id, chat_ids, notified_at)
+FINISH = "finish"    # 报警结束 (status)
+
+
+class IncidentJournal:
+    """
+    报警流水日志 (SQLite WAL，只追加)
+    - record() 只是把事件放进内存队列 (微秒级)，不碰磁盘，报警线程不会被 fsync 卡住
+    - 后台线程把攒下的事件放在一个事务里提交，一次 fsync 写入一批 (组提交)
+    - 进程重启后 open_incidents() 回放日志，得到所有未结束报警的最新状态
+    - 每结束 compact_every 个报警，写盘线程顺便清理一次已结束的记录，日志不会随运行时间无限增长
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, compact_every=None):
+        self.logger = setup_logger("Journal")
+        self.path = Path(path)
+        self.compact_every = compact_every or config.INCIDENT_JOURNAL["compact_every"]
+        self._finished = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + FULL：每次提交都 fsync，提交是按批进行的，所以每批只有一次 fsync
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " incident_id TEXT NOT NULL,"
+            " ts REAL NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " data TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_events_incident ON events (incident_id)")
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._enqueued = 0
+        self._written = 0
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="incident-journal", daemon=True)
+        self._writer.start()
+
+    # ---------------- 写入 ----------------
+
+    def record(self, incident_id, kind, **data):
+        """追加一条事件 (立即返回，由后台线程落盘)"""
+        item = (incident_id, time.time(), kind, json.dumps(data, ensure_ascii=False))
+        with self._cond:
+            if self._closed:
+                return
+            self._pending.append(item)
+            self._enqueued += 1
+            self._cond.notify()
+
+    def flush(self, timeout=5):
+        """等待到目前为止记录的事件全部落盘"""
+        deadline = time.time() + timeout
+        with self._cond:
+            target = self._enqueued
+            while self._written < target:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """写完剩余事件后关闭"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join(timeout=10)
+        with self._db_lock:
+            self._conn.close()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                # 一次取走全部：上一批 fsync 期间积累的事件合并成一个事务
+                batch, self._pending = self._pending, []
+            try:
+                with self._db_lock:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany("INSERT INTO events (incident_id, ts, kind, data) VALUES (?, ?, ?, ?)",
+                                           batch)
+                    self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.logger.exception("报警日志写入失败 (%d 条)", len(batch))
+                with self._db_lock:
+                    if self._conn.in_transaction:
+                        self._conn.execute("ROLLBACK")
+            with self._cond:
+                self._written += len(batch)
+                self._cond.notify_all()
+            self._finished += sum(1 for item in batch if item[2] == FINISH)
+            if self._finished >= self.compact_every:
+                self._finished = 0
+                try:
+                    self._compact()
+                except sqlite3.Error:
+                    self.logger.exception("报警日志清理失败")
+
+    # ---------------- 回放 ----------------
+
+    def open_incidents(self):
+        """
+        回放日志，返回所有未结束的报警 (按开始顺序)
+        :return: [{"incident_id", "start_time", "image_path", "source", "stage_idx", "msg_id", ...}]
+        """
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute("SELECT incident_id, kind, data FROM events ORDER BY seq").fetchall()
+        incidents = {}
+        for incident_id, kind, data in rows:
+            data = json.loads(data)
+            if kind == START:
+                incidents[incident_id] = dict(data, incident_id=incident_id)
+            elif kind == FINISH:
+                incidents.pop(incident_id, None)
+            elif incident_id in incidents:
+                incidents[incident_id].update(data)
+        return list(incidents.values())
+
+    def compact(self):
+        """删除已结束报警的记录，日志只保留进行中的报警"""
+        self.flush()
+        return self._compact()
+
+    def _compact(self):
+        with self._db_lock:
+            cur = self._conn.execute(
+                "DELETE FROM events WHERE incident_id IN (SELECT incident_id FROM events WHERE kind = ?)", (FINISH,))
+            return cur.rowcount
@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import config
+from utils.logger import setup_logger
+
+# 默认缓存目录 (项目根目录下 output/cache)
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent.parent / "output" / "cache"
+
+
+def normalize_mobile(mobile):
+    """统一手机号格式：去掉空格 / 横线，统一带 + 号 (飞书接口要求)"""
+    mobile = str(mobile).strip().replace(" ", "").replace("-", "")
+    return mobile if mobile.startswith("+") else f"+{mobile}"
+
+
+class OpenIdCache:
+    """
+    手机号 -> open_id 的磁盘缓存
+    - open_id 与飞书应用绑定，所以每个 app_id 一个文件
+    - 过期 (超过 ttl) 的记录仍然可以先用，由调用方在后台刷新
+    - 进程崩溃重启后无需任何网络请求即可拿到管理员列表
+    """
+
+    DEFAULT_TTL = 7 * 24 * 3600
+
+    def __init__(self, app_id, cache_dir=None, ttl=DEFAULT_TTL):
+        """:param cache_dir: 缓存目录，默认取 .env 里的 cache_dir，没配置时为 output/cache"""
+        self.logger = setup_logger("Feishu")
+        cache_dir = cache_dir or config.get_env().get("cache_dir") or DEFAULT_CACHE_DIR
+        self.path = Path(cache_dir) / f"open_ids_{app_id}.json"
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {k: v for k, v in data.items() if isinstance(v, dict) and v.get("open_id")}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            self.logger.warning("open_id 缓存文件损坏，已忽略: %s", self.path)
+            return {}
+
+    def lookup(self, mobile):
+        """
+        :return: (open_id, 是否新鲜)；没有缓存返回 (None, False)
+        """
+        entry = self._entries.get(normalize_mobile(mobile))
+        if not entry:
+            return None, False
+        return entry["open_id"], time.time() - entry.get("ts", 0) < self.ttl
+
+    def update(self, mapping):
+        """批量写入 {mobile: open_id} 并落盘"""
+        if not mapping:
+            return
+        now = time.time()
+        with self._lock:
+            for mobile, open_id in mapping.items():
+                self._entries[normalize_mobile(mobile)] = {"open_id": open_id, "ts": now}
+            self._save_locked()
+
+    def _save_locked(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            # 原子替换，写到一半崩溃也不会留下半个文件
+            os.replace(tmp, self.path)
+        except OSError:
+            self.logger.exception("open_id 缓存写入失败")
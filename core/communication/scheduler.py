@@ -0,0 +1,133 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logger import setup_logger
+
+
+class TimerScheduler:
+    """
+    单线程定时器 (最小堆)
+    - 一个线程负责"到点"，到点的任务交给线程池执行，网络请求不会拖慢其他定时器
+    - 会阻塞在网络请求上的任务 (io=True，如报警阶段) 走单独的 I/O 线程池，占满了也不影响轻量回调按时执行
+    - 每个定时任务只是堆里的一个小列表，几千个待处理报警也只占很少内存
+    """
+
+    def __init__(self, max_workers=4, io_workers=16, name="escalation"):
+        """
+        :param max_workers: 轻量回调线程数
+        :param io_workers: I/O 线程数，决定最多同时有几个报警在等网络请求
+        """
+        self.logger = setup_logger("Scheduler")
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._entries = {}    # 还在堆里且未取消的任务：句柄 -> 堆条目
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-action")
+        self._io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix=f"{name}-io")
+        self._thread = threading.Thread(target=self._run, name=f"{name}-timer", daemon=True)
+        # 调度延迟统计 (实际触发时间 - 计划时间)
+        self.fired = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._thread.start()
+
+    def call_at(self, due, fn, *args, io=False):
+        """
+        在 due (time.time() 时间戳) 时执行 fn(*args)
+        :param io: fn 会阻塞在网络请求上时传 True，交给 I/O 线程池执行
+        :return: 任务句柄，可用于 cancel()
+        """
+        handle = next(self._seq)
+        entry = [due, handle, fn, args, io]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            self._entries[handle] = entry
+            # 新任务比当前最早的还早时，唤醒定时线程重新计算等待时间
+            if self._heap[0][1] == handle:
+                self._cond.notify()
+        return handle
+
+    def call_later(self, delay, fn, *args, io=False):
+        return self.call_at(time.time() + delay, fn, *args, io=io)
+
+    def cancel(self, handle):
+        """
+        取消任务 (惰性删除：条目留在堆里，到点时直接跳过)
+        已经执行过或已取消的句柄直接忽略
+        :return: 是否取消了一个还没执行的任务
+        """
+        with self._cond:
+            entry = self._entries.pop(handle, None)
+            if entry is None:
+                return False
+            entry[2] = None
+            return True
+
+    def pending(self):
+        with self._cond:
+            return len(self._entries)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._entries),
+                "fired": self.fired,
+                "max_lag": self.max_lag,
+                "avg_lag": self.total_lag / self.fired if self.fired else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if wait:
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+        self._io_executor.shutdown(wait=wait)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if not self._running:
+                    return
+                due, handle, fn, args, io = heapq.heappop(self._heap)
+                if fn is None:
+                    continue
+                del self._entries[handle]
+                lag = time.time() - due
+                self.fired += 1
+                self.total_lag += lag
+                if lag > self.max_lag:
+                    self.max_lag = lag
+            (self._io_executor if io else self._executor).submit(self._invoke, fn, args)
+
+    def _invoke(self, fn, args):
+        try:
+            fn(*args)
+        except Exception:
+            self.logger.exception("定时任务执行异常")
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def get_default_scheduler():
+    """进程内共享的报警定时器"""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = TimerScheduler()
+        return _default_scheduler
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from alibabacloud_dysmsapi20170525 import models as dysms_models
+from alibabacloud_tea_util import models as util_models
+
+from utils import metrics
+from utils.logger import setup_logger
+from core.communication.watchdog import ALIYUN_SMS, api_call
+
+# 阿里云单次请求的号码上限
+SEND_SMS_LIMIT = 1000       # SendSms：逗号分隔，同一模板参数
+SEND_BATCH_SMS_LIMIT = 100  # SendBatchSms：每个号码可以有不同的模板参数
+
+# 可以重试的错误码 (流控 / 服务端临时错误)，其余错误 (号码非法、签名错误等) 重试也没用
+RETRYABLE_CODES = frozenset([
+    "isv.BUSINESS_LIMIT_CONTROL",
+    "isp.SYSTEM_ERROR",
+    "Throttling",
+    "Throttling.User",
+    "ServiceUnavailable",
+    "InternalError",
+])
+
+
+class SmsDelivery:
+    """单个号码的发送结果"""
+
+    __slots__ = ("phone", "ok", "code", "message", "biz_id", "attempts")
+
+    def __init__(self, phone, ok, code, message=None, biz_id=None, attempts=1):
+        self.phone = phone
+        self.ok = ok
+        self.code = code
+        self.message = message
+        self.biz_id = biz_id
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"SmsDelivery({self.phone}, ok={self.ok}, code={self.code}, attempts={self.attempts})"
+
+
+class SmsDeliveryResult:
+    """一次群发的结果：每个号码一条记录"""
+
+    def __init__(self):
+        self.deliveries = {}
+
+    def add(self, delivery):
+        self.deliveries[delivery.phone] = delivery
+
+    @property
+    def ok(self):
+        return bool(self.deliveries) and all(d.ok for d in self.deliveries.values())
+
+    @property
+    def succeeded(self):
+        return [p for p, d in self.deliveries.items() if d.ok]
+
+    @property
+    def failed(self):
+        return [p for p, d in self.deliveries.items() if not d.ok]
+
+    def __getitem__(self, phone):
+        return self.deliveries[phone]
+
+    def __len__(self):
+        return len(self.deliveries)
+
+    def __repr__(self):
+        return f"SmsDeliveryResult(ok={len(self.succeeded)}, failed={len(self.failed)})"
+
+
+class SmsFanout:
+    """
+    短信群发引擎
+    - 按接口上限切块，多个块并发发送，大名单也只需要约一个 RTT
+    - 只重试失败 (且可重试) 的块，带随机抖动的指数退避
+    - 每个号码需要不同参数时走 SendBatchSms
+    """
+
+    def __init__(self, client, sign_name, template_code, max_workers=8, max_attempts=3, backoff_base=0.5,
+                 chunk_size=SEND_SMS_LIMIT):
+        self.logger = setup_logger("AliyunSMS")
+        self.client = client
+        self.sign_name = sign_name
+        self.template_code = template_code
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.chunk_size = min(chunk_size, SEND_SMS_LIMIT)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sms-fanout")
+        self._sleep = time.sleep
+
+    def send(self, phone_numbers, params=None, per_number_params=None):
+        """
+        :param phone_numbers: 号码列表
+        :param params: 所有号码共用的模板参数
+        :param per_number_params: 可选 {号码: 参数}，提供时改用 SendBatchSms
+        :return: SmsDeliveryResult
+        """
+        chunks, build = self._plan(phone_numbers, params, per_number_params)
+        result = SmsDeliveryResult()
+        futures = [self._executor.submit(self._send_with_retry, chunk, build) for chunk in chunks]
+        for fut in futures:
+            for delivery in fut.result():
+                result.add(delivery)
+        self._log_result(result, len(chunks))
+        return result
+
+    async def send_async(self, phone_numbers, params=None, per_number_params=None):
+        """
+        send() 的 asyncio 版本：各块用 SDK 自带的 *_async 接口并发发出，退避用 asyncio.sleep，不占线程
+        """
+        chunks, build = self._plan(phone_numbers, params, per_number_params)
+        result = SmsDeliveryResult()
+        for deliveries in await asyncio.gather(*(self._send_with_retry_async(chunk, build) for chunk in chunks)):
+            for delivery in deliveries:
+                result.add(delivery)
+        self._log_result(result, len(chunks))
+        return result
+
+    def _plan(self, phone_numbers, params, per_number_params):
+        """
+        去重、切块，选接口
+        :return: ([号码块], build(chunk) -> (接口名, 请求))
+        """
+        phones = list(dict.fromkeys(p.strip() for p in phone_numbers if p and p.strip()))
+        if per_number_params:
+            size = SEND_BATCH_SMS_LIMIT
+            build = lambda chunk: ("send_batch_sms", self._batch_request(chunk, per_number_params, params))
+        else:
+            size = self.chunk_size
+            build = lambda chunk: ("send_sms", self._plain_request(chunk, params))
+        return [phones[i:i + size] for i in range(0, len(phones), size)], build
+
+    def _log_result(self, result, requests):
+        if not result:
+            return
+        if result.failed:
+            self.logger.error("❌ 短信发送失败 %d/%d: %s", len(result.failed), len(result), result.failed)
+        else:
+            self.logger.info("✅ 短信全部发送成功 (%d 人, %d 个请求)", len(result), requests)
+
+    def _send_with_retry(self, chunk, build):
+        attempt = 0
+        while True:
+            attempt += 1
+            ok, code, message, biz_id = self._call(*build(chunk))
+            delay = self._retry_delay(ok, code, attempt, chunk)
+            if delay is None:
+                return [SmsDelivery(p, ok, code, message, biz_id, attempt) for p in chunk]
+            self._sleep(delay)
+
+    async def _send_with_retry_async(self, chunk, build):
+        attempt = 0
+        while True:
+            attempt += 1
+            ok, code, message, biz_id = await self._call_async(*build(chunk))
+            delay = self._retry_delay(ok, code, attempt, chunk)
+            if delay is None:
+                return [SmsDelivery(p, ok, code, message, biz_id, attempt) for p in chunk]
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, ok, code, attempt, chunk):
+        """:return: 重试前等待的秒数；成功、不可重试或次数用完时返回 None"""
+        if ok or code not in RETRYABLE_CODES or attempt >= self.max_attempts:
+            return None
+        metrics.inc("aliyun_sms_retries_total", code=code)
+        # 带抖动的指数退避，避免所有块同时重试再次触发流控
+        delay = random.uniform(0, self.backoff_base * (2 ** (attempt - 1)))
+        self.logger.warning("短信发送被限流/临时失败 (%s)，%.2fs 后重试 %d 个号码", code, delay, len(chunk))
+        return delay
+
+    def _plain_request(self, chunk, params):
+        return dysms_models.SendSmsRequest(
+            sign_name=self.sign_name,
+            template_code=self.template_code,
+            phone_numbers=",".join(chunk),
+            template_param=json.dumps(params) if params else "{}"
+        )
+
+    def _batch_request(self, chunk, per_number_params, default_params):
+        return dysms_models.SendBatchSmsRequest(
+            phone_number_json=json.dumps(chunk),
+            sign_name_json=json.dumps([self.sign_name] * len(chunk), ensure_ascii=False),
+            template_code=self.template_code,
+            template_param_json=json.dumps([per_number_params.get(p, default_params or {}) for p in chunk],
+                                           ensure_ascii=False)
+        )
+
+    def _call(self, op, request):
+        """:return: (是否成功, 错误码, 错误信息, BizId)"""
+        with metrics.span("aliyun_api", op=op) as span:
+            try:
+                with api_call(ALIYUN_SMS):
+                    resp = getattr(self.client, f"{op}_with_options")(request, util_models.RuntimeOptions())
+            except Exception as e:
+                return self._error(span, e)
+            return self._outcome(span, resp)
+
+    async def _call_async(self, op, request):
+        with metrics.span("aliyun_api", op=op) as span:
+            try:
+                with api_call(ALIYUN_SMS):
+                    resp = await getattr(self.client, f"{op}_with_options_async")(request,
+                                                                                  util_models.RuntimeOptions())
+            except Exception as e:
+                return self._error(span, e)
+            return self._outcome(span, resp)
+
+    @staticmethod
+    def _outcome(span, resp):
+        body = resp.body
+        if body.code != "OK":
+            span.fail()
+        return body.code == "OK", body.code, body.message, body.biz_id
+
+    @staticmethod
+    def _error(span, e):
+        span.fail()
+        # SDK 抛出的异常 (网关限流等) 带错误码；网络异常等没有错误码，按可重试处理
+        return False, getattr(e, "code", None) or "InternalError", str(e), None
@@ -0,0 +1,122 @@
+import threading
+import time
+
+from utils.logger import setup_logger
+from core.communication import http_session
+from core.communication.http_session import FEISHU_API_BASE
+
+
+class TenantTokenCache:
+    """
+    飞书 tenant_access_token 进程级共享缓存
+    - 同一个 app_id 在整个进程里只保留一份 token，所有 FeishuNotifier 实例共用
+    - 在接口返回的 expire 到期前一段时间视为失效，避免拿到"刚好过期"的 token
+    - 到期前由后台定时器提前刷新，报警线程基本不会再等待鉴权请求
+    """
+
+    # 到期前多少秒开始视为不可用 (强制同步刷新)
+    EXPIRE_SAFETY_SECONDS = 60
+    # 到期前多少秒由后台提前刷新
+    REFRESH_AHEAD_SECONDS = 300
+    # 刷新失败后的重试间隔
+    RETRY_SECONDS = 10
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, app_id, app_secret, api_base=FEISHU_API_BASE):
+        """获取进程内共享的缓存实例 (按 app_id + app_secret + 接口地址 区分)"""
+        key = (app_id, app_secret, api_base)
+        with cls._instances_lock:
+            cache = cls._instances.get(key)
+            if cache is None:
+                cache = cls(app_id, app_secret, api_base)
+                cls._instances[key] = cache
+            return cache
+
+    def __init__(self, app_id, app_secret, api_base=FEISHU_API_BASE):
+        self.logger = setup_logger("Feishu")
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.token_url = f"{api_base}/auth/v3/tenant_access_token/internal"
+
+        self._lock = threading.Lock()
+        self._token = None
+        self._expire_at = 0.0
+        self._timer = None
+
+    def get(self, force_refresh=False):
+        """
+        获取可用 token，缓存有效时不产生任何网络请求
+        :param force_refresh: 为 True 时忽略缓存 (比如接口返回 token 失效)
+        :return: token 字符串，失败返回 None
+        """
+        token = self._token
+        if not force_refresh and token and time.time() < self._expire_at - self.EXPIRE_SAFETY_SECONDS:
+            return token
+
+        with self._lock:
+            # 双重检查：等锁期间可能已经被其他线程刷新过了
+            if not force_refresh and self._token and time.time() < self._expire_at - self.EXPIRE_SAFETY_SECONDS:
+                return self._token
+            return self._refresh_locked()
+
+    def get_cached(self):
+        """只读缓存，不发请求也不加锁；缓存无效时返回 None (给异步代码用，避免阻塞事件循环)"""
+        token = self._token
+        if token and time.time() < self._expire_at - self.EXPIRE_SAFETY_SECONDS:
+            return token
+        return None
+
+    def invalidate(self):
+        """丢弃当前 token，下次 get 时重新获取"""
+        with self._lock:
+            self._token = None
+            self._expire_at = 0.0
+
+    def close(self):
+        """停止后台刷新定时器"""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def _refresh_locked(self):
+        token, expire = self._request_token()
+        if token:
+            self._token = token
+            self._expire_at = time.time() + expire
+            self._schedule_refresh(max(expire - self.REFRESH_AHEAD_SECONDS, self.RETRY_SECONDS))
+        else:
+            self._schedule_refresh(self.RETRY_SECONDS)
+        return token
+
+    def _schedule_refresh(self, delay):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            self._timer = None
+            self._refresh_locked()
+
+    def _request_token(self):
+        """
+        真正发起鉴权请求
+        :return: (token, expire 秒数)，失败返回 (None, 0)
+        """
+        data = {"app_id": self.app_id, "app_secret": self.app_secret}
+        try:
+            resp = http_session.post(self.token_url, op="token", json=data)
+            res = resp.json()
+            if res.get("code") == 0:
+                return res.get("tenant_access_token"), int(res.get("expire", 0))
+            self.logger.error("Token 获取失败: %s", resp.text)
+            return None, 0
+        except Exception:
+            self.logger.exception("获取 Token 异常")
+            return None, 0
@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import config
+from utils import metrics
+from utils.logger import setup_logger
+
+# 通知渠道
+FEISHU = "feishu"
+ALIYUN_SMS = "aliyun_sms"
+ALIYUN_VOICE = "aliyun_voice"
+
+# 报警阶段 -> 所走的渠道
+ACTION_CHANNELS = {
+    "group_card": FEISHU,
+    "admin_card": FEISHU,
+    "buzz": FEISHU,
+    "sms": ALIYUN_SMS,
+    "voice": ALIYUN_VOICE,
+}
+
+_listeners = []                 # 已启动的看门狗，见 report()
+_probing = threading.local()    # 探测期间的接口调用由 probe() 统一计一次，不重复上报
+
+
+def report(channel, ok, latency=None, error=None):
+    """
+    接口层 (http_session / 阿里云 SDK 调用处) 每次真实调用后上报一次，计入已启动看门狗的滚动窗口
+    - ok=False 只表示渠道本身有问题 (网络异常、超时、5xx / 限流)；手机号无效这类业务错误不算
+    - latency=None 表示这次耗时代表不了渠道快慢 (如上传大图)，只计成败
+    """
+    if getattr(_probing, "active", False):
+        return
+    for listener in tuple(_listeners):
+        listener(channel, ok, latency, error)
+
+
+@contextmanager
+def api_call(channel):
+    """包住一次 SDK 调用：抛异常计为渠道失败 (异常照常抛出)，正常返回计为成功"""
+    begin = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        report(channel, False, time.perf_counter() - begin, repr(e))
+        raise
+    report(channel, True, time.perf_counter() - begin)
+
+
+class ChannelHealth:
+    """单个渠道最近 window 次调用 (探测 + 真实接口调用) 的成败与耗时"""
+
+    __slots__ = ("name", "samples", "latency", "consecutive_failures", "last_error", "last_checked")
+
+    def __init__(self, name, window):
+        self.name = name
+        self.samples = deque(maxlen=window)   # 最近几次是否成功
+        self.latency = None                   # 耗时的指数移动平均 (秒)
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_checked = None
+
+    def record(self, ok, latency, error=None, alpha=0.3):
+        self.samples.append(bool(ok))
+        if latency is not None:
+            self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+        self.last_error = None if ok else error
+        self.last_checked = time.time()
+
+    @property
+    def success_rate(self):
+        if not self.samples:
+            return 1.0
+        return sum(self.samples) / len(self.samples)
+
+    def as_dict(self):
+        return {
+            "success_rate": round(self.success_rate, 3),
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_checked": self.last_checked,
+        }
+
+
+class HealthWatchdog:
+    """
+    通知渠道看门狗
+    - 后台线程定期探测每个渠道 (飞书顺便刷新 token)，长连接一直保持活跃，空闲很久后的第一次报警不用重新握手
+    - 探测结果和每次真实接口调用 (由接口层 report() 上报) 一起计入滚动窗口，得出每个渠道是否降级
+      报警阶段整体的成败不计入：没配管理员、没配语音模板这类问题和渠道健康无关
+    - 报警引擎据此绕开降级的渠道 (先走健康渠道、立即触发对冲)，不用在真实火情里等超时才发现
+    """
+
+    WINDOW = 10                  # 滚动窗口大小
+    FAILURE_THRESHOLD = 2        # 连续失败几次判为降级
+    MIN_SUCCESS_RATE = 0.5       # 窗口成功率低于它判为降级
+    MAX_LATENCY = 5.0            # 平均耗时超过它 (秒) 判为降级
+
+    def __init__(self, interval=None, window=WINDOW):
+        """
+        :param interval: 探测间隔 (秒)，默认取 .env 里的 watchdog_interval (60)
+        """
+        self.logger = setup_logger("Watchdog")
+        if interval is None:
+            interval = float(config.get_env().get("watchdog_interval", "60"))
+        self.interval = interval
+        self.window = window
+
+        self._lock = threading.Lock()
+        self._probes = {}     # 渠道 -> probe()
+        self._health = {}     # 渠道 -> ChannelHealth
+        self._degraded = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------------- 配置 ----------------
+
+    def add_channel(self, name, probe=None):
+        """
+        登记一个渠道
+        :param probe: 可选，无参函数，返回 True 表示可用 (抛异常视为失败)；不传则只统计真实调用
+        """
+        with self._lock:
+            if probe is not None:
+                self._probes[name] = probe
+            self._health.setdefault(name, ChannelHealth(name, self.window))
+        return self
+
+    def add_notifiers(self, feishu=None, aliyun=None, voice=None):
+        """登记项目里的三个通知器 (传 None 的跳过)"""
+        for name, notifier in ((FEISHU, feishu), (ALIYUN_SMS, aliyun), (ALIYUN_VOICE, voice)):
+            if notifier is not None:
+                self.add_channel(name, notifier.probe)
+        return self
+
+    def start(self):
+        """开始接收接口层上报，并在后台线程里立即探测一轮 (顺带预热连接和 token)，之后定期探测；不阻塞调用方"""
+        _listeners.append(self._on_call)
+        self._thread = threading.Thread(target=self._run, name="channel-watchdog", daemon=True)
+        self._thread.start()
+        self.logger.info("🐕 渠道看门狗已启动 (每 %g 秒探测一次)", self.interval)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._on_call in _listeners:
+            _listeners.remove(self._on_call)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    # ---------------- 状态 ----------------
+
+    def record(self, name, ok, latency, error=None):
+        """记录一次调用结果 (探测或真实接口调用)；latency 为 None 时只计成败"""
+        with self._lock:
+            health = self._health.get(name)
+            if health is None:
+                health = self._health[name] = ChannelHealth(name, self.window)
+            health.record(ok, latency, error)
+            degraded = self._is_degraded(health)
+            changed = degraded != (name in self._degraded)
+            if changed and degraded:
+                self._degraded.add(name)
+            elif changed:
+                self._degraded.discard(name)
+        if changed:
+            metrics.inc("channel_state_changes_total", channel=name, state="degraded" if degraded else "healthy")
+            if degraded:
+                self.logger.error("🚨 渠道 %s 已降级: %s", name, health.as_dict())
+            else:
+                self.logger.info("✅ 渠道 %s 已恢复", name)
+
+    def _on_call(self, channel, ok, latency, error):
+        # 只统计登记过的渠道
+        with self._lock:
+            known = channel in self._health
+        if known:
+            self.record(channel, ok, latency, error)
+
+    def is_healthy(self, name):
+        """未登记的渠道视为健康"""
+        with self._lock:
+            return name not in self._degraded
+
+    def action_healthy(self, action):
+        """报警阶段所走的渠道是否健康"""
+        channel = ACTION_CHANNELS.get(action)
+        return channel is None or self.is_healthy(channel)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(health.as_dict(), healthy=name not in self._degraded)
+                    for name, health in self._health.items()}
+
+    # ---------------- 探测 ----------------
+
+    def probe_all(self):
+        with self._lock:
+            probes = list(self._probes.items())
+        for name, probe in probes:
+            self.probe(name, probe)
+
+    def probe(self, name, probe):
+        begin = time.perf_counter()
+        error = None
+        _probing.active = True
+        with metrics.span("channel_probe", channel=name) as span:
+            try:
+                ok = bool(probe())
+            except Exception as e:
+                ok, error = False, repr(e)
+            finally:
+                _probing.active = False
+            if not ok:
+                span.fail()
+        self.record(name, ok, time.perf_counter() - begin, error)
+        return ok
+
+    def _run(self):
+        self.probe_all()
+        self.logger.info("🐕 首轮探测完成: %s", self.snapshot())
+        while not self._stop.wait(self.interval):
+            self.probe_all()
+
+    def _is_degraded(self, health):
+        return (health.consecutive_failures >= self.FAILURE_THRESHOLD
+                or health.success_rate < self.MIN_SUCCESS_RATE
+                or (health.latency is not None and health.latency > self.MAX_LATENCY))
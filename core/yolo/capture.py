@@ -0,0 +1,332 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import numpy as np
+
+from core.yolo.prefilter import FramePrefilter, SKIP
+from core.yolo.ring_buffer import FrameRing
+from utils.logger import setup_logger
+
+try:
+    import cv2
+except ImportError:  # 只用合成画面 / 回放时不需要 OpenCV
+    cv2 = None
+
+# 默认画面尺寸 (高, 宽, 通道)：所有摄像头统一缩放到这个尺寸写入缓冲区
+DEFAULT_FRAME_SHAPE = (480, 640, 3)
+# 每个摄像头的槽位数：检测进程读一帧期间，解码进程还能再写 slots - 1 帧而不覆盖它
+DEFAULT_SLOTS = 4
+# 摄像头断线后的重连间隔 (秒)
+RECONNECT_SECONDS = 2.0
+# 检测进程一轮没有拿到新帧时的休眠时间 (秒)
+IDLE_SLEEP = 0.002
+
+
+class SyntheticSource:
+    """
+    合成画面 (不需要摄像头 / OpenCV)，给测试和压测用
+    每帧是带噪声的静态背景，fire_every 帧出现一次橙红色色块
+    """
+
+    def __init__(self, fps=30, fire_every=0, seed=0):
+        self.fps = fps
+        self.fire_every = fire_every
+        self.seed = seed
+        self._background = None
+        self._n = 0
+
+    def read_into(self, out):
+        if self._background is None:
+            rng = np.random.default_rng(self.seed)
+            self._background = rng.integers(40, 90, size=out.shape, dtype=np.uint8)
+        if self.fps:
+            time.sleep(1 / self.fps)
+        self._n += 1
+        np.copyto(out, self._background)
+        if self.fire_every and self._n % self.fire_every == 0:
+            h, w = out.shape[:2]
+            out[h // 3:h // 2, w // 3:w // 2] = (0, 120, 255)  # BGR 橙色
+        return True
+
+    def close(self):
+        pass
+
+
+class VideoSource:
+    """OpenCV 视频源：USB 摄像头序号、RTSP 地址或视频文件"""
+
+    def __init__(self, source):
+        if cv2 is None:
+            raise RuntimeError("需要安装 opencv-python 才能读取摄像头 / 视频")
+        self.source = int(source) if str(source).isdigit() else source
+        self.cap = cv2.VideoCapture(self.source)
+
+    def read_into(self, out):
+        # 尺寸一致时直接解码进共享内存；不一致时缩放进去
+        ok, frame = self.cap.read(out)
+        if not ok:
+            return False
+        if frame is not out:
+            cv2.resize(frame, (out.shape[1], out.shape[0]), dst=out)
+        return True
+
+    def close(self):
+        self.cap.release()
+
+
+def open_source(source):
+    """source 可以是带 read_into(out) 方法的对象，也可以是摄像头序号 / 地址 / 文件路径"""
+    if hasattr(source, "read_into"):
+        return source
+    return VideoSource(source)
+
+
+def _capture_main(camera_id, source, ring_name, shape, slots, stop):
+    """解码进程：循环读取画面写入共享内存，断线自动重连"""
+    logger = setup_logger("Capture")
+    ring = FrameRing.attach(ring_name, shape, slots)
+    reader = None
+    try:
+        while not stop.is_set():
+            if reader is None:
+                try:
+                    reader = open_source(source)
+                except Exception as e:
+                    logger.error("❌ 摄像头 %s 打开失败: %s", camera_id, e)
+                    stop.wait(RECONNECT_SECONDS)
+                    continue
+            seq, view = ring.begin_write()
+            if reader.read_into(view):
+                ring.commit(seq, time.time())
+                continue
+            logger.warning("⚠️ 摄像头 %s 读取失败，%g 秒后重连", camera_id, RECONNECT_SECONDS)
+            reader.close()
+            reader = None
+            stop.wait(RECONNECT_SECONDS)
+    finally:
+        if reader is not None:
+            reader.close()
+        ring.close()
+
+
+class FrameResult:
+    """检测进程送回主进程的结果 (只有检测框，不带画面)"""
+
+    __slots__ = ("camera_id", "seq", "ts", "detections", "skipped", "latency")
+
+    def __init__(self, camera_id, seq, ts, detections, skipped, latency):
+        self.camera_id = camera_id
+        self.seq = seq
+        self.ts = ts
+        self.detections = detections
+        self.skipped = skipped      # 与上一次处理的帧之间丢掉了几帧
+        self.latency = latency      # 从画面写入到检测完成的耗时 (秒)
+
+    def __repr__(self):
+        return f"FrameResult({self.camera_id}#{self.seq}, detections={len(self.detections)})"
+
+
+def _publish(results, ring, camera_id, seq, ts, detections, skipped, logger):
+    ring.add_stats(inferred=1, dropped=skipped)
+    try:
+        results.put_nowait(FrameResult(camera_id, seq, ts, detections, skipped, time.time() - ts))
+    except queue.Full:
+        logger.warning("检测结果队列已满，丢弃 %s#%s", camera_id, seq)
+
+
+def _detector_main(worker_id, cameras, detector_factory, results, stop, prefilter=None):
+    """
+    检测进程：轮流检查分配给自己的摄像头，有新帧就检测
+    :param cameras: [(camera_id, ring_name, shape, slots)]
+    :param detector_factory: 在子进程里创建检测器 (模型只在子进程加载)，检测器为 detect(frame) -> 检测框列表；
+                             也可以返回 BatchInferenceEngine：一轮里所有摄像头的新帧一起提交，组成一批推理
+    :param prefilter: 可选，PrefilterConfig；每个摄像头一个 FramePrefilter，没有变化的帧不送去检测
+    """
+    logger = setup_logger("Detector")
+    rings = {cid: FrameRing.attach(name, shape, slots) for cid, name, shape, slots in cameras}
+    filters = {cid: FramePrefilter(prefilter) for cid in rings} if prefilter is not None else {}
+    last_seq = dict.fromkeys(rings, 0)
+    detect = detector_factory()
+    submit = getattr(detect, "submit", None)
+    try:
+        while not stop.is_set():
+            busy = False
+            submitted = []
+            for camera_id, ring in rings.items():
+                latest = ring.latest(last_seq[camera_id])
+                if latest is None:
+                    continue
+                seq, ts, frame = latest
+                busy = True
+                skipped = seq - last_seq[camera_id] - 1 if last_seq[camera_id] else 0
+
+                if filters:
+                    t0 = time.perf_counter_ns()
+                    decision = filters[camera_id].check(frame, ts)
+                    ring.add_stats(prefilter_ns=time.perf_counter_ns() - t0)
+                    if decision == SKIP:
+                        last_seq[camera_id] = seq
+                        ring.add_stats(filtered=1, dropped=skipped)
+                        continue
+
+                t0 = time.perf_counter_ns()
+                if submit is not None:
+                    # submit() 返回前已经把画面拷进推理引擎，此时检查这帧是否完整即可
+                    future = submit(camera_id, frame)
+                    if ring.is_current(seq):
+                        last_seq[camera_id] = seq
+                        submitted.append((camera_id, ring, seq, ts, skipped, t0, future))
+                    else:
+                        future.cancel()
+                    continue
+
+                detections = detect(frame)
+                ring.add_stats(detect_ns=time.perf_counter_ns() - t0)
+                if not ring.is_current(seq):
+                    # 检测期间这帧被覆盖了 (画面可能不完整)，丢弃结果
+                    continue
+                last_seq[camera_id] = seq
+                _publish(results, ring, camera_id, seq, ts, detections, skipped, logger)
+
+            for camera_id, ring, seq, ts, skipped, t0, future in submitted:
+                try:
+                    detections = future.result()
+                except Exception as e:
+                    logger.error("❌ %s#%s 推理失败: %r", camera_id, seq, e)
+                    continue
+                ring.add_stats(detect_ns=time.perf_counter_ns() - t0)
+                _publish(results, ring, camera_id, seq, ts, detections, skipped, logger)
+            if not busy:
+                time.sleep(IDLE_SLEEP)
+    finally:
+        # 退出时不等队列里剩余的结果发完，避免主进程 join 时卡住
+        results.cancel_join_thread()
+        if submit is not None:
+            detect.stop()
+        for ring in rings.values():
+            ring.close()
+
+
+class MultiCameraCapture:
+    """
+    多摄像头采集 + 检测进程池
+    - 每路视频一个解码进程，画面写进各自的共享内存环形缓冲区 (FrameRing)
+    - 检测进程池直接读共享内存里的最新帧，检测跟不上时旧帧自动丢弃，永远检测最新画面
+    - 进程之间只传检测框，不传画面；多核 CPU 上吞吐随进程数扩展，不受 GIL 限制
+
+    用法:
+        with MultiCameraCapture({"cam0": 0, "cam1": "rtsp://..."}, make_detector) as capture:
+            for result in capture.results():
+                ...
+
+    CPU 上推荐 MultiCameraCapture(sources, inference.create_engine, workers=1)：
+    一个检测进程持有一个模型，所有摄像头的新帧组成微批推理 (见 inference.py)
+    """
+
+    def __init__(self, sources, detector_factory, frame_shape=DEFAULT_FRAME_SHAPE, slots=DEFAULT_SLOTS,
+                 workers=None, start_method="spawn", max_results=1024, prefilter=None):
+        """
+        :param sources: {摄像头 ID: 摄像头序号 / RTSP 地址 / 视频文件 / SyntheticSource}
+        :param detector_factory: 可 pickle 的无参函数，在每个检测进程里创建一次检测器
+        :param workers: 检测进程数，默认 min(摄像头数, CPU 核数)
+        :param start_method: 默认 spawn：主进程里有日志、定时器等线程，fork 出来的子进程可能死锁
+        :param prefilter: 可选，PrefilterConfig：帧差 + 火焰色预筛选，静止画面不送去检测 (见 prefilter.py)
+        """
+        self.logger = setup_logger("Capture")
+        self.sources = dict(sources)
+        self.detector_factory = detector_factory
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        self.workers = workers or max(1, min(len(self.sources), os.cpu_count() or 1))
+        self.prefilter = prefilter
+        self._ctx = mp.get_context(start_method)
+        self._results = self._ctx.Queue(maxsize=max_results)
+        self._stop = self._ctx.Event()
+        self.rings = {}
+        self._processes = []
+
+    def start(self):
+        for camera_id in self.sources:
+            self.rings[camera_id] = FrameRing.create(self.frame_shape, self.slots)
+
+        for camera_id, source in self.sources.items():
+            proc = self._ctx.Process(target=_capture_main, name=f"capture-{camera_id}", daemon=True,
+                                     args=(camera_id, source, self.rings[camera_id].name, self.frame_shape,
+                                           self.slots, self._stop))
+            proc.start()
+            self._processes.append(proc)
+
+        # 摄像头轮流分给各检测进程
+        assignments = [[] for _ in range(self.workers)]
+        for i, camera_id in enumerate(self.sources):
+            assignments[i % self.workers].append((camera_id, self.rings[camera_id].name, self.frame_shape,
+                                                  self.slots))
+        for worker_id, cameras in enumerate(assignments):
+            if not cameras:
+                continue
+            proc = self._ctx.Process(target=_detector_main, name=f"detector-{worker_id}", daemon=True,
+                                     args=(worker_id, cameras, self.detector_factory, self._results, self._stop,
+                                           self.prefilter))
+            proc.start()
+            self._processes.append(proc)
+
+        self.logger.info("🎥 已启动 %d 路采集、%d 个检测进程", len(self.sources), self.workers)
+        return self
+
+    def get(self, timeout=None):
+        """取一条检测结果，超时返回 None"""
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def results(self, timeout=1.0):
+        """持续产出检测结果，直到 stop()"""
+        while not self._stop.is_set():
+            result = self.get(timeout)
+            if result is not None:
+                yield result
+
+    def frames_written(self):
+        """每个摄像头已写入的帧数"""
+        return {camera_id: ring.write_seq for camera_id, ring in self.rings.items()}
+
+    def stats(self):
+        """
+        每个摄像头的处理统计 (直接读共享内存里的计数器)
+        - inferred / filtered / dropped: 检测的帧、被预筛选跳过的帧、检测跟不上而丢掉的帧
+        - skip_rate: 预筛选跳过的比例；*_us: 每帧各阶段平均耗时 (微秒)
+        """
+        report = {}
+        for camera_id, ring in self.rings.items():
+            s = ring.stats()
+            examined = s["inferred"] + s["filtered"]
+            report[camera_id] = {
+                "written": s["write_seq"],
+                "inferred": s["inferred"],
+                "filtered": s["filtered"],
+                "dropped": s["dropped"],
+                "skip_rate": round(s["filtered"] / examined, 4) if examined else 0.0,
+                "prefilter_us": round(s["prefilter_ns"] / examined / 1000, 2) if examined else None,
+                "detect_us": round(s["detect_ns"] / s["inferred"] / 1000, 2) if s["inferred"] else None,
+            }
+        return report
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        for proc in self._processes:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        self._processes = []
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
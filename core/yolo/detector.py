@@ -0,0 +1,284 @@
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+import config
+from utils.logger import setup_logger
+
+try:
+    import cv2
+except ImportError:  # 没有 OpenCV 时用 NumPy 最近邻缩放
+    cv2 = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+# 模型输出的类别
+CLASS_NAMES = ("fire", "smoke")
+# 检测结果每一行: x1, y1, x2, y2, 置信度, 类别 (原图坐标)
+DETECTION_COLUMNS = ("x1", "y1", "x2", "y2", "conf", "cls")
+# 类别感知 NMS 时按类别平移框的距离 (大于任何画面尺寸即可)
+_CLASS_OFFSET = 4096.0
+# 填充色 (YOLO 训练时的 letterbox 灰边)
+_PAD_VALUE = 114
+
+
+def default_threads(engines=1):
+    """每个推理引擎的 intra-op 线程数：本进程可用的核平均分给 engines 个引擎 (线程数超过核数只会互相抢占)"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # Windows / macOS
+        cores = os.cpu_count() or 1
+    return max(1, cores // engines)
+
+
+def tune_threads(factory, batch, candidates=None, repeat=5):
+    """
+    实测选出最快的 intra-op 线程数 (启动时跑一次，几秒钟)
+    :param factory: factory(threads) -> 推理后端
+    :param batch: 用于测速的输入 (B, 3, H, W) float32
+    :return: (最快的线程数, {线程数: 每批平均耗时 (秒)})
+    """
+    cores = default_threads()
+    candidates = candidates or sorted({1, 2, 4, max(1, cores // 2), cores} & set(range(1, cores + 1)))
+    timings = {}
+    for threads in candidates:
+        backend = factory(threads)
+        backend(batch)  # 预热
+        begin = time.perf_counter()
+        for _ in range(repeat):
+            backend(batch)
+        timings[threads] = (time.perf_counter() - begin) / repeat
+    return min(timings, key=timings.get), timings
+
+
+# ---------------- 前处理 / 后处理 ----------------
+
+class Letterbox:
+    """
+    等比缩放 + 灰边填充到 imgsz x imgsz (与 YOLO 训练时一致)
+    同一尺寸的画面复用缩放参数和采样下标，每帧只做一次拷贝
+    """
+
+    def __init__(self, imgsz=640):
+        self.imgsz = imgsz
+        self._plans = {}   # (h, w) -> (scale, top, left, nh, nw, rows, cols)
+
+    def plan(self, h, w):
+        plan = self._plans.get((h, w))
+        if plan is None:
+            scale = min(self.imgsz / h, self.imgsz / w)
+            nh, nw = round(h * scale), round(w * scale)
+            top, left = (self.imgsz - nh) // 2, (self.imgsz - nw) // 2
+            rows = np.minimum((np.arange(nh) + 0.5) / scale, h - 1).astype(np.intp)
+            cols = np.minimum((np.arange(nw) + 0.5) / scale, w - 1).astype(np.intp)
+            plan = self._plans[(h, w)] = (scale, top, left, nh, nw, rows, cols)
+        return plan
+
+    def __call__(self, frame, out=None):
+        """
+        :param frame: BGR 画面 (H, W, 3) uint8 (可以是共享内存视图，只读)
+        :param out: 可选，(imgsz, imgsz, 3) uint8 输出缓冲区
+        :return: (缩放后的画面, (scale, top, left))，用于把检测框换算回原图
+        """
+        h, w = frame.shape[:2]
+        scale, top, left, nh, nw, rows, cols = self.plan(h, w)
+        if out is None:
+            out = np.empty((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        out[:top] = _PAD_VALUE
+        out[top + nh:] = _PAD_VALUE
+        out[top:top + nh, :left] = _PAD_VALUE
+        out[top:top + nh, left + nw:] = _PAD_VALUE
+        target = out[top:top + nh, left:left + nw]
+        if cv2 is not None:
+            cv2.resize(frame, (nw, nh), dst=target, interpolation=cv2.INTER_LINEAR)
+        else:
+            np.take(frame.take(rows, axis=0), cols, axis=1, out=target)
+        return out, (scale, top, left)
+
+
+def to_tensor(images, out=None):
+    """
+    (B, H, W, 3) BGR uint8 -> (B, 3, H, W) RGB float32 / 255，一次向量化完成
+    :param out: 可选，预分配的输出缓冲区 (批次大小可以比它小，只写前 B 个)
+    """
+    n = len(images)
+    if out is None:
+        out = np.empty((n, 3) + images.shape[1:3], dtype=np.float32)
+    out = out[:n]
+    np.multiply(images[..., ::-1].transpose(0, 3, 1, 2), np.float32(1 / 255), out=out)
+    return out
+
+
+def nms(boxes, scores, iou_threshold):
+    """贪心 NMS (向量化计算 IoU)，返回保留的下标 (按分数降序)"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
+
+
+def decode(pred, meta, frame_shape, conf=0.25, iou=0.45, max_det=100):
+    """
+    解析单张图的 YOLOv8 输出
+    :param pred: (4 + 类别数, 候选数)，前 4 行为中心点 x, y 和宽高 (letterbox 坐标)
+    :param meta: Letterbox 返回的 (scale, top, left)
+    :param frame_shape: 原图尺寸，用于裁剪越界的框
+    :return: (N, 6) float32，列见 DETECTION_COLUMNS
+    """
+    scores_all = pred[4:]
+    cls = scores_all.argmax(axis=0)
+    scores = scores_all[cls, np.arange(scores_all.shape[1])]
+    mask = scores > conf
+    if not mask.any():
+        return np.empty((0, 6), dtype=np.float32)
+    cx, cy, w, h = pred[:4, mask]
+    scores, cls = scores[mask], cls[mask]
+    boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+
+    keep = nms(boxes + (cls * _CLASS_OFFSET)[:, None], scores, iou)[:max_det]
+    scale, top, left = meta
+    boxes = (boxes[keep] - (left, top, left, top)) / scale
+    fh, fw = frame_shape[:2]
+    np.clip(boxes, 0, (fw, fh, fw, fh), out=boxes)
+    return np.column_stack((boxes, scores[keep], cls[keep])).astype(np.float32)
+
+
+# ---------------- 推理后端 ----------------
+
+class OnnxBackend:
+    """ONNX Runtime (CPU)：固定 intra-op 线程数，关闭 inter-op 并行 (单个图内没有可并行的分支)"""
+
+    def __init__(self, path, threads=None):
+        if ort is None:
+            raise RuntimeError("需要安装 onnxruntime 才能加载 ONNX 模型")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or default_threads()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.path = str(path)
+        self.threads = options.intra_op_num_threads
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # 导出时没有加 dynamic=True 的模型批大小是固定的 (维度为整数)
+        self.batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TorchScriptBackend:
+    """TorchScript (CPU)"""
+
+    batch_size = None
+
+    def __init__(self, path, threads=None):
+        if torch is None:
+            raise RuntimeError("需要安装 torch 才能加载 TorchScript 模型")
+        self.path = str(path)
+        self.threads = threads or default_threads()
+        torch.set_num_threads(self.threads)
+        self.model = torch.jit.load(self.path, map_location="cpu").eval()
+
+    def __call__(self, batch):
+        with torch.inference_mode():
+            out = self.model(torch.from_numpy(batch))
+        if isinstance(out, (tuple, list)):
+            out = out[0]
+        return out.numpy()
+
+
+def quantize_int8(onnx_path, int8_path=None):
+    """
+    生成 INT8 动态量化版本 (权重 INT8，激活运行时量化)，已存在且比原模型新时直接复用
+    :return: INT8 模型路径
+    """
+    onnx_path = Path(onnx_path)
+    int8_path = Path(int8_path) if int8_path else onnx_path.with_suffix(".int8.onnx")
+    if int8_path.exists() and int8_path.stat().st_mtime >= onnx_path.stat().st_mtime:
+        return int8_path
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        raise RuntimeError("需要安装 onnxruntime 才能生成 INT8 模型")
+    quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def resolve_model(weights):
+    """
+    找到可以直接在 CPU 上推理的导出模型
+    weights/best.pt 是训练得到的 PyTorch 权重，不能直接加载；
+    先用 `yolo export model=weights/best.pt format=onnx` (或 format=torchscript) 导出到同一目录
+    """
+    weights = Path(weights)
+    if weights.suffix in (".onnx", ".torchscript"):
+        candidates = [weights]
+    else:
+        candidates = [weights.with_suffix(".onnx"), weights.with_suffix(".torchscript")]
+    for path in candidates:
+        if path.exists():
+            return path
+    raise FileNotFoundError(f"找不到导出的模型 {' / '.join(map(str, candidates))}，"
+                            f"请先运行: yolo export model={weights} format=onnx")
+
+
+def load_backend(weights, threads=None, int8=False):
+    """
+    按文件类型加载推理后端
+    :param int8: 使用 INT8 量化模型 (只支持 ONNX；精度略降，CPU 上通常快 1.5 ~ 2 倍)
+    """
+    path = resolve_model(weights)
+    if path.suffix == ".onnx":
+        if int8:
+            path = quantize_int8(path)
+        return OnnxBackend(path, threads)
+    if int8:
+        raise ValueError("INT8 量化只支持 ONNX 模型")
+    return TorchScriptBackend(path, threads)
+
+
+class FireDetector:
+    """
+    单帧检测器 (不做批处理)：detect(frame) -> (N, 6) 检测框
+    可直接作为 MultiCameraCapture 的检测器；多路摄像头共用一个模型时用 BatchInferenceEngine
+    """
+
+    def __init__(self, backend=None, imgsz=None, conf=None, iou=None):
+        cfg = config.DETECTOR
+        self.logger = setup_logger("Detector")
+        self.backend = backend or load_backend(config.PROJECT_ROOT / cfg["weights"], cfg["intra_op_threads"],
+                                               cfg["int8"])
+        self.letterbox = Letterbox(imgsz or cfg["imgsz"])
+        self.conf = cfg["conf"] if conf is None else conf
+        self.iou = cfg["iou"] if iou is None else iou
+        self._image = np.empty((1, self.letterbox.imgsz, self.letterbox.imgsz, 3), dtype=np.uint8)
+        self._tensor = to_tensor(self._image)
+
+    def detect(self, frame):
+        _, meta = self.letterbox(frame, out=self._image[0])
+        pred = self.backend(to_tensor(self._image, out=self._tensor))
+        return decode(pred[0], meta, frame.shape, self.conf, self.iou)
+
+    __call__ = detect
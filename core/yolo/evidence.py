@@ -0,0 +1,426 @@
+import io
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+
+import config
+from utils import metrics
+from utils.logger import setup_logger
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# 写盘任务的优先级：触发帧截图最先 (通知要用)，录像 / 缩略图其次，停止标记最后
+PRIORITY_SNAPSHOT = 0
+PRIORITY_CLIP = 1
+_PRIORITY_STOP = 9
+
+
+def encode_jpeg(frame, quality=90):
+    """BGR 画面 -> JPEG 字节 (优先用 OpenCV，其次 Pillow)"""
+    if cv2 is not None:
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise RuntimeError("JPEG 编码失败")
+        return buf.tobytes()
+    if Image is not None:
+        out = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(frame[..., ::-1])).save(out, format="JPEG", quality=quality)
+        return out.getvalue()
+    raise RuntimeError("需要安装 opencv-python 或 Pillow 才能保存 JPEG")
+
+
+def thumbnail_strip(frames, count=6, height=120):
+    """从一组画面里均匀取 count 帧，按步长缩小后横向拼成一张图"""
+    picks = frames[np.linspace(0, len(frames) - 1, min(count, len(frames))).round().astype(np.intp)]
+    step = max(1, picks.shape[1] // height)
+    return np.concatenate(list(picks[:, ::step, ::step]), axis=1)
+
+
+class FrameHistory:
+    """
+    单个摄像头最近一段时间的画面 (预分配的定长数组，循环覆盖，不分配内存)
+    单写多读：写入方为采集 / 检测线程，读取方 (写盘线程) 拷贝后用序号确认画面没有被覆盖
+    """
+
+    def __init__(self, shape, capacity):
+        self.shape = tuple(shape)
+        self.capacity = capacity
+        self.frames = np.empty((capacity,) + self.shape, dtype=np.uint8)
+        self.seqs = np.full(capacity, -1, dtype=np.int64)
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+
+    def push(self, frame, seq, ts):
+        i = self.count % self.capacity
+        self.seqs[i] = -1
+        np.copyto(self.frames[i], frame)
+        self.ts[i] = ts
+        self.seqs[i] = seq
+        self.count += 1
+
+    def invalidate(self, seq):
+        """作废一帧 (写入方发现拷贝来源在拷贝期间被覆盖时调用)"""
+        self.seqs[self.seqs == seq] = -1
+
+    @property
+    def latest_ts(self):
+        return float(self.ts[(self.count - 1) % self.capacity]) if self.count else None
+
+    def snapshot(self, seq=None):
+        """
+        拷贝一帧：指定序号的那帧，找不到时取它之前最近的一帧 (没有则取最新帧)
+        :return: (画面, 序号, 时间戳) 或 None
+        """
+        seqs = self.seqs.copy()
+        valid = seqs >= 0
+        if not valid.any():
+            return None
+        candidates = valid if seq is None else valid & (seqs <= seq)
+        if not candidates.any():
+            candidates = valid
+        i = int(np.flatnonzero(candidates)[seqs[candidates].argmax()])
+        frame = self.frames[i].copy()
+        if self.seqs[i] != seqs[i]:
+            return None
+        return frame, int(seqs[i]), float(self.ts[i])
+
+    def window(self, start, end):
+        """拷贝时间戳在 [start, end] 之间的画面 (按序号排序)，拷贝期间被覆盖的帧丢弃"""
+        seqs = self.seqs.copy()
+        ts = self.ts.copy()
+        idx = np.flatnonzero((seqs >= 0) & (ts >= start) & (ts <= end))
+        idx = idx[np.argsort(seqs[idx])]
+        frames = self.frames[idx]
+        intact = self.seqs[idx] == seqs[idx]
+        return frames[intact], ts[idx][intact]
+
+
+class RetentionPolicy:
+    """
+    证据目录的保留策略：超过 max_age_days 的文件删除，总大小超过 max_bytes 时从最旧的开始删
+    """
+
+    __slots__ = ("max_bytes", "max_age_days")
+
+    def __init__(self, max_bytes=2 * 1024 ** 3, max_age_days=30):
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+
+    def apply(self, directory, now=None):
+        """:return: 删除的文件数"""
+        now = time.time() if now is None else now
+        files = []
+        for path in Path(directory).rglob("*"):
+            try:
+                if path.is_file():
+                    stat = path.stat()
+                    files.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                continue
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        cutoff = now - self.max_age_days * 86400 if self.max_age_days else None
+        removed = 0
+        for mtime, size, path in files:
+            if total <= self.max_bytes and (cutoff is None or mtime >= cutoff):
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        # 录像帧目录删空后一起删掉
+        for path in sorted(Path(directory).glob("*/"), reverse=True):
+            if path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+        return removed
+
+
+class _Evidence:
+    """一次报警的取证任务"""
+
+    __slots__ = ("camera_id", "seq", "ts", "stem", "snapshot", "image_path", "clip_path", "strip_path")
+
+    def __init__(self, camera_id, seq, ts, stem):
+        self.camera_id = camera_id
+        self.seq = seq
+        self.ts = ts
+        self.stem = stem
+        self.snapshot = None
+        self.image_path = None
+        self.clip_path = None
+        self.strip_path = None
+
+
+class EvidenceRecorder:
+    """
+    报警取证 (output/captured_imgs)
+    - 每个摄像头一个 FrameHistory，按 fps 采样保存最近 pre_seconds + post_seconds 的画面
+    - trigger() 只拷贝一帧、放进写盘队列就返回，检测循环不会等磁盘或编码
+    - 后台写盘线程：先把触发帧编码成 JPEG (Future 马上拿到路径，交给通知层)，
+      等事后画面录满后再写前后几秒的录像和一张缩略图条，最后按保留策略清理目录
+
+    用法:
+        recorder = EvidenceRecorder().start()
+        recorder.tap(capture)   # 从 MultiCameraCapture 的共享内存里采样画面
+        gate = AlarmGate(lambda e: recorder.trigger(e.camera_id, e.seq, e.ts,
+                                                    on_alarm=lambda path: dispatcher.submit(e.camera_id, path)))
+    取证失败 (没有画面、没有 JPEG 编码器、磁盘写不进) 不会拦住报警：on_alarm 照常调用，path 为 None
+    """
+
+    def __init__(self, directory=None, pre_seconds=None, post_seconds=None, fps=None, retention=None,
+                 encoder=encode_jpeg, quality=90):
+        """
+        :param directory: 证据目录，默认 config.EVIDENCE["directory"]
+        :param fps: 历史画面的采样帧率 (决定录像流畅度和内存占用)
+        :param retention: RetentionPolicy，默认按 config.EVIDENCE 配置
+        :param encoder: encoder(frame, quality) -> JPEG 字节
+        """
+        cfg = config.EVIDENCE
+        self.logger = setup_logger("Evidence")
+        self.directory = Path(directory or config.PROJECT_ROOT / cfg["directory"])
+        self.pre_seconds = cfg["pre_seconds"] if pre_seconds is None else pre_seconds
+        self.post_seconds = cfg["post_seconds"] if post_seconds is None else post_seconds
+        self.fps = fps or cfg["fps"]
+        self.retention = retention or RetentionPolicy(cfg["max_bytes"], cfg["max_age_days"])
+        self.encoder = encoder
+        self.quality = quality
+
+        self.histories = {}
+        self._last_push = {}
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._waiting = []       # 等事后画面录满的 _Evidence
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._taps = []
+        # 统计
+        self.snapshots = 0
+        self.clips = 0
+        self.removed = 0
+
+    def start(self):
+        if self.encoder is encode_jpeg and cv2 is None and Image is None:
+            self.logger.warning("⚠️ 没有安装 opencv-python 或 Pillow，报警截图无法保存 (报警照常发出，但不带图片)")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """停止采样和写盘 (已触发的截图和录像会先写完)"""
+        self._stop.set()
+        for t in self._taps:
+            t.join(timeout)
+        self._queue.put((_PRIORITY_STOP, next(self._order), None, None))
+        if self._thread:
+            self._thread.join(timeout)
+
+    # ---------------- 采样 (采集 / 检测线程) ----------------
+
+    def add_camera(self, camera_id, shape):
+        capacity = int((self.pre_seconds + self.post_seconds) * self.fps) + 2
+        self.histories[camera_id] = FrameHistory(shape, max(capacity, 2))
+        self._last_push[camera_id] = 0.0
+
+    def push(self, camera_id, frame, seq, ts=None):
+        """
+        送入一帧 (按 fps 采样，间隔不到的帧直接忽略)
+        :return: 是否保存了这一帧
+        """
+        ts = time.time() if ts is None else ts
+        history = self.histories.get(camera_id)
+        if history is None:
+            self.add_camera(camera_id, frame.shape)
+            history = self.histories[camera_id]
+        if ts - self._last_push[camera_id] < 1 / self.fps - 1e-6:
+            return False
+        history.push(frame, seq, ts)
+        self._last_push[camera_id] = ts
+        return True
+
+    def tap(self, capture, interval=None):
+        """
+        后台线程按 fps 从 MultiCameraCapture 的共享内存缓冲区采样画面
+        注意先 recorder.stop() 再停止 capture (共享内存释放后不能再读)
+        """
+        thread = threading.Thread(target=self._tap_loop, args=(capture, interval or 1 / self.fps / 2),
+                                  name="evidence-tap", daemon=True)
+        thread.start()
+        self._taps.append(thread)
+        return thread
+
+    def _tap_loop(self, capture, interval):
+        last = {}
+        while not self._stop.wait(interval):
+            for camera_id, ring in list(capture.rings.items()):
+                latest = ring.latest(last.get(camera_id, 0))
+                if latest is None:
+                    continue
+                seq, ts, frame = latest
+                if self.push(camera_id, frame, seq, ts) and not ring.is_current(seq):
+                    # 拷贝期间共享内存里的这帧被覆盖了 (画面可能不完整)
+                    self.histories[camera_id].invalidate(seq)
+                last[camera_id] = seq
+
+    # ---------------- 触发 ----------------
+
+    def trigger(self, camera_id, seq=None, ts=None, frame=None, on_alarm=None):
+        """
+        报警触发：立即返回，截图在后台写盘
+        :param seq: 触发帧序号 (历史里没有这一帧时取它之前最近的一帧)
+        :param frame: 可选，直接给出触发画面 (会拷贝)
+        :param on_alarm: 可选，截图有结果后一定会调用一次，参数为截图路径；截图失败时为 None
+                         (取证不能拦住报警)。截图成功时在写盘线程里执行，应当立即返回
+        :return: Future，结果为截图路径 (失败时为对应的异常)
+        """
+        future = Future()
+        if on_alarm is not None:
+            future.add_done_callback(lambda f: self._notify(on_alarm, camera_id, f))
+        if self._thread is None or not self._thread.is_alive():
+            future.set_exception(RuntimeError("取证写盘线程没有运行"))
+            return future
+        if frame is not None:
+            snapshot = (frame.copy(), seq, time.time() if ts is None else ts)
+        else:
+            history = self.histories.get(camera_id)
+            snapshot = history.snapshot(seq) if history is not None else None
+        if snapshot is None:
+            future.set_exception(LookupError(f"摄像头 {camera_id} 没有可用的画面"))
+            return future
+
+        image, seq, frame_ts = snapshot
+        ts = frame_ts if ts is None else ts
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(ts))
+        evidence = _Evidence(camera_id, seq, ts, f"{camera_id}_{stamp}_{seq}")
+        evidence.snapshot = image
+        self._queue.put((PRIORITY_SNAPSHOT, next(self._order), evidence, future))
+        metrics.inc("evidence_triggers_total", camera=camera_id)
+        return future
+
+    def _notify(self, on_alarm, camera_id, future):
+        error = future.exception()
+        if error is not None:
+            self.logger.error("❌ 摄像头 %s 报警截图失败 (%r)，报警不带图片继续发出", camera_id, error)
+        try:
+            on_alarm(None if error is not None else future.result())
+        except Exception:
+            self.logger.exception("报警回调异常: %s", camera_id)
+
+    # ---------------- 写盘线程 ----------------
+
+    def _run(self):
+        while True:
+            try:
+                _, _, evidence, future = self._queue.get(timeout=0.1 if self._waiting else None)
+            except queue.Empty:
+                self._flush_waiting()
+                continue
+            if evidence is None:
+                # 停止：还在等事后画面的也马上写，写完队列里剩下的任务再退出
+                self._flush_waiting(force=True)
+                while not self._queue.empty():
+                    _, _, evidence, future = self._queue.get_nowait()
+                    self._handle(evidence, future)
+                return
+            self._handle(evidence, future)
+            self._flush_waiting()
+
+    def _handle(self, evidence, future):
+        if evidence is None:
+            return
+        if future is not None:
+            self._write_snapshot(evidence, future)
+        else:
+            self._write_clip(evidence)
+
+    def _write_snapshot(self, evidence, future):
+        try:
+            path = self.directory / f"{evidence.stem}.jpg"
+            with metrics.span("evidence_write", kind="snapshot"):
+                path.write_bytes(self.encoder(evidence.snapshot, self.quality))
+            evidence.image_path = str(path)
+            self.snapshots += 1
+        except Exception as e:
+            self.logger.error("❌ 截图保存失败 %s: %r", evidence.stem, e)
+            future.set_exception(e)
+            return
+        self.logger.info("📸 已保存报警截图: %s", path)
+        future.set_result(evidence.image_path)
+        with self._lock:
+            self._waiting.append(evidence)
+
+    def _flush_waiting(self, force=False):
+        """事后画面录满 (或摄像头断流超过时限) 的取证任务排进录像队列"""
+        now = time.time()
+        ready = []
+        with self._lock:
+            for evidence in list(self._waiting):
+                end = evidence.ts + self.post_seconds
+                latest = self.histories[evidence.camera_id].latest_ts if evidence.camera_id in self.histories else None
+                if force or (latest is not None and latest >= end) or now >= end + 1:
+                    self._waiting.remove(evidence)
+                    ready.append(evidence)
+        for evidence in ready:
+            self._queue.put((PRIORITY_CLIP, next(self._order), evidence, None))
+
+    def _write_clip(self, evidence):
+        history = self.histories.get(evidence.camera_id)
+        if history is None:
+            return
+        frames, _ = history.window(evidence.ts - self.pre_seconds, evidence.ts + self.post_seconds)
+        if not len(frames):
+            frames = evidence.snapshot[None]
+        try:
+            with metrics.span("evidence_write", kind="clip"):
+                evidence.clip_path = str(self._save_clip(evidence.stem, frames))
+                strip = self.directory / f"{evidence.stem}_strip.jpg"
+                strip.write_bytes(self.encoder(thumbnail_strip(frames), self.quality))
+                evidence.strip_path = str(strip)
+            self.clips += 1
+            self.logger.info("🎞️ 已保存报警录像 (%d 帧): %s", len(frames), evidence.clip_path)
+        except Exception as e:
+            self.logger.error("❌ 录像保存失败 %s: %r", evidence.stem, e)
+        removed = self.retention.apply(self.directory)
+        if removed:
+            self.removed += removed
+            self.logger.info("🧹 证据目录超出保留策略，已删除 %d 个旧文件", removed)
+
+    def _save_clip(self, stem, frames):
+        """有 OpenCV 时写 MP4；没有时写成一个目录下按顺序编号的 JPEG"""
+        if cv2 is not None:
+            path = self.directory / f"{stem}_clip.mp4"
+            h, w = frames.shape[1:3]
+            writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (w, h))
+            try:
+                for frame in frames:
+                    writer.write(frame)
+            finally:
+                writer.release()
+            return path
+        path = self.directory / f"{stem}_clip"
+        path.mkdir(exist_ok=True)
+        for i, frame in enumerate(frames):
+            (path / f"{i:04d}.jpg").write_bytes(self.encoder(frame, self.quality))
+        return path
+
+    def stats(self):
+        with self._lock:
+            waiting = len(self._waiting)
+        return {"snapshots": self.snapshots, "clips": self.clips, "waiting": waiting,
+                "queued": self._queue.qsize(), "removed": self.removed}
@@ -0,0 +1,155 @@
+import time
+
+import numpy as np
+
+# 判定结果 (为什么送去 / 不送去检测)
+SKIP = "skip"
+MOTION = "motion"
+COLOR = "color"
+FORCED = "forced"
+FIRST = "first"
+
+
+class PrefilterConfig:
+    """
+    预筛选参数 (可 pickle，传给检测进程后每个摄像头各建一个 FramePrefilter)
+    :param stride: 降采样步长，640x480 的画面按 8 取样后只剩 80x60 个像素
+    :param motion_k: 运动分数超过 "背景噪声均值 + k 倍标准差" 才算有变化
+    :param motion_min: 运动分数的绝对下限 (灰度平均差)，避免完全静止的画面因噪声极小而过于敏感
+    :param fire_ratio_min: 火焰色像素占比的绝对下限
+    :param fire_ratio_delta: 火焰色占比比背景基线高出多少才算异常
+    :param force_interval: 最多隔多少秒必须检测一次 (兜底，防止缓慢蔓延的火被漏掉)
+    :param alpha: 背景统计的更新速度 (指数移动平均系数)
+    """
+
+    __slots__ = ("stride", "motion_k", "motion_min", "fire_ratio_min", "fire_ratio_delta", "force_interval",
+                 "alpha", "hue_max", "sat_min", "val_min")
+
+    def __init__(self, stride=8, motion_k=4.0, motion_min=2.0, fire_ratio_min=0.002, fire_ratio_delta=0.002,
+                 force_interval=5.0, alpha=0.05, hue_max=60, sat_min=0.35, val_min=150):
+        self.stride = stride
+        self.motion_k = motion_k
+        self.motion_min = motion_min
+        self.fire_ratio_min = fire_ratio_min
+        self.fire_ratio_delta = fire_ratio_delta
+        self.force_interval = force_interval
+        self.alpha = alpha
+        # 火焰色 (HSV)：色相 0 ~ hue_max 度 (红 -> 黄)，饱和度 >= sat_min，亮度 >= val_min
+        self.hue_max = hue_max
+        self.sat_min = sat_min
+        self.val_min = val_min
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+def flame_ratio(small, hue_max=60, sat_min=0.35, val_min=150):
+    """
+    火焰色像素占比 (BGR 画面，NumPy 向量化，不依赖 OpenCV)
+    只需要判断色相是否落在红 -> 黄区间，不用算完整的 HSV：
+    最大分量是 R 且 G >= B 时，色相 = 60 * (G - B) / (max - min)
+    """
+    small = small.astype(np.int16, copy=False)
+    b, g, r = small[..., 0], small[..., 1], small[..., 2]
+    mn = np.minimum(np.minimum(b, g), r)
+    chroma = r - mn
+    mask = (r >= g) & (g >= b) & (r >= val_min) & (chroma > 0)
+    # 饱和度 = chroma / max；色相 <= hue_max  <=>  (G - B) * 60 <= hue_max * chroma
+    mask &= chroma >= sat_min * r
+    mask &= (g - b) * 60 <= hue_max * chroma
+    return float(np.count_nonzero(mask)) / mask.size
+
+
+class FramePrefilter:
+    """
+    模型前的廉价预筛选 (单个摄像头)
+    - 降采样后做帧差 (运动) + 火焰色像素占比，两者都用自适应阈值 (跟随背景噪声 / 基线变化)
+    - 任一超过阈值才送去完整检测；另外每隔 force_interval 秒强制检测一次
+    - 实验室画面绝大部分时间是静止的，大部分帧在这里就被跳过
+    """
+
+    def __init__(self, config=None):
+        self.config = config or PrefilterConfig()
+        self._prev = None
+        self._motion_mean = 0.0
+        self._motion_var = 0.0
+        self._ratio_base = 0.0
+        self._last_inference = 0.0
+        # 统计
+        self.frames = 0
+        self.decisions = dict.fromkeys((SKIP, MOTION, COLOR, FORCED, FIRST), 0)
+        self.cost_ns = {"downscale": 0, "motion": 0, "color": 0}
+
+    def check(self, frame, now=None):
+        """
+        :param frame: BGR 画面 (H, W, 3) uint8，可以是共享内存里的视图 (不会被修改)
+        :return: 判定结果 (SKIP 表示不需要检测，其他值为送检原因)
+        """
+        cfg = self.config
+        now = time.time() if now is None else now
+        t0 = time.perf_counter_ns()
+
+        # 1. 降采样 (先按步长取出一份连续的小图，后面的运算都在小图上做)；灰度 = (B + 2G + R) / 4
+        small = np.ascontiguousarray(frame[::cfg.stride, ::cfg.stride]).astype(np.int16)
+        gray = small[..., 0] + 2 * small[..., 1] + small[..., 2]
+        t1 = time.perf_counter_ns()
+
+        # 2. 帧差
+        decision = SKIP
+        if self._prev is None:
+            decision = FIRST
+            motion = 0.0
+        else:
+            motion = float(np.abs(gray - self._prev).mean()) / 4
+            threshold = max(cfg.motion_min, self._motion_mean + cfg.motion_k * self._motion_var ** 0.5)
+            if motion > threshold:
+                decision = MOTION
+        self._prev = gray
+        t2 = time.perf_counter_ns()
+
+        # 3. 火焰色占比
+        ratio = flame_ratio(small, cfg.hue_max, cfg.sat_min, cfg.val_min)
+        if decision == SKIP and ratio >= cfg.fire_ratio_min and ratio > self._ratio_base + cfg.fire_ratio_delta:
+            decision = COLOR
+        t3 = time.perf_counter_ns()
+
+        if decision == SKIP and now - self._last_inference >= cfg.force_interval:
+            decision = FORCED
+
+        # 4. 更新背景统计：正常帧按 alpha 跟随；异常帧只以 1/10 的速度跟随，
+        #    持续异常 (真实火情) 时阈值不会很快被拉高，但画面里本来就有的橙色物体最终会被当作背景
+        a = cfg.alpha if decision in (SKIP, FORCED, FIRST) else cfg.alpha / 10
+        if decision == FIRST:
+            self._ratio_base = ratio
+        else:
+            delta = motion - self._motion_mean
+            self._motion_mean += a * delta
+            self._motion_var = (1 - a) * (self._motion_var + a * delta * delta)
+            self._ratio_base += a * (ratio - self._ratio_base)
+
+        if decision != SKIP:
+            self._last_inference = now
+        self.frames += 1
+        self.decisions[decision] += 1
+        self.cost_ns["downscale"] += t1 - t0
+        self.cost_ns["motion"] += t2 - t1
+        self.cost_ns["color"] += t3 - t2
+        return decision
+
+    @property
+    def skip_rate(self):
+        return self.decisions[SKIP] / self.frames if self.frames else 0.0
+
+    def stats(self):
+        """跳过率、各送检原因的帧数、每个阶段的平均耗时 (微秒)"""
+        n = self.frames or 1
+        return {
+            "frames": self.frames,
+            "skip_rate": round(self.skip_rate, 4),
+            "decisions": dict(self.decisions),
+            "cost_us": {stage: round(ns / n / 1000, 2) for stage, ns in self.cost_ns.items()},
+        }
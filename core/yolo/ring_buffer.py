@@ -0,0 +1,133 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 每块数据按 64 字节 (缓存行) 对齐
+_ALIGN = 64
+
+# 头部计数器：写入序号 (解码进程写) + 读取方统计 (检测进程写，主进程直接读，不用额外传消息)
+HEADER_FIELDS = ("write_seq", "inferred", "filtered", "dropped", "prefilter_ns", "detect_ns")
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class FrameRing:
+    """
+    共享内存帧环形缓冲区 (一个摄像头一个，单写多读，无锁)
+    - 解码进程直接把画面写进共享内存里的槽位，检测进程拿到的是同一块内存的 NumPy 视图，不复制、不 pickle
+    - 写满后覆盖最旧的槽位：检测跟不上时自动丢弃旧帧，读取方永远拿到最新一帧
+    - 每个槽位记录帧序号，写入期间置为 -1；读取方处理完后用 is_current() 确认这帧没有被覆盖
+
+    内存布局: [头部计数器][槽位序号 x slots][时间戳 x slots][画面 x slots]
+    """
+
+    def __init__(self, shm, shape, slots, owner):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = owner
+
+        n = len(HEADER_FIELDS)
+        header_size = _align(8 * (n + slots))
+        ts_size = _align(8 * slots)
+        buf = shm.buf
+        self._header = np.ndarray((n + slots,), dtype=np.int64, buffer=buf)
+        self._slot_seq = self._header[n:]
+        self._ts = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=header_size)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=header_size + ts_size)
+
+    @staticmethod
+    def nbytes(shape, slots):
+        return _align(8 * (len(HEADER_FIELDS) + slots)) + _align(8 * slots) + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, shape, slots=4, name=None):
+        """创建共享内存 (由主进程调用，负责最后 unlink)"""
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.nbytes(shape, slots))
+        ring = cls(shm, shape, slots, owner=True)
+        ring._header[:] = 0
+        ring._slot_seq[:] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name, shape, slots=4):
+        """在子进程中按名字挂载已有的缓冲区"""
+        return cls(shared_memory.SharedMemory(name=name), shape, slots, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_seq(self):
+        """已写入的帧数 (最新一帧的序号)"""
+        return int(self._header[0])
+
+    # ---------------- 写入 (解码进程) ----------------
+
+    def begin_write(self):
+        """
+        取下一个槽位，返回 (序号, 可直接写入的画面视图)
+        解码器可以直接解码到这个视图里 (如 cv2 的 cap.read(view))，写完调用 commit()
+        """
+        seq = int(self._header[0]) + 1
+        slot = seq % self.slots
+        self._slot_seq[slot] = -1
+        return seq, self.frames[slot]
+
+    def commit(self, seq, ts):
+        slot = seq % self.slots
+        self._ts[slot] = ts
+        self._slot_seq[slot] = seq
+        self._header[0] = seq
+
+    def write(self, frame, ts):
+        """复制一帧进来 (画面已在别的内存里时使用)"""
+        seq, view = self.begin_write()
+        np.copyto(view, frame)
+        self.commit(seq, ts)
+        return seq
+
+    # ---------------- 读取 (检测进程) ----------------
+
+    def latest(self, after_seq=0):
+        """
+        最新一帧 (不复制)
+        :param after_seq: 上次处理过的序号；没有更新的帧时返回 None
+        :return: (序号, 时间戳, 画面视图) 或 None
+        """
+        seq = int(self._header[0])
+        if seq <= after_seq:
+            return None
+        slot = seq % self.slots
+        ts = float(self._ts[slot])
+        if self._slot_seq[slot] != seq:
+            # 正好被下一圈写入覆盖，下次再取
+            return None
+        return seq, ts, self.frames[slot]
+
+    def is_current(self, seq):
+        """这帧在读取期间是否仍然完整 (没有被新帧覆盖)"""
+        return self._slot_seq[seq % self.slots] == seq
+
+    # ---------------- 统计 ----------------
+
+    def add_stats(self, **counts):
+        """读取方累加统计 (每个缓冲区只有一个检测进程读取，不需要加锁)"""
+        for field, value in counts.items():
+            self._header[HEADER_FIELDS.index(field)] += value
+
+    def stats(self):
+        return dict(zip(HEADER_FIELDS, (int(v) for v in self._header[:len(HEADER_FIELDS)])))
+
+    def close(self):
+        # 先释放 NumPy 视图，否则 SharedMemory.close() 会因为还有导出的缓冲区而报错
+        self._header = self._slot_seq = self._ts = self.frames = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
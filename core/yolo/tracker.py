@@ -0,0 +1,265 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from utils import metrics
+from utils.logger import setup_logger
+
+
+class TrackerConfig:
+    """
+    时序确认参数 (可 pickle，可以在检测进程里使用)
+    :param iou_threshold: 与已有轨迹的 IoU 超过它才算同一个目标
+    :param ema_alpha: 置信度指数移动平均系数 (越大越跟随当前帧)
+    :param confirm_hits: N，最近 confirm_window 帧里至少 N 帧检测到
+    :param confirm_window: M，滑动窗口帧数 (最多 32)
+    :param min_conf: 置信度 EMA 达到它才允许报警
+    :param max_age: 连续多少帧没匹配上就删除轨迹
+    :param max_tracks: 每个摄像头最多同时跟踪多少个目标 (数组容量)
+    """
+
+    __slots__ = ("iou_threshold", "ema_alpha", "confirm_hits", "confirm_window", "min_conf", "max_age",
+                 "max_tracks")
+
+    def __init__(self, iou_threshold=0.3, ema_alpha=0.3, confirm_hits=3, confirm_window=5, min_conf=0.4,
+                 max_age=10, max_tracks=32):
+        if not 1 <= confirm_hits <= confirm_window <= 32:
+            raise ValueError("需要 1 <= confirm_hits <= confirm_window <= 32")
+        self.iou_threshold = iou_threshold
+        self.ema_alpha = ema_alpha
+        self.confirm_hits = confirm_hits
+        self.confirm_window = confirm_window
+        self.min_conf = min_conf
+        self.max_age = max_age
+        self.max_tracks = max_tracks
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class TrackEvent:
+    """一条轨迹通过时序确认，需要报警"""
+
+    __slots__ = ("camera_id", "track_id", "box", "conf", "cls", "hits", "seq", "ts")
+
+    def __init__(self, camera_id, track_id, box, conf, cls, hits, seq, ts):
+        self.camera_id = camera_id
+        self.track_id = track_id
+        self.box = box          # (x1, y1, x2, y2)
+        self.conf = conf        # 置信度 EMA
+        self.cls = cls
+        self.hits = hits        # 窗口内检测到的帧数
+        self.seq = seq          # 触发报警的帧序号
+        self.ts = ts
+
+    def __repr__(self):
+        return f"TrackEvent({self.camera_id}#{self.track_id}, conf={self.conf:.2f}, hits={self.hits})"
+
+
+def iou_matrix(a, b):
+    """(K, 4) x (N, 4) -> (K, N) IoU，广播一次算完"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    wh = np.minimum(a[:, None, 2:], b[None, :, 2:]) - lt
+    np.maximum(wh, 0, out=wh)
+    inter = wh[..., 0] * wh[..., 1]
+    size_a = a[:, 2:] - a[:, :2]
+    size_b = b[:, 2:] - b[:, :2]
+    return inter / ((size_a[:, 0] * size_a[:, 1])[:, None] + size_b[:, 0] * size_b[:, 1] - inter + 1e-9)
+
+
+class CameraTracker:
+    """
+    单个摄像头的轻量跟踪器 (只做时序确认，不做运动预测)
+    - 按 IoU 把本帧检测框关联到已有轨迹 (同类别)，置信度做指数移动平均
+    - 每条轨迹用一个 uint32 位图记录最近 M 帧是否检测到，N-of-M 用 popcount 判断
+    - 全部状态存在预分配的定长数组里，活跃轨迹始终排在前 count 个位置 (切片即视图，不用花式索引)，
+      没有逐框 dict；一帧只有十几次小数组运算 (微秒级)，没有检测框也没有轨迹时直接返回
+    - 每条轨迹只报警一次，轨迹消失后再出现才会再次报警
+    """
+
+    def __init__(self, camera_id=None, config=None):
+        self.camera_id = camera_id
+        self.config = config or TrackerConfig()
+        k = self.config.max_tracks
+        self.boxes = np.zeros((k, 4), dtype=np.float32)
+        self.ema = np.zeros(k, dtype=np.float32)
+        self.cls = np.zeros(k, dtype=np.float32)
+        self.history = np.zeros(k, dtype=np.uint32)   # 第 0 位为当前帧
+        self.age = np.zeros(k, dtype=np.int32)        # 连续未匹配的帧数
+        self.track_ids = np.zeros(k, dtype=np.int64)
+        self.alarmed = np.zeros(k, dtype=bool)
+        self.count = 0                                # 活跃轨迹数 (占用前 count 个位置)
+        self._window_mask = np.uint32((1 << self.config.confirm_window) - 1)
+        self._ids = itertools.count(1)
+        # 统计
+        self.frames = 0
+        self.alarms = 0
+        self.cost_ns = 0
+
+    def update(self, detections, seq=None, ts=None):
+        """
+        :param detections: (N, 6) 检测框 [x1, y1, x2, y2, conf, cls] (也接受同样结构的列表)
+        :return: 本帧新通过确认的 TrackEvent 列表 (通常为空)
+        """
+        begin = time.perf_counter_ns()
+        self.frames += 1
+        n = len(detections)
+        if not n and not self.count:
+            self.cost_ns += time.perf_counter_ns() - begin
+            return []
+        cfg = self.config
+        dets = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        k = self.count
+        a = cfg.ema_alpha
+
+        # 1. 关联：IoU 矩阵 (不同类别置 0)，按 IoU 从大到小贪心匹配
+        hit_tracks, hit_dets = [], []
+        unmatched = list(range(n))
+        if k and n:
+            iou = iou_matrix(self.boxes[:k], dets[:, :4])
+            iou[self.cls[:k, None] != dets[None, :, 5]] = 0
+            rows, cols = np.nonzero(iou >= cfg.iou_threshold)
+            if len(rows):
+                if len(rows) > 1:
+                    order = np.argsort(-iou[rows, cols], kind="stable")
+                    rows, cols = rows[order], cols[order]
+                taken = set()
+                for r, c in zip(rows.tolist(), cols.tolist()):
+                    if r in hit_tracks or c in taken:
+                        continue
+                    hit_tracks.append(r)
+                    hit_dets.append(c)
+                    taken.add(c)
+                unmatched = [c for c in unmatched if c not in taken]
+
+        # 2. 更新已有轨迹：位图左移一位，匹配上的置 1；置信度 EMA (没检测到按 0 计入)
+        expired = False
+        if k:
+            history, ema, age = self.history[:k], self.ema[:k], self.age[:k]
+            np.left_shift(history, 1, out=history)
+            history &= self._window_mask
+            ema *= 1 - a
+            age += 1
+            if hit_tracks:
+                hit = np.array(hit_tracks, dtype=np.intp)
+                matched = dets[hit_dets]
+                history[hit] |= np.uint32(1)
+                self.boxes[hit] = matched[:, :4]
+                ema[hit] += a * matched[:, 4]
+                age[hit] = 0
+            expired = age.max() > cfg.max_age
+
+        # 3. 没匹配上的检测框开新轨迹 (数组满了就丢弃，置信度最低的先丢)
+        if unmatched:
+            room = cfg.max_tracks - self.count
+            if len(unmatched) > room:
+                unmatched = sorted(unmatched, key=lambda c: -dets[c, 4])[:room]
+            if unmatched:
+                start, end = self.count, self.count + len(unmatched)
+                new = dets[unmatched]
+                self.boxes[start:end] = new[:, :4]
+                self.ema[start:end] = new[:, 4]
+                self.cls[start:end] = new[:, 5]
+                self.history[start:end] = 1
+                self.age[start:end] = 0
+                self.alarmed[start:end] = False
+                self.track_ids[start:end] = [next(self._ids) for _ in unmatched]
+                self.count = end
+                hit_tracks.extend(range(start, end))
+
+        # 4. N-of-M 确认：只有本帧检测到的轨迹 (包括新轨迹) 才可能新通过
+        events = []
+        if hit_tracks:
+            candidates = np.array(hit_tracks, dtype=np.intp)
+            hits = np.bitwise_count(self.history[candidates])
+            ok = (hits >= cfg.confirm_hits) & (self.ema[candidates] >= cfg.min_conf) & ~self.alarmed[candidates]
+            if ok.any():
+                ts = time.time() if ts is None else ts
+                for i, h in zip(candidates[ok].tolist(), hits[ok].tolist()):
+                    self.alarmed[i] = True
+                    events.append(TrackEvent(self.camera_id, int(self.track_ids[i]), tuple(self.boxes[i].tolist()),
+                                             float(self.ema[i]), int(self.cls[i]), int(h), seq, ts))
+                self.alarms += len(events)
+
+        # 5. 删除过期轨迹 (放在最后，前面用到的下标不会错位)
+        if expired:
+            self._compact(self.age[:self.count] <= cfg.max_age)
+
+        self.cost_ns += time.perf_counter_ns() - begin
+        return events
+
+    def _compact(self, keep):
+        """删除过期轨迹，把剩下的移到数组前面 (很少发生)"""
+        k = self.count
+        idx = np.flatnonzero(keep)
+        for arr in (self.boxes, self.ema, self.cls, self.history, self.age, self.track_ids, self.alarmed):
+            arr[:len(idx)] = arr[:k][idx]
+        self.count = len(idx)
+
+    @property
+    def track_count(self):
+        return self.count
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "tracks": self.count,
+            "alarms": self.alarms,
+            "cost_us": round(self.cost_ns / self.frames / 1000, 2) if self.frames else None,
+        }
+
+
+class AlarmGate:
+    """
+    检测结果 -> 报警之间的时序确认闸门 (每个摄像头一个 CameraTracker)
+    单帧误检不再触发完整的飞书 + 短信 + 电话升级，持续 N-of-M 帧的火情才交给通知层
+
+    用法 (接在 MultiCameraCapture 的结果后面，报警交给 AlarmDispatcher):
+        gate = AlarmGate(lambda event: dispatcher.submit(event.camera_id))
+        for result in capture.results():
+            gate.process(result)
+    """
+
+    def __init__(self, on_alarm, config=None):
+        """
+        :param on_alarm: 回调，参数为 TrackEvent；在调用 process() 的线程里执行，应当立即返回
+        :param config: 可选，TrackerConfig，所有摄像头共用
+        """
+        self.logger = setup_logger("AlarmGate")
+        self.on_alarm = on_alarm
+        self.config = config or TrackerConfig()
+        self.trackers = {}
+        self._lock = threading.Lock()
+
+    def tracker(self, camera_id):
+        tracker = self.trackers.get(camera_id)
+        if tracker is None:
+            with self._lock:
+                tracker = self.trackers.setdefault(camera_id, CameraTracker(camera_id, self.config))
+        return tracker
+
+    def update(self, camera_id, detections, seq=None, ts=None):
+        """送入一帧的检测结果，返回本帧触发的 TrackEvent 列表"""
+        events = self.tracker(camera_id).update(detections, seq, ts)
+        for event in events:
+            self.logger.warning("🔥 摄像头 %s 火情确认: 轨迹 %s，置信度 %.2f，最近 %d 帧中 %d 帧检测到",
+                                camera_id, event.track_id, event.conf, self.config.confirm_window, event.hits)
+            metrics.inc("tracker_alarms_total", camera=camera_id)
+            try:
+                self.on_alarm(event)
+            except Exception:
+                self.logger.exception("报警回调异常: %s", event)
+        return events
+
+    def process(self, result):
+        """:param result: capture.FrameResult"""
+        return self.update(result.camera_id, result.detections, result.seq, result.ts)
+
+    def stats(self):
+        return {camera_id: tracker.stats() for camera_id, tracker in self.trackers.items()}
@@ -1,91 +1,108 @@
 # 程序入口
-import time
-from core.communication.feishu import FeishuNotifier
-from utils.logger import setup_logger
+import threading
 
-# 初始化通知器 (会自动加载 .env 里的管理员)
-notifier = FeishuNotifier()
+import config
+from core.communication.escalation import EscalationEngine
+from core.communication.feishu import FeishuNotifier
+from core.communication.journal import IncidentJournal
+from core.communication.watchdog import HealthWatchdog
+from utils.logger import setup_logger, configure_logging
+from utils.metrics import MetricsServer
+
+# 通知器、渠道看门狗、报警引擎都在 start() 里创建：import main 不会有任何副作用
+# (不会配置日志、启动线程、探测网络，也不会恢复上次未结束的报警去打电话)
+notifier = None
+watchdog = None
+alarm_engine = None
+_start_lock = threading.Lock()
+
+
+def start():
+    """
+    初始化并返回进程内共用的报警引擎 (只执行一次，程序入口或第一次创建 Main() 时调用)
+    :return: EscalationEngine
+    """
+    global notifier, watchdog, alarm_engine
+    with _start_lock:
+        if alarm_engine is not None:
+            return alarm_engine
+
+        # 日志走后台线程写控制台 + output/logs (慢 IO 不会拖慢报警)；需要机器可读日志时加 json_format=True
+        configure_logging(use_queue=True, log_file=True)
+
+        # 本地指标接口 (Prometheus 抓取 http://127.0.0.1:<metrics_port>/metrics)，.env 里配置了 metrics_port 才启动
+        if config.get_env().get("metrics_port"):
+            MetricsServer().start()
+
+        # 初始化通知器 (会自动加载 .env 里的管理员)
+        notifier = FeishuNotifier()
+
+        # 渠道看门狗：定期刷新 token、保持长连接、探测飞书是否可用 (间隔见 .env 的 watchdog_interval)
+        watchdog = HealthWatchdog().add_notifiers(feishu=notifier).start()
+
+        # 管理员直达报警引擎 (进程内共用一个)：流程由 config.ADMIN_ESCALATION_POLICY 描述，定时器驱动，不占用 sleep 线程
+        # 每次阶段变化都记到 output/journal，进程崩溃 / 重新部署后接着执行未结束的报警 (不会从头再报一遍)；
+        # 开始太久的报警 (config.INCIDENT_JOURNAL["resume_max_age"]) 不再恢复
+        alarm_engine = EscalationEngine(notifier, None, policy=config.ADMIN_ESCALATION_POLICY,
+                                        journal=IncidentJournal(), watchdog=watchdog)
+        alarm_engine.resume()
+        return alarm_engine
 
 
 class Main:
 
-    def __init__(self):
+    def __init__(self, engine=None):
         self.logger = setup_logger("Main")
+        self.engine = engine or start()
+
+    def start_fire_alarm(self, image_path, source=None):
+        """
+        发起报警并立即返回 (推荐，流程同 run_fire_alarm_process_feishu，由定时器驱动，不占用调用方线程)
+        :param source: 可选，摄像头标识；该摄像头的报警还在进行 (包括重启后恢复的) 时不会重复发起
+        :return: EscalationState，可用 state.add_done_callback 在报警结束时收到通知
+        """
+        self.logger.info("🔥 [线程启动] 开始执行报警流程...")
+        # 截图失败时 image_path 为 None：照常报警，只是卡片不带图片
+        return self.engine.start(str(image_path) if image_path else None, source=source)
 
-    def run_fire_alarm_process_feishu(self, image_path):
+    def run_fire_alarm_process_feishu(self, image_path, source=None):
 
         """
-        【核心逻辑】全自动分级报警线程
-        该函数会独立运行，不会阻塞摄像头画面
+        【核心逻辑】全自动分级报警
+        1. 给所有管理员发送 [短信 + App] 加急卡片
+        2. 等待任意管理员回复 (限时 3 分钟)，期间多个会话并发检查
+        3. 有人确认 -> 通知警报解除；超时 -> 升级为 [电话] 加急
+        :param source: 可选，摄像头标识；该摄像头的报警还在进行 (包括重启后恢复的) 时不会重复发起
+        :return: 是否有管理员确认
         """
 
-        self.logger.info(f"🔥 [线程启动] 开始执行报警流程...")
-
-        # 1. 记录开始时间
-        start_time = time.time()
-
-        # 2. 第一轮：发送 [短信 + App] 加急
-        # urgent_type="sms" 意味着 App弹窗 + 短信 都会发
-        self.logger.info("Step 1: 发送短信加急报警...")
-        notifier.send_to_all_admins(
-            title="实验室火灾警报",
-            content="检测到明火！请在 3 分钟内回复【1】确认，否则将触发电话报警。",
-            image_path=str(image_path),
-            urgent_type="sms"
-        )
-
-        # 3. 准备轮询：获取所有管理员的 Chat ID
-        # 我们只要收到任意一个管理员的回复，就停止升级
-        admin_chat_ids = []
-        for uid in notifier.admin_ids:
-            cid = notifier.get_p2p_chat_id(uid)
-            if cid:
-                admin_chat_ids.append(cid)
-
-        if not admin_chat_ids:
-            self.logger.error("❌ 警告：无法获取管理员会话 ID，无法接收回复，流程中止")
-            return
-
-        # 4. 进入 3 分钟等待期 (轮询查岗)
-        # 3分钟 = 180秒，每 5 秒查一次
-        wait_seconds = 180
-        is_confirmed = False
-
-        self.logger.info(f"Step 2: 等待回复中 (限时 {wait_seconds} 秒)...")
-
-        for i in range(wait_seconds // 5):
-            # 遍历所有管理员的聊天记录
-            for chat_id in admin_chat_ids:
-                if notifier.check_user_reply(chat_id, start_time):
-                    is_confirmed = True
-                    break  # 跳出管理员循环
-
-            if is_confirmed:
-                break  # 跳出时间循环
-
-            time.sleep(5)  # 休息5秒再查
-
-        # 5. 判断结果
-        if is_confirmed:
-            self.logger.info("✅ 警报解除：管理员已确认收到。")
-            # 可以发一条消息告诉大家：危机解除，有人处理了
-            notifier.send_to_all_admins("警报解除", "管理员已响应，流程结束。", urgent_type="app")
-        else:
-            self.logger.info("⚠️ 超时未回复！")
-            self.logger.info("Step 3: 升级为 [电话] 加急报警！")
-
-            # 6. 第二轮：升级为 [电话] 加急
-            # urgent_type="phone" 意味着 App + 短信 + 电话 都会轰炸
-            notifier.send_to_all_admins(
-                title="【紧急】火灾未响应",
-                content="您未在规定时间内回复，系统发起自动电话通知！请立即处置！",
-                image_path=str(image_path),
-                urgent_type="phone"  # <--- 核心升级点
-            )
+        state = self.start_fire_alarm(image_path, source=source)
+        self.engine.wait(state)
+        return state.acked
 
 # --- 在 YOLO 检测逻辑中调用 ---
-# 假设你在 main loop 里检测到了火灾
-# if is_fire_detected and (现在不在冷却时间内):
-#     # 启动一个新线程去跑报警，这样 main loop 可以继续检测下一帧
-#     t = threading.Thread(target=run_fire_alarm_process, args=("output/fire.jpg",))
-#     t.start()
+# 不要每次检测到火都新开一个线程：交给报警调度器，
+# 同一摄像头报警进行中的重复检测只计数、不重复升级，结束后还有冷却期
+# handler 用不阻塞的 start_fire_alarm：工作线程发起报警后立刻空出来，报警走完升级流程才算结束
+# from core.communication.dispatcher import AlarmDispatcher
+# main = Main()
+# dispatcher = AlarmDispatcher(lambda incident: main.start_fire_alarm(incident.image_path, source=incident.source))
+# if is_fire_detected:
+#     dispatcher.submit("camera-0", "output/fire.jpg")  # 立即返回，不阻塞检测循环
+#
+# 接 MultiCameraCapture 时先经过时序确认 (core/yolo/tracker.py)：单帧误检不报警，
+# 同一目标在最近 M 帧里出现 N 帧且置信度 EMA 足够高才交给调度器
+# 报警截图由 EvidenceRecorder 在后台线程写入 output/captured_imgs (core/yolo/evidence.py)，
+# 截图写好后再交给调度器 (截图失败时 path 为 None，报警照常发出)；前后几秒的录像和缩略图条随后异步写入，检测循环不等磁盘
+# from core.yolo.evidence import EvidenceRecorder
+# from core.yolo.tracker import AlarmGate
+# recorder = EvidenceRecorder().start()
+# recorder.tap(capture)
+# gate = AlarmGate(lambda event: recorder.trigger(
+#     event.camera_id, event.seq, event.ts, on_alarm=lambda path: dispatcher.submit(event.camera_id, path)))
+# for result in capture.results():
+#     gate.process(result)
+
+
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,65 @@
+"""
+通信模块测试共用的替身 (飞书 / 阿里云短信 / 阿里云语音)，按 EscalationEngine 用到的接口实现
+"""
+import threading
+
+# 小时间尺度的群聊报警策略，跑完一个报警只要零点几秒
+POLICY = {
+    "poll_interval": 0.02,
+    "fallback_poll_interval": 10,
+    "ack_timeout": 0.2,
+    "stages": [
+        {"after": 0, "action": "group_card", "required": True, "title": "t", "content": "c"},
+        {"after": 0, "action": "sms"},
+        {"after": 0, "action": "buzz", "urgent_type": "sms"},
+        {"after": 0.2, "action": "buzz", "urgent_type": "phone"},
+    ],
+}
+
+
+class FakeNotifier:
+    admin_ids = ["ou_1"]
+    group_chat_id = "oc_group"
+
+    def __init__(self, confirm_after=None, card_ok=True):
+        self.calls = []
+        self.polls = 0
+        self.confirm_after = confirm_after
+        self.card_ok = card_ok
+        self._lock = threading.Lock()
+
+    def send_card_to_group(self, title, content, image_path=None, on_send=None):
+        if on_send:
+            on_send()
+        self.calls.append("card")
+        return "om_1" if self.card_ok else None
+
+    def buzz_message(self, message_id, user_id_list, urgent_type="sms"):
+        self.calls.append(f"buzz_{urgent_type}")
+        return True
+
+    def check_chat_reply(self, start_time_ts, incident_id=None, chat_id=None):
+        with self._lock:
+            self.polls += 1
+            return self.confirm_after is not None and self.polls >= self.confirm_after
+
+    def release_reply_cursor(self, incident_id):
+        pass
+
+
+class FakeAliyun:
+    def __init__(self):
+        self.sent = 0
+
+    def send_sms_to_all(self, params=None):
+        self.sent += 1
+        return True
+
+
+class FakeVoice:
+    def __init__(self):
+        self.calls = 0
+
+    def call_all(self, params=None):
+        self.calls += 1
+        return type("Batch", (), {"ok": True})()
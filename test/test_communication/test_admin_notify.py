@@ -0,0 +1,123 @@
+import threading
+import time
+
+import core.communication.feishu as feishu_module
+from core.communication.feishu import FeishuNotifier
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def make_notifier(monkeypatch, admin_ids):
+    notifier = FeishuNotifier()
+    notifier.admin_ids = list(admin_ids)
+    monkeypatch.setattr(notifier, "_get_tenant_access_token", lambda: "token")
+    return notifier
+
+
+def test_plain_send_uses_chunked_batch_api(monkeypatch):
+    notifier = make_notifier(monkeypatch, [f"ou_{i}" for i in range(450)])
+    seen = []
+
+    def _post(url, json=None, **kwargs):
+        seen.append((url, len(json["open_ids"])))
+        return FakeResponse({"code": 0, "data": {}})
+
+    monkeypatch.setattr(feishu_module.http_session, "post", _post)
+    assert notifier.send_to_all_admins("警报解除", "管理员已响应，流程结束。")
+    assert [n for _, n in seen] == [200, 200, 50]
+    assert all(url.endswith("/message/v4/batch_send/") for url, _ in seen)
+
+
+def test_urgent_send_is_concurrent_and_caches_chat_ids(monkeypatch):
+    notifier = make_notifier(monkeypatch, [f"ou_{i}" for i in range(8)])
+    buzzed = []
+    lock = threading.Lock()
+
+    def _post(url, params=None, json=None, **kwargs):
+        time.sleep(0.05)
+        uid = json["receive_id"]
+        return FakeResponse({"code": 0, "data": {"message_id": f"om_{uid}", "chat_id": f"oc_{uid}"}})
+
+    def _buzz(message_id, user_id_list, urgent_type="sms"):
+        with lock:
+            buzzed.append((message_id, urgent_type))
+        return True
+
+    monkeypatch.setattr(feishu_module.http_session, "post", _post)
+    monkeypatch.setattr(notifier, "buzz_message", _buzz)
+
+    begin = time.time()
+    assert notifier.send_to_all_admins("实验室火灾警报", "检测到明火！", urgent_type="phone")
+    # 8 位管理员并发发送，总耗时接近一次请求
+    assert time.time() - begin < 0.3
+    assert sorted(buzzed) == sorted((f"om_ou_{i}", "phone") for i in range(8))
+
+    # 发送时已记下单聊 ID，之后取会话 ID 不再请求
+    monkeypatch.setattr(feishu_module.http_session, "post", lambda *a, **k: 1 / 0)
+    assert notifier.get_p2p_chat_ids(notifier.admin_ids) == {f"ou_{i}": f"oc_ou_{i}" for i in range(8)}
+
+
+def test_p2p_chat_ids_one_batch_query_for_missing(monkeypatch):
+    notifier = make_notifier(monkeypatch, [])
+    notifier.p2p_chat_ids["ou_1"] = "oc_1"
+    seen = []
+
+    def _post(url, params=None, json=None, **kwargs):
+        seen.append(json["chatter_ids"])
+        chats = [{"chatter_id": uid, "chat_id": uid.replace("ou_", "oc_")} for uid in json["chatter_ids"]]
+        return FakeResponse({"code": 0, "data": {"p2p_chats": chats}})
+
+    monkeypatch.setattr(feishu_module.http_session, "post", _post)
+    assert notifier.get_p2p_chat_ids(["ou_1", "ou_2", "ou_3"]) == {"ou_1": "oc_1", "ou_2": "oc_2", "ou_3": "oc_3"}
+    assert seen == [["ou_2", "ou_3"]]
+    assert notifier.get_p2p_chat_id("ou_2") == "oc_2"
+    assert len(seen) == 1
+
+
+def test_admin_replies_checked_concurrently(monkeypatch):
+    notifier = make_notifier(monkeypatch, [])
+
+    def _check(chat_id, start_time_ts, incident_id=None):
+        time.sleep(0.05)
+        return chat_id == "oc_5"
+
+    monkeypatch.setattr(notifier, "check_user_reply", _check)
+    begin = time.time()
+    assert notifier.check_admin_replies([f"oc_{i}" for i in range(8)], time.time(), incident_id="a1")
+    assert time.time() - begin < 0.3
+    assert not notifier.check_admin_replies([], time.time())
+
+
+def test_partial_admin_failure_still_counts_as_delivered(monkeypatch):
+    notifier = make_notifier(monkeypatch, ["ou_ok", "ou_stale", "ou_nobuzz"])
+
+    def _post(url, params=None, json=None, **kwargs):
+        uid = json["receive_id"]
+        if uid == "ou_stale":
+            return FakeResponse({"code": 230013, "msg": "invalid open_id"})
+        return FakeResponse({"code": 0, "data": {"message_id": f"om_{uid}"}})
+
+    monkeypatch.setattr(feishu_module.http_session, "post", _post)
+    monkeypatch.setattr(notifier, "buzz_message", lambda message_id, ids, urgent_type="sms": ids != ["ou_nobuzz"])
+    # 一位管理员 open_id 失效、一位加急被拒：其他人已收到，报警继续升级
+    assert notifier.send_to_all_admins("实验室火灾警报", "检测到明火！", urgent_type="phone")
+
+    monkeypatch.setattr(feishu_module.http_session, "post",
+                        lambda *a, **k: FakeResponse({"code": 230013, "msg": "invalid open_id"}))
+    assert not notifier.send_to_all_admins("实验室火灾警报", "检测到明火！", urgent_type="phone")
+
+
+def test_batch_send_counts_invalid_open_ids(monkeypatch):
+    notifier = make_notifier(monkeypatch, ["ou_1", "ou_2"])
+    response = {"code": 0, "data": {"invalid_open_ids": ["ou_2"]}}
+    monkeypatch.setattr(feishu_module.http_session, "post", lambda *a, **k: FakeResponse(response))
+    assert notifier.send_to_all_admins("警报解除", "管理员已响应")
+
+    response["data"]["invalid_open_ids"] = ["ou_1", "ou_2"]
+    assert not notifier.send_to_all_admins("警报解除", "管理员已响应")
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from benchmark.mock_server import MockServer
+from core.communication.async_communication import AsyncCommunication
+from core.communication.async_feishu import AsyncFeishuNotifier
+from core.communication.watchdog import FEISHU, HealthWatchdog
+from test_communication.fakes import FakeVoice
+
+
+class FakeFeishu:
+    admin_ids = ["ou_admin"]
+
+    def __init__(self, confirm_after=None):
+        self.calls = []
+        self.confirm_after = confirm_after
+        self.threads = set()
+
+    async def send_card_to_group(self, title, content, image_path=None):
+        self.calls.append(("card", time.monotonic()))
+        self.threads.add(threading.current_thread().name)
+        await asyncio.sleep(0.05)
+        return "om_1"
+
+    async def buzz_message(self, message_id, user_id_list, urgent_type="sms"):
+        self.calls.append((f"buzz_{urgent_type}", time.monotonic()))
+        return True
+
+    async def check_chat_reply(self, start_time_ts, incident_id=None, chat_id=None):
+        self.calls.append(("poll", time.monotonic()))
+        polls = sum(1 for c in self.calls if c[0] == "poll")
+        return self.confirm_after is not None and polls >= self.confirm_after
+
+    def release_reply_cursor(self, incident_id):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FakeAliyun:
+    def __init__(self):
+        self.sent_at = None
+
+    async def send_sms_to_all(self, params=None):
+        self.sent_at = time.monotonic()
+        await asyncio.sleep(0.05)
+        return True
+
+
+@pytest.fixture
+def make_comm():
+    comms = []
+
+    def factory(feishu, aliyun):
+        comm = AsyncCommunication(feishu=object(), aliyun=object())
+        comm.feishu = feishu
+        comm.aliyun = aliyun
+        comms.append(comm)
+        return comm
+
+    yield factory
+    for comm in comms:
+        comm.shutdown()
+
+
+def test_sms_overlaps_card_and_confirm_stops_escalation(make_comm):
+    feishu, aliyun = FakeFeishu(confirm_after=2), FakeAliyun()
+    comm = make_comm(feishu, aliyun)
+
+    started = time.monotonic()
+    assert comm.run_sync("fire.jpg", wait_seconds=5, poll_interval=0.01) is True
+    # 短信与卡片并发：总耗时远小于两者串行
+    assert aliyun.sent_at - started < 0.04
+    names = [c[0] for c in feishu.calls]
+    assert "buzz_sms" in names and "buzz_phone" not in names
+
+
+def test_timeout_escalates_to_phone(make_comm):
+    feishu, aliyun = FakeFeishu(), FakeAliyun()
+    comm = make_comm(feishu, aliyun)
+    assert comm.run_sync("fire.jpg", wait_seconds=0.05, poll_interval=0.01) is False
+    assert feishu.calls[-1][0] == "buzz_phone"
+
+
+def test_many_incidents_share_one_loop(make_comm):
+    feishu, aliyun = FakeFeishu(confirm_after=1), FakeAliyun()
+    comm = make_comm(feishu, aliyun)
+    started = time.monotonic()
+    results = asyncio.run(comm.run_many([f"{i}.jpg" for i in range(50)], wait_seconds=1, poll_interval=0.01))
+    assert results == [True] * 50
+    # 50 个报警并发推进，耗时接近单个报警
+    assert time.monotonic() - started < 1
+
+
+POLICY = {
+    "poll_interval": 0.01,
+    "ack_timeout": 0.1,
+    "stages": [
+        {"after": 0, "action": "group_card", "required": True},
+        {"after": 0.03, "action": "sms"},
+        {"after": 0.1, "action": "voice"},
+    ],
+}
+
+
+def test_follows_escalation_policy(make_comm):
+    feishu, aliyun, voice = FakeFeishu(), FakeAliyun(), FakeVoice()
+    comm = make_comm(feishu, aliyun)
+    comm.policy, comm.voice = POLICY, voice
+    started = time.monotonic()
+    assert comm.run_sync("fire.jpg") is False
+    # 按策略顺序执行：卡片 -> 0.03 秒后短信 -> 确认超时后语音电话；策略里没有加急
+    assert aliyun.sent_at - started >= 0.03
+    assert voice.calls == 1
+    assert not any(name.startswith("buzz") for name, _ in feishu.calls)
+
+
+def test_required_stage_failure_aborts(make_comm):
+    class FailingFeishu(FakeFeishu):
+        async def send_card_to_group(self, title, content, image_path=None):
+            return None
+
+    feishu, voice = FailingFeishu(), FakeVoice()
+    comm = make_comm(feishu, FakeAliyun())
+    comm.policy, comm.voice = POLICY, voice
+    assert comm.run_sync("fire.jpg") is False
+    assert voice.calls == 0
+
+
+def test_async_card_refreshes_config():
+    class SyncNotifier:
+        group_chat_id = None
+        refreshed = 0
+
+        def refresh_config(self):
+            self.refreshed += 1
+
+    notifier = SyncNotifier()
+    assert asyncio.run(AsyncFeishuNotifier(notifier).send_card_to_group("t", "c")) is None
+    assert notifier.refreshed == 1
+
+
+def test_threads_share_one_long_lived_loop(make_comm):
+    feishu, aliyun = FakeFeishu(confirm_after=1), FakeAliyun()
+    comm = make_comm(feishu, aliyun)
+    futures = []
+    workers = [threading.Thread(target=lambda: futures.append(comm.submit("fire.jpg", wait_seconds=1,
+                                                                           poll_interval=0.01)))
+               for _ in range(5)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [future.result(timeout=2) for future in futures] == [True] * 5
+    loop = comm._loop
+    assert comm.run_sync("fire.jpg", wait_seconds=1, poll_interval=0.01) is True
+    # 所有报警都在同一个后台常驻的事件循环里执行
+    assert comm._loop is loop
+    assert feishu.threads == {"alarm-asyncio"}
+
+
+def test_async_requests_report_to_watchdog():
+    class SyncNotifier:
+        token_cache = type("Cache", (), {"get_cached": lambda self: "t"})()
+
+    async def buzz_twice(notifier):
+        async with AsyncFeishuNotifier(notifier) as feishu:
+            return [await feishu.buzz_message("om_1", ["ou_1"]) for _ in range(2)]
+
+    watchdog = HealthWatchdog(interval=60).add_channel(FEISHU).start()
+    try:
+        with MockServer(error_rate=1.0) as server:
+            notifier = SyncNotifier()
+            notifier.api_base = server.feishu_api_base
+            assert asyncio.run(buzz_twice(notifier)) == [False, False]
+        assert not watchdog.is_healthy(FEISHU)
+        assert watchdog.snapshot()[FEISHU]["last_error"] == "HTTP 500"
+    finally:
+        watchdog.stop()
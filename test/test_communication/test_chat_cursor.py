@@ -0,0 +1,58 @@
+import json
+
+from core.communication.chat_cursor import ChatPollCursor, ChatPollCursors
+from core.communication.feishu import FeishuNotifier
+
+
+def make_msg(msg_id, create_s, text, sender_type="user"):
+    return {
+        "message_id": msg_id,
+        "create_time": str(create_s * 1000),
+        "sender": {"sender_type": sender_type},
+        "body": {"content": json.dumps({"text": text})},
+    }
+
+
+class CountingMatcher:
+    def __init__(self):
+        self.seen = []
+
+    def __call__(self, msg):
+        self.seen.append(msg["message_id"])
+        return FeishuNotifier.is_confirm_message(msg)
+
+
+def test_only_new_messages_are_decoded():
+    cursor = ChatPollCursor("oc_1", 1000)
+    matcher = CountingMatcher()
+
+    page1 = {"items": [make_msg("m1", 1000, "着火了"), make_msg("m2", 1001, "真的假的")], "has_more": False}
+    assert cursor.consume(page1, matcher) == (False, False)
+    assert cursor.build_params()["start_time"] == "1001"
+
+    # 下一次轮询：接口按 start_time 又返回了边界那一秒的 m2，不应再解析
+    page2 = {"items": [make_msg("m2", 1001, "真的假的"), make_msg("m3", 1002, "收到")], "has_more": False}
+    assert cursor.consume(page2, matcher) == (True, False)
+    assert matcher.seen == ["m1", "m2", "m3"]
+    # 边界之前的 ID 不再保留
+    assert set(cursor.seen_ids) == {"m3"}
+
+
+def test_follows_pagination():
+    cursor = ChatPollCursor("oc_1", 1000)
+    page1 = {"items": [make_msg(f"m{i}", 1000, "闲聊") for i in range(50)], "has_more": True, "page_token": "p2"}
+    assert cursor.consume(page1, FeishuNotifier.is_confirm_message) == (False, True)
+    assert cursor.build_params()["page_token"] == "p2"
+
+    page2 = {"items": [make_msg("m50", 1003, "1")], "has_more": False}
+    assert cursor.consume(page2, FeishuNotifier.is_confirm_message) == (True, False)
+    assert "page_token" not in cursor.build_params()
+
+
+def test_cursors_keyed_per_incident():
+    cursors = ChatPollCursors()
+    a = cursors.get("inc-1", "oc_1", 1000)
+    assert cursors.get("inc-1", "oc_1", 1000) is a
+    assert cursors.get("inc-2", "oc_1", 1000) is not a
+    cursors.release("inc-1")
+    assert len(cursors) == 1
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+import config
+import core.communication.feishu as feishu_module
+from config import EnvConfig, EnvSnapshot
+from core.communication.feishu import FeishuNotifier
+from core.communication.open_id_cache import OpenIdCache
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def write_env(path, text, mtime):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_snapshot_is_read_only():
+    env = EnvSnapshot({"admin_phone1": " 13800000001 ", "admin_phone2": "", "sms_phone1": "139"})
+    assert env.admin_phones == (("admin_phone1", "13800000001"),)
+    assert env.sms_phones == (("sms_phone1", "139"),)
+    with pytest.raises(AttributeError):
+        env.values = {}
+    with pytest.raises(TypeError):
+        env.values["admin_phone3"] = "x"
+
+
+def test_reparse_only_when_mtime_changes(tmp_path):
+    path = tmp_path / ".env"
+    write_env(path, "sms_phone1=13800000001\n", 1_000_000_000)
+    store = EnvConfig(path, check_interval=0)
+
+    first = store.get()
+    assert store.get() is first
+
+    write_env(path, "sms_phone1=13800000001\nsms_phone2=13800000002\n", 2_000_000_000)
+    second = store.get()
+    assert second is not first and second.version == first.version + 1
+    assert [p for _, p in second.sms_phones] == ["13800000001", "13800000002"]
+    # 旧快照不受影响
+    assert len(first.sms_phones) == 1
+
+
+def test_check_interval_skips_stat(tmp_path):
+    path = tmp_path / ".env"
+    write_env(path, "a=1\n", 1_000_000_000)
+    store = EnvConfig(path, check_interval=3600)
+    first = store.get()
+    write_env(path, "a=2\n", 2_000_000_000)
+    assert store.get() is first
+    assert store.reload().get("a") == "2"
+
+
+def test_reload_resolves_only_new_admins(tmp_path, monkeypatch):
+    path = tmp_path / ".env"
+    write_env(path, "admin_phone1=+8613800000001\n", 1_000_000_000)
+    store = EnvConfig(path, check_interval=0)
+    monkeypatch.setattr(config, "_env_config", store)
+
+    notifier = FeishuNotifier()
+    notifier.app_id, notifier.app_secret = "cli_test", "secret"
+    monkeypatch.setattr(notifier, "_get_tenant_access_token", lambda: "token")
+    monkeypatch.setattr(feishu_module, "OpenIdCache", lambda app_id: OpenIdCache(app_id, cache_dir=tmp_path))
+
+    seen = []
+
+    def _post(url, json=None, **kwargs):
+        seen.append(json["mobiles"])
+        users = [{"mobile": m.lstrip("+"), "user_id": f"ou_{m[-4:]}"} for m in json["mobiles"]]
+        return FakeResponse({"code": 0, "data": {"user_list": users}})
+
+    monkeypatch.setattr(feishu_module.http_session, "post", _post)
+    notifier._auto_load_admins()
+    assert notifier.admin_ids == ["ou_0001"]
+
+    # 没有变化：不解析、不请求
+    assert not notifier.refresh_config()
+
+    write_env(path, "admin_phone1=+8613800000001\nadmin_phone2=+8613800000002\n"
+                    "feishu_group_chat_id=oc_new\n", 2_000_000_000)
+    assert notifier.refresh_config()
+    assert notifier.admin_ids == ["ou_0001", "ou_0002"]
+    assert notifier.group_chat_id == "oc_new"
+    assert seen == [["+8613800000001"], ["+8613800000002"]]
+
+
+def test_importing_main_has_no_side_effects():
+    import threading
+
+    before = {t.name for t in threading.enumerate()}
+    import main
+
+    # 不启动看门狗 / 定时器线程，也不恢复报警日志里的报警
+    assert main.alarm_engine is None and main.watchdog is None
+    assert {t.name for t in threading.enumerate()} <= before
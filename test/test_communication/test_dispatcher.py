@@ -0,0 +1,93 @@
+import threading
+import time
+
+from core.communication.dispatcher import AlarmDispatcher, OPENED, COALESCED, SUPPRESSED, DROPPED
+
+
+def test_detections_coalesce_into_open_incident():
+    release = threading.Event()
+    handled = []
+
+    def handler(incident):
+        release.wait(5)
+        handled.append(incident)
+
+    dispatcher = AlarmDispatcher(handler, max_workers=2, cooldown=60)
+    status, incident = dispatcher.submit("cam-1", "f1.jpg")
+    assert status == OPENED
+    for i in range(20):
+        assert dispatcher.submit("cam-1", f"f{i + 2}.jpg")[0] == COALESCED
+
+    release.set()
+    dispatcher.shutdown()
+    assert handled == [incident]
+    assert incident.detections == 21
+    assert incident.image_path == "f1.jpg"
+    # 报警结束后进入冷却期
+    assert dispatcher.submit("cam-1", "late.jpg")[0] == SUPPRESSED
+
+
+def test_sources_are_independent_and_queue_is_bounded():
+    release = threading.Event()
+    dispatcher = AlarmDispatcher(lambda incident: release.wait(5), max_workers=1, max_queue=2)
+
+    results = [dispatcher.submit(f"cam-{i}")[0] for i in range(6)]
+    time.sleep(0.05)
+    metrics = dispatcher.metrics()
+    release.set()
+    dispatcher.shutdown()
+
+    # 1 个在处理 + 队列 2 个，其余丢弃
+    assert results.count(DROPPED) >= 3
+    assert metrics[DROPPED] == results.count(DROPPED)
+    assert metrics["queue_depth"] <= 2
+    assert threading.active_count() < 10
+
+
+def test_handler_error_closes_incident():
+    def handler(incident):
+        raise RuntimeError("boom")
+
+    dispatcher = AlarmDispatcher(handler, max_workers=1, cooldown=0)
+    dispatcher.submit("cam-1")
+    dispatcher.shutdown()
+    assert dispatcher.metrics()["failed"] == 1
+    assert dispatcher.metrics()["open_incidents"] == 0
+
+
+class PendingAlarm:
+    """模拟 start_fire_alarm 返回的 EscalationState：发起后立即返回，结束时回调"""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def add_done_callback(self, fn):
+        self.callbacks.append(fn)
+
+    def finish(self):
+        for fn in self.callbacks:
+            fn(self)
+
+
+def test_non_blocking_handler_keeps_incident_open_without_holding_worker():
+    alarms = {}
+
+    def handler(incident):
+        alarms[incident.source] = PendingAlarm()
+        return alarms[incident.source]
+
+    dispatcher = AlarmDispatcher(handler, max_workers=1, cooldown=60)
+    assert dispatcher.submit("cam-1", "f1.jpg")[0] == OPENED
+    # 唯一的工作线程没有被第一个报警占住
+    assert dispatcher.submit("cam-2", "f2.jpg")[0] == OPENED
+    deadline = time.time() + 1
+    while (len(alarms) < 2 or dispatcher.metrics()["active"]) and time.time() < deadline:
+        time.sleep(0.005)
+    assert set(alarms) == {"cam-1", "cam-2"}
+
+    # 升级流程结束前同一来源的检测仍然合并
+    assert dispatcher.submit("cam-1", "f3.jpg")[0] == COALESCED
+    alarms["cam-1"].finish()
+    assert dispatcher.submit("cam-1", "f4.jpg")[0] == SUPPRESSED
+    assert dispatcher.metrics()["open_incidents"] == 1
+    dispatcher.shutdown()
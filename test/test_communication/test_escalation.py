@@ -0,0 +1,279 @@
+import sys
+import threading
+import time
+
+import config
+from core.communication.escalation import EscalationEngine, EscalationState, ACKED, TIMEOUT, FAILED
+from core.communication.event_server import AckRegistry
+from core.communication.scheduler import TimerScheduler
+from utils import metrics
+from test_communication.fakes import POLICY, FakeNotifier, FakeAliyun, FakeVoice
+
+
+def make_engine(notifier, **kwargs):
+    scheduler = TimerScheduler(max_workers=2, io_workers=2)
+    return EscalationEngine(notifier, FakeAliyun(), policy=POLICY, scheduler=scheduler, **kwargs), scheduler
+
+
+def test_confirmed_reply_cancels_phone_stage():
+    notifier = FakeNotifier(confirm_after=2)
+    engine, scheduler = make_engine(notifier)
+    registry = metrics.get_registry()
+    acked_before = registry.counter_value("alarm_incidents_total", status=ACKED)
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        assert state.status == ACKED
+        assert notifier.calls == ["card", "buzz_sms"]
+        assert engine.aliyun.sent == 1
+        # 阶段耗时、首次通知耗时、确认耗时都有记录
+        assert state.notified_at is not None
+        assert registry.counter_value("alarm_incidents_total", status=ACKED) == acked_before + 1
+        assert registry.histogram("alarm_stage_seconds", stage="group_card")["count"] >= 1
+        assert registry.histogram("alarm_time_to_ack_seconds")["count"] >= 1
+    finally:
+        scheduler.shutdown()
+
+
+def test_timeout_escalates_to_phone():
+    notifier = FakeNotifier()
+    engine, scheduler = make_engine(notifier)
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        assert state.status == TIMEOUT
+        assert notifier.calls == ["card", "buzz_sms", "buzz_phone"]
+        # 轮询在 ack_timeout 内按间隔执行，而不是无限制
+        assert 3 <= notifier.polls <= 12
+    finally:
+        scheduler.shutdown()
+
+
+def test_card_failure_aborts():
+    notifier = FakeNotifier(card_ok=False)
+    engine, scheduler = make_engine(notifier)
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        assert state.status == FAILED
+        assert engine.aliyun.sent == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_event_ack_finishes_immediately():
+    registry = AckRegistry()
+    notifier = FakeNotifier()
+    engine, scheduler = make_engine(notifier, ack_registry=registry)
+    try:
+        state = engine.start("fire.jpg")
+        deadline = time.time() + 1
+        while state.waiter is None and time.time() < deadline:
+            time.sleep(0.005)
+        state.waiter.set("1")
+        assert engine.wait(state, timeout=1)
+        assert state.status == ACKED
+        assert "buzz_phone" not in notifier.calls
+        assert registry.pending_count() == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_many_incidents_one_timer_thread():
+    notifier = FakeNotifier()
+    engine, scheduler = make_engine(notifier)
+    try:
+        threads_before = threading.active_count()
+        states = [engine.start("fire.jpg") for _ in range(500)]
+        # 报警数量不影响线程数
+        assert threading.active_count() - threads_before <= 2
+        for state in states:
+            assert engine.wait(state, timeout=5)
+        assert all(s.status == TIMEOUT for s in states)
+        assert engine.pending_count() == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_done_callbacks_run_once_when_incident_finishes():
+    notifier = FakeNotifier(confirm_after=2)
+    engine, scheduler = make_engine(notifier)
+    finished = []
+    try:
+        state = engine.start("fire.jpg")
+        state.add_done_callback(finished.append)
+        assert engine.wait(state, timeout=2)
+        deadline = time.time() + 1
+        while not finished and time.time() < deadline:
+            time.sleep(0.005)
+        assert finished == [state]
+        # 报警已结束时注册的回调立即执行
+        state.add_done_callback(finished.append)
+        assert finished == [state, state]
+    finally:
+        scheduler.shutdown()
+
+
+def test_state_is_compact():
+    state = EscalationState("alarm-1", "fire.jpg", time.time())
+    assert not hasattr(state, "__dict__")
+    assert sys.getsizeof(state) < 200
+
+
+ADMIN_POLICY = {
+    "poll_interval": 0.02,
+    "ack_timeout": 0.2,
+    "reply_from": "admins",
+    "stages": [
+        {"after": 0, "action": "admin_card", "urgent_type": "sms", "required": True},
+        {"after": 0.2, "action": "admin_card", "urgent_type": "phone"},
+    ],
+    "on_ack": [{"action": "admin_card", "with_image": False}],
+}
+
+
+class FakeAdminNotifier(FakeNotifier):
+    admin_ids = ["ou_1", "ou_2"]
+
+    def send_to_all_admins(self, title, content, image_path=None, urgent_type=None):
+        self.calls.append(f"admin_{urgent_type}")
+        return True
+
+    def get_p2p_chat_ids(self, user_ids):
+        return {uid: uid.replace("ou_", "oc_") for uid in user_ids}
+
+    def check_admin_replies(self, chat_ids, start_time_ts, incident_id=None):
+        assert list(chat_ids) == ["oc_1", "oc_2"]
+        return self.check_chat_reply(start_time_ts, incident_id)
+
+
+def test_admin_policy_sends_all_clear_after_ack():
+    notifier = FakeAdminNotifier(confirm_after=2)
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(notifier, None, policy=ADMIN_POLICY, scheduler=scheduler)
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        assert state.status == ACKED
+        deadline = time.time() + 1
+        while len(notifier.calls) < 2 and time.time() < deadline:
+            time.sleep(0.005)
+        assert notifier.calls == ["admin_sms", "admin_None"]
+    finally:
+        scheduler.shutdown()
+
+
+CONCURRENT_POLICY = dict(POLICY, dispatch="concurrent", stages=[
+    {"after": 0, "action": "group_card", "required": True, "hedge": {"after_ms": 50, "actions": ["sms"]}},
+    {"after": 0, "action": "buzz", "urgent_type": "sms"},
+    {"after": 0.15, "action": "sms"},
+])
+
+
+class SlowCardNotifier(FakeNotifier):
+    def __init__(self, card_delay, **kwargs):
+        super().__init__(**kwargs)
+        self.card_delay = card_delay
+
+    def send_card_to_group(self, title, content, image_path=None, on_send=None):
+        if on_send:
+            on_send()
+        time.sleep(self.card_delay)
+        return super().send_card_to_group(title, content, image_path)
+
+
+class TimedAliyun(FakeAliyun):
+    def __init__(self):
+        super().__init__()
+        self.sent_at = []
+
+    def send_sms_to_all(self, params=None):
+        self.sent_at.append(time.time())
+        return super().send_sms_to_all(params)
+
+
+def test_slow_card_hedges_to_sms_once():
+    notifier = SlowCardNotifier(card_delay=0.12)
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(notifier, TimedAliyun(), policy=CONCURRENT_POLICY, scheduler=scheduler)
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        assert state.status == TIMEOUT
+        # 卡片 50ms 未返回 -> 短信提前发出，到点不再重复发送
+        assert engine.aliyun.sent == 1
+        assert engine.aliyun.sent_at[0] - state.start_time < 0.11
+        assert state.hedged == (2,)
+        # 加急仍等卡片的消息 ID
+        assert notifier.calls == ["card", "buzz_sms"]
+    finally:
+        scheduler.shutdown()
+
+
+def test_fast_card_does_not_hedge():
+    notifier = FakeNotifier()
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(notifier, TimedAliyun(), policy=CONCURRENT_POLICY, scheduler=scheduler)
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        assert state.hedged == ()
+        assert engine.aliyun.sent_at[0] - state.start_time >= 0.15
+    finally:
+        scheduler.shutdown()
+
+
+def test_default_policy_hedges_slow_card_to_voice():
+    policy = config.ESCALATION_POLICY
+    hedge_after = policy["stages"][0]["hedge"]["after_ms"] / 1000
+    notifier, voice = SlowCardNotifier(card_delay=hedge_after + 0.3), FakeVoice()
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(notifier, FakeAliyun(), policy=policy, scheduler=scheduler, voice=voice)
+    try:
+        state = engine.start("fire.jpg")
+        deadline = time.time() + hedge_after + 3
+        while not state.hedged and time.time() < deadline:
+            time.sleep(0.05)
+        # 短信 0 秒已和卡片同时发出；卡片发送超过 after_ms 未返回 -> 语音电话提前打出，不等 180 秒
+        voice_idx = next(i for i, stage in enumerate(policy["stages"]) if stage["action"] == "voice")
+        assert state.hedged == (voice_idx,)
+        assert voice.calls == 1 and engine.aliyun.sent == 1
+        engine.acknowledge(state.incident_id)
+    finally:
+        scheduler.shutdown()
+
+
+class SlowUploadNotifier(FakeNotifier):
+    def send_card_to_group(self, title, content, image_path=None, on_send=None):
+        # 上传图片慢，发送本身很快
+        time.sleep(0.12)
+        return super().send_card_to_group(title, content, image_path, on_send)
+
+
+def test_slow_upload_does_not_hedge():
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(SlowUploadNotifier(), TimedAliyun(), policy=CONCURRENT_POLICY, scheduler=scheduler)
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        assert state.hedged == ()
+        assert engine.aliyun.sent == 1
+    finally:
+        scheduler.shutdown()
+
+
+def test_ack_cancels_queued_deliveries():
+    notifier = SlowCardNotifier(card_delay=0.1)
+    scheduler = TimerScheduler(max_workers=2)
+    policy = dict(CONCURRENT_POLICY, stages=CONCURRENT_POLICY["stages"][:2])
+    engine = EscalationEngine(notifier, FakeAliyun(), policy=policy, scheduler=scheduler)
+    try:
+        state = engine.start("fire.jpg")
+        time.sleep(0.03)
+        # 卡片还在发送中就被确认：等待卡片的加急不再发出
+        assert engine.acknowledge(state.incident_id)
+        time.sleep(0.2)
+        assert state.status == ACKED
+        assert notifier.calls == ["card"]
+    finally:
+        scheduler.shutdown()
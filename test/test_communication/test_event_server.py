@@ -0,0 +1,157 @@
+import asyncio
+import json
+import threading
+import time
+
+import requests
+
+from core.communication.event_server import (FeishuEventServer, encrypt_event, sign_event, decrypt_event)
+
+ENCRYPT_KEY = "test-encrypt-key"
+TOKEN = "test-verification-token"
+
+
+def make_message_event(chat_id, text, event_id="ev_1", sender_type="user"):
+    return {
+        "schema": "2.0",
+        "header": {"event_id": event_id, "event_type": "im.message.receive_v1", "token": TOKEN},
+        "event": {
+            "sender": {"sender_type": sender_type},
+            "message": {
+                "chat_id": chat_id,
+                "message_type": "text",
+                "create_time": str(int(time.time() * 1000)),
+                "content": json.dumps({"text": text}),
+            },
+        },
+    }
+
+
+def post_event(server, payload, encrypt=True):
+    """模拟飞书开放平台向回调地址推送事件"""
+    url = f"http://127.0.0.1:{server.port}/"
+    if not encrypt:
+        return requests.post(url, json=payload)
+    body = json.dumps({"encrypt": encrypt_event(ENCRYPT_KEY, payload)}).encode("utf-8")
+    timestamp, nonce = str(int(time.time())), "nonce"
+    headers = {
+        "Content-Type": "application/json",
+        "X-Lark-Request-Timestamp": timestamp,
+        "X-Lark-Request-Nonce": nonce,
+        "X-Lark-Signature": sign_event(ENCRYPT_KEY, timestamp, nonce, body),
+    }
+    return requests.post(url, data=body, headers=headers)
+
+
+def start_server():
+    return FeishuEventServer(host="127.0.0.1", port=0, encrypt_key=ENCRYPT_KEY,
+                             verification_token=TOKEN).start()
+
+
+def test_encrypt_roundtrip():
+    payload = {"hello": "世界"}
+    assert decrypt_event(ENCRYPT_KEY, encrypt_event(ENCRYPT_KEY, payload)) == payload
+
+
+def test_url_verification_challenge():
+    server = start_server()
+    try:
+        resp = post_event(server, {"type": "url_verification", "token": TOKEN, "challenge": "abc"})
+        assert resp.json() == {"challenge": "abc"}
+    finally:
+        server.stop()
+
+
+def test_confirm_reply_wakes_waiter():
+    server = start_server()
+    try:
+        waiter = server.registry.register("incident-1", ["oc_group"], time.time())
+        threading.Timer(0.05, post_event, args=(server, make_message_event("oc_group", "收到"))).start()
+        started = time.monotonic()
+        assert waiter.wait(5) is True
+        assert time.monotonic() - started < 1
+    finally:
+        server.stop()
+
+
+def test_async_waiter():
+    server = start_server()
+    try:
+        waiter = server.registry.register("incident-2", ["oc_group"], time.time())
+
+        async def _wait():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, lambda: threading.Thread(
+                target=post_event, args=(server, make_message_event("oc_group", "1"))).start())
+            return await waiter.wait_async(5)
+
+        assert asyncio.run(_wait()) is True
+    finally:
+        server.stop()
+
+
+def test_ignores_bot_other_chat_and_bad_signature():
+    server = start_server()
+    try:
+        waiter = server.registry.register("incident-3", ["oc_group"], time.time())
+        post_event(server, make_message_event("oc_group", "1", event_id="e1", sender_type="app"))
+        post_event(server, make_message_event("oc_other", "1", event_id="e2"))
+        post_event(server, make_message_event("oc_group", "火好大", event_id="e3"))
+
+        body = json.dumps({"encrypt": encrypt_event(ENCRYPT_KEY, make_message_event("oc_group", "1", "e4"))})
+        resp = requests.post(f"http://127.0.0.1:{server.port}/", data=body,
+                             headers={"X-Lark-Signature": "forged", "X-Lark-Request-Timestamp": "1",
+                                      "X-Lark-Request-Nonce": "n"})
+        assert resp.status_code == 401
+
+        bad_token = make_message_event("oc_group", "1", "e5")
+        bad_token["header"]["token"] = "wrong"
+        assert post_event(server, bad_token).status_code == 401
+
+        assert waiter.wait(0.2) is False
+    finally:
+        server.stop()
+
+
+def test_rejects_plaintext_and_unauthenticated_pushes():
+    server = start_server()
+    try:
+        waiter = server.registry.register("incident-4", ["oc_group"], time.time())
+        # 配置了 Encrypt Key：明文推送即使带着正确的 token 也拒绝
+        assert post_event(server, make_message_event("oc_group", "1", "p1"), encrypt=False).status_code == 401
+        # 没有签名头的加密推送：还要校验 token
+        body = json.dumps({"encrypt": encrypt_event(ENCRYPT_KEY, make_message_event("oc_group", "1", "p2"))})
+        forged = make_message_event("oc_group", "1", "p3")
+        forged["header"]["token"] = None
+        forged_body = json.dumps({"encrypt": encrypt_event(ENCRYPT_KEY, forged)})
+        assert requests.post(f"http://127.0.0.1:{server.port}/", data=forged_body).status_code == 401
+        assert waiter.wait(0.1) is False
+        assert requests.post(f"http://127.0.0.1:{server.port}/", data=body).status_code == 200
+        assert waiter.wait(1) is True
+    finally:
+        server.stop()
+
+
+def test_without_any_secret_everything_is_rejected():
+    server = FeishuEventServer(port=0, encrypt_key="", verification_token="").start()
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+        waiter = server.registry.register("incident-5", ["oc_group"], time.time())
+        event = make_message_event("oc_group", "1")
+        assert post_event(server, event, encrypt=False).status_code == 401
+        assert waiter.wait(0.1) is False
+    finally:
+        server.stop()
+
+
+def test_token_only_server_accepts_matching_plaintext():
+    server = FeishuEventServer(port=0, encrypt_key="", verification_token=TOKEN).start()
+    try:
+        waiter = server.registry.register("incident-6", ["oc_group"], time.time())
+        wrong = make_message_event("oc_group", "1", "t1")
+        wrong["header"]["token"] = TOKEN + "x"
+        assert post_event(server, wrong, encrypt=False).status_code == 401
+        assert post_event(server, make_message_event("oc_group", "1", "t2"), encrypt=False).status_code == 200
+        assert waiter.wait(1) is True
+    finally:
+        server.stop()
@@ -0,0 +1,55 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.communication import http_session
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_GET(self):
+        body = b'{"code": 0}'
+        self._send_headers(len(body))
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._send_headers(0)
+
+    def _send_headers(self, length):
+        CountingHandler.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_requests_reuse_pooled_connection():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/ping"
+    try:
+        http_session.close()
+        CountingHandler.connections.clear()
+        for _ in range(5):
+            assert http_session.get(url).json() == {"code": 0}
+        # 5 次请求只建立了 1 条 TCP 连接
+        assert len(CountingHandler.connections) == 1
+    finally:
+        http_session.close()
+        server.shutdown()
+
+
+def test_prewarm_opens_connections():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    try:
+        http_session.close()
+        assert http_session.prewarm(url, connections=2) == 2
+    finally:
+        http_session.close()
+        server.shutdown()
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from core.communication import image_pipeline
+from core.communication.image_pipeline import ImagePipeline
+
+
+class FakeUploader:
+    def __init__(self, delay=0.0, fail_first=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail_first = fail_first
+        self._lock = threading.Lock()
+
+    def __call__(self, data):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.delay)
+        if self.fail_first and calls == 1:
+            return None
+        return f"img_{calls}"
+
+
+def test_same_content_uploaded_once(tmp_path):
+    a, b = tmp_path / "a.jpg", tmp_path / "b.jpg"
+    a.write_bytes(b"fire-frame")
+    b.write_bytes(b"fire-frame")  # 不同路径、相同内容
+    uploader = FakeUploader()
+    pipeline = ImagePipeline(uploader)
+
+    assert pipeline.get_image_key(a) == "img_1"
+    assert pipeline.get_image_key(a) == "img_1"
+    assert pipeline.get_image_key(b) == "img_1"
+    assert uploader.calls == 1
+
+
+def test_concurrent_prefetch_shares_one_upload(tmp_path):
+    path = tmp_path / "fire.jpg"
+    path.write_bytes(b"frame")
+    uploader = FakeUploader(delay=0.05)
+    pipeline = ImagePipeline(uploader)
+
+    futures = [pipeline.prefetch(path) for _ in range(5)]
+    assert {pipeline.result(f) for f in futures} == {"img_1"}
+    assert uploader.calls == 1
+
+
+def test_failed_upload_is_retried(tmp_path):
+    path = tmp_path / "fire.jpg"
+    path.write_bytes(b"frame")
+    uploader = FakeUploader(fail_first=True)
+    pipeline = ImagePipeline(uploader)
+
+    assert pipeline.get_image_key(path) is None
+    assert pipeline.get_image_key(path) == "img_2"
+
+
+def test_missing_file_returns_none(tmp_path):
+    pipeline = ImagePipeline(FakeUploader())
+    assert pipeline.get_image_key(tmp_path / "missing.jpg") is None
+
+
+def test_missing_pillow_warns_once(monkeypatch):
+    monkeypatch.setattr(image_pipeline, "Image", None)
+    monkeypatch.setattr(image_pipeline, "_pillow_warned", threading.Event())
+    warnings = []
+    monkeypatch.setattr(image_pipeline.logger, "warning", warnings.append)
+    assert image_pipeline.compress_image(b"raw") == b"raw"
+    assert image_pipeline.compress_image(b"raw") == b"raw"
+    assert len(warnings) == 1
@@ -0,0 +1,125 @@
+import time
+
+from core.communication.escalation import EscalationEngine, ACKED, STALE, TIMEOUT
+from core.communication.journal import IncidentJournal, START, STAGE, FINISH
+from core.communication.scheduler import TimerScheduler
+from test_communication.fakes import POLICY, FakeNotifier, FakeAliyun
+from utils import metrics
+
+
+def test_replay_returns_latest_state_of_open_incidents(tmp_path):
+    journal = IncidentJournal(tmp_path / "incidents.db")
+    journal.record("a", START, image_path="a.jpg", start_time=100.0, source="cam-0")
+    journal.record("a", STAGE, stage_idx=1, msg_id="om_1", chat_ids=["oc_group"])
+    journal.record("a", STAGE, stage_idx=3, msg_id="om_1", chat_ids=["oc_group"])
+    journal.record("b", START, image_path="b.jpg", start_time=101.0, source="cam-1")
+    journal.record("b", FINISH, status=ACKED)
+    journal.close()
+
+    # 重新打开 (模拟进程重启)
+    journal = IncidentJournal(tmp_path / "incidents.db")
+    try:
+        incidents = journal.open_incidents()
+        assert len(incidents) == 1
+        assert incidents[0]["incident_id"] == "a"
+        assert incidents[0]["stage_idx"] == 3
+        assert incidents[0]["chat_ids"] == ["oc_group"]
+        assert incidents[0]["source"] == "cam-0"
+        # 已结束的报警被清理掉
+        assert journal.compact() == 2
+        assert [i["incident_id"] for i in journal.open_incidents()] == ["a"]
+    finally:
+        journal.close()
+
+
+def test_record_is_cheap(tmp_path):
+    journal = IncidentJournal(tmp_path / "incidents.db")
+    try:
+        n = 2000
+        begin = time.perf_counter()
+        for i in range(n):
+            journal.record(f"alarm-{i % 50}", STAGE, stage_idx=i % 4, msg_id="om_1", chat_ids=["oc_group"])
+        per_call = (time.perf_counter() - begin) / n
+        assert journal.flush()
+        # 调用方只付入队的开销，落盘由后台线程成批完成
+        assert per_call < 300e-6
+    finally:
+        journal.close()
+
+
+def test_engine_resumes_remaining_stages_after_restart(tmp_path):
+    path = tmp_path / "incidents.db"
+    # 第一次运行：群卡片、短信、短信加急已完成，进程在电话加急前崩溃
+    journal = IncidentJournal(path)
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(FakeNotifier(), FakeAliyun(), policy=dict(POLICY, ack_timeout=0.5),
+                              scheduler=scheduler, journal=journal)
+    state = engine.start("fire.jpg", source="cam-0")
+    deadline = time.time() + 1
+    while state.stage_idx < 3 and time.time() < deadline:
+        time.sleep(0.005)
+    scheduler.shutdown(wait=False)
+    journal.close()
+
+    # 重启：只执行剩下的电话加急，不重复发卡片 / 短信
+    journal = IncidentJournal(path)
+    scheduler = TimerScheduler(max_workers=2)
+    notifier = FakeNotifier()
+    engine = EscalationEngine(notifier, FakeAliyun(), policy=dict(POLICY, ack_timeout=0.5),
+                              scheduler=scheduler, journal=journal)
+    try:
+        resumed = engine.resume()
+        assert [s.incident_id for s in resumed] == [state.incident_id]
+        assert resumed[0].start_time == state.start_time
+        # 同一摄像头再次检测到火，合并到恢复的报警而不是从头再报
+        assert engine.start("fire2.jpg", source="cam-0") is resumed[0]
+        assert engine.wait(resumed[0], timeout=2)
+        assert resumed[0].status == TIMEOUT
+        assert notifier.calls == ["buzz_phone"]
+        assert engine.aliyun.sent == 0
+        assert notifier.polls >= 1
+        assert journal.open_incidents() == []
+    finally:
+        scheduler.shutdown()
+        journal.close()
+
+
+def test_stale_incidents_are_not_resumed(tmp_path):
+    journal = IncidentJournal(tmp_path / "incidents.db")
+    journal.record("old", START, image_path="old.jpg", start_time=time.time() - 3 * 86400, source="cam-0")
+    journal.record("old", STAGE, stage_idx=1, msg_id="om_1", chat_ids=["oc_group"])
+    journal.record("new", START, image_path="new.jpg", start_time=time.time() - 10, source="cam-1")
+    scheduler = TimerScheduler(max_workers=2)
+    notifier = FakeNotifier(confirm_after=1)
+    engine = EscalationEngine(notifier, FakeAliyun(), policy=POLICY, scheduler=scheduler, journal=journal,
+                              resume_max_age=3600)
+    stale_before = metrics.get_registry().counter_value("alarm_incidents_total", status=STALE)
+    try:
+        resumed = engine.resume()
+        # 三天前的报警直接记为 stale 结束，不会在重启时再通知所有人
+        assert [s.incident_id for s in resumed] == ["new"]
+        assert [i["incident_id"] for i in journal.open_incidents()] == ["new"]
+        assert metrics.get_registry().counter_value("alarm_incidents_total", status=STALE) == stale_before + 1
+        assert engine.wait(resumed[0], timeout=2)
+        assert resumed[0].status == ACKED
+    finally:
+        scheduler.shutdown()
+        journal.close()
+
+
+def test_finished_incidents_are_compacted_periodically(tmp_path):
+    journal = IncidentJournal(tmp_path / "incidents.db", compact_every=3)
+    try:
+        for i in range(7):
+            journal.record(f"a{i}", START, image_path=None, start_time=time.time())
+            journal.record(f"a{i}", FINISH, status=ACKED)
+            journal.flush()
+        journal.record("open", START, image_path=None, start_time=time.time())
+        journal.flush()
+        with journal._db_lock:
+            left = journal._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        # 第 3、6 个报警结束后各清理一次，只剩第 7 个报警的两条记录和进行中的报警
+        assert left == 3
+        assert [i["incident_id"] for i in journal.open_incidents()] == ["open"]
+    finally:
+        journal.close()
@@ -0,0 +1,95 @@
+from benchmark.bench_alarm import bench_policy, make_images, mock_environment, run_benchmark
+from benchmark.mock_server import MockServer
+from core.communication.aliyun import AliyunNotifier, AliyunVoiceNotifier
+from core.communication.communication import Communication
+from core.communication.escalation import ACKED, FAILED, TIMEOUT
+from core.communication.feishu import FeishuNotifier
+
+
+def test_full_escalation_against_mock_server():
+    with MockServer(ack_after=0.05) as server:
+        with mock_environment(server, admins=2, sms_phones=3) as workdir:
+            comm = Communication(policy=bench_policy(ack_timeout=1.0, poll_interval=0.05))
+            assert len(comm.notifier.admin_ids) == 2
+            state = comm.start_fire_alarm(make_images(workdir, 1)[0])
+            assert comm.escalation.wait(state, timeout=5)
+
+            assert state.status == ACKED
+            assert server.counts["send_message"] == 1
+            assert server.counts["urgent_sms"] == 1
+            assert "urgent_phone" not in server.counts
+            assert sum(server.sms_recipients.values()) == 3
+
+
+def test_throttling_and_errors_are_surfaced():
+    with MockServer(throttle_rps=1) as server:
+        with mock_environment(server, sms_phones=2):
+            aliyun = AliyunNotifier()
+            aliyun.fanout._sleep = lambda s: None
+            result = [aliyun.send_sms_to_all() for _ in range(3)]
+            # 第一条放行，之后被限流；重试次数用完仍然失败
+            assert result[0] is True and result[-1] is False
+            assert server.counts["aliyun_SendSms"] > 3
+
+    with MockServer(error_rate=1.0) as server:
+        with mock_environment(server):
+            notifier = FeishuNotifier()
+            assert notifier.send_card_to_group("t", "c") is None
+            comm = Communication(policy=bench_policy(ack_timeout=0.5, poll_interval=0.05))
+            state = comm.start_fire_alarm(None)
+            assert comm.escalation.wait(state, timeout=5)
+            assert state.status == FAILED
+
+
+def test_benchmark_report_runs_offline():
+    report = run_benchmark(incidents=3, latency=0.001, jitter=0, ack_after=0.05, ack_timeout=0.5,
+                           poll_interval=0.05)
+    assert report["escalation"]["status"] == {ACKED: 3}
+    assert report["escalation"]["time_to_ack"]["count"] == 3
+    assert report["feishu"]["failed"] == 0 and report["aliyun"]["failed"] == 0
+    assert report["requests_per_incident"]["send_message"] == 1
+    assert any(key.startswith("alarm_stage") for key in report["stages"])
+
+
+def test_voice_calls_and_status_polling():
+    with MockServer(voice_after=0.05) as server:
+        with mock_environment(server, sms_phones=5):
+            voice = AliyunVoiceNotifier(max_workers=2)
+            voice.poll_interval = 0.02
+            batch = voice.call_all({"time": "12:00"})
+            assert batch.ok and not batch.failed
+            assert batch.finished.wait(2)
+            assert sorted(batch.answered) == sorted(voice.phone_numbers)
+            assert sum(server.voice_recipients.values()) == 5
+            # 每轮只查询还没出结果的电话
+            assert server.counts["aliyun_QueryCallDetailByCallId"] <= 5 * 4
+
+
+def test_voice_status_queries_are_bounded_per_round():
+    with MockServer(voice_after=0.2) as server:
+        with mock_environment(server, sms_phones=5):
+            voice = AliyunVoiceNotifier(max_workers=2)
+            voice.poll_interval = 0.02
+            voice.query_per_round = 2
+            rounds = []
+            query_states = voice.query_states
+            voice.query_states = lambda calls: (rounds.append([c.phone for c in calls]), query_states(calls))
+            batch = voice.call_all({"time": "12:00"})
+            assert batch.finished.wait(2)
+            assert sorted(batch.answered) == sorted(voice.phone_numbers)
+            assert max(len(r) for r in rounds) == 2
+            assert server.counts["aliyun_QueryCallDetailByCallId"] == sum(len(r) for r in rounds)
+            # 前几轮轮流覆盖所有号码，而不是反复查前两个
+            assert {phone for r in rounds[:3] for phone in r} == set(voice.phone_numbers)
+
+
+def test_voice_stage_in_escalation():
+    with MockServer() as server:
+        with mock_environment(server, sms_phones=2):
+            comm = Communication(policy=bench_policy(ack_timeout=0.3, poll_interval=0.05))
+            state = comm.start_fire_alarm(None)
+            assert comm.escalation.wait(state, timeout=5)
+            assert state.status == TIMEOUT
+            # 无人确认：飞书电话加急 + 阿里云语音电话都发出
+            assert server.counts["urgent_phone"] == 1
+            assert sum(server.voice_recipients.values()) == 2
@@ -0,0 +1,68 @@
+import time
+
+import core.communication.feishu as feishu_module
+from config import EnvSnapshot
+from core.communication.feishu import FeishuNotifier
+from core.communication.open_id_cache import OpenIdCache
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def make_notifier(tmp_path, monkeypatch, phones):
+    notifier = FeishuNotifier()
+    notifier.app_id, notifier.app_secret = "cli_test", "secret"
+    notifier.env = EnvSnapshot({f"admin_phone{i}": p for i, p in enumerate(phones)})
+    monkeypatch.setattr(notifier, "_get_tenant_access_token", lambda: "token")
+    monkeypatch.setattr(feishu_module, "OpenIdCache", lambda app_id: OpenIdCache(app_id, cache_dir=tmp_path))
+    return notifier
+
+
+def fake_batch_get_id(requests_seen):
+    def _post(url, json=None, **kwargs):
+        requests_seen.append(json["mobiles"])
+        users = [{"mobile": m.lstrip("+"), "user_id": f"ou_{m[-4:]}"} for m in json["mobiles"]]
+        return FakeResponse({"code": 0, "data": {"user_list": users}})
+    return _post
+
+
+def test_admins_resolved_in_chunked_batches(tmp_path, monkeypatch):
+    phones = [f"+86138000{i:05d}" for i in range(60)]
+    notifier = make_notifier(tmp_path, monkeypatch, phones)
+    seen = []
+    monkeypatch.setattr(feishu_module.http_session, "post", fake_batch_get_id(seen))
+
+    notifier._auto_load_admins()
+
+    assert [len(chunk) for chunk in seen] == [50, 10]
+    assert len(notifier.admin_ids) == 60
+
+
+def test_restart_uses_disk_cache_without_network(tmp_path, monkeypatch):
+    phones = ["+8613800000001", "+8613800000002"]
+    notifier = make_notifier(tmp_path, monkeypatch, phones)
+    seen = []
+    monkeypatch.setattr(feishu_module.http_session, "post", fake_batch_get_id(seen))
+    notifier._auto_load_admins()
+    assert len(seen) == 1
+
+    # 模拟重启：新的实例直接从磁盘读到管理员
+    restarted = make_notifier(tmp_path, monkeypatch, phones)
+    restarted._auto_load_admins()
+    assert restarted.admin_ids == notifier.admin_ids
+    assert len(seen) == 1
+
+
+def test_stale_entries_used_then_refreshed(tmp_path):
+    cache = OpenIdCache("cli_test", cache_dir=tmp_path, ttl=60)
+    cache.update({"13800000001": "ou_old"})
+    cache._entries["+13800000001"]["ts"] = time.time() - 120
+
+    assert cache.lookup("+13800000001") == ("ou_old", False)
+    cache.update({"+13800000001": "ou_new"})
+    assert OpenIdCache("cli_test", cache_dir=tmp_path).lookup("13800000001") == ("ou_new", True)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import config
+from benchmark.replay import (fake_notifiers, memory_growth, read_trace, replay_policy, run_replay,
+                              synthetic_trace, video_events, write_trace)
+from core.yolo.capture import SyntheticSource
+from core.yolo.inference import BatchInferenceEngine
+from core.yolo.tracker import TrackerConfig
+from test_yolo.fakes import IMGSZ, FakeBackend
+
+FIRE = [100, 100, 200, 200, 0.9, 0]
+
+
+def fire_episode(camera_id, start, frames, box=FIRE, fps=10):
+    return [(seq / fps, camera_id, seq, [box]) for seq in range(start, start + frames)]
+
+
+def test_trace_round_trip(tmp_path):
+    events = list(synthetic_trace(cameras=2, duration=5, fps=10, fires_per_hour=3600, seed=3))
+    assert events == list(synthetic_trace(cameras=2, duration=5, fps=10, fires_per_hour=3600, seed=3))
+    path = tmp_path / "trace.jsonl"
+    assert write_trace(events, path) == len(events) == 100
+
+    loaded = list(read_trace(path))
+    assert [(t, cid, seq) for t, cid, seq, _ in loaded] == [(t, cid, seq) for t, cid, seq, _ in events]
+    for (_, _, _, got), (_, _, _, want) in zip(loaded, events):
+        np.testing.assert_allclose(np.asarray(got, dtype=np.float32).reshape(-1, 6),
+                                   np.asarray(want, dtype=np.float32).reshape(-1, 6), atol=1e-3)
+
+
+def test_policy_compresses_human_time_only():
+    policy = replay_policy(10)
+    base = config.ESCALATION_POLICY
+    assert policy["ack_timeout"] == base["ack_timeout"] / 10
+    assert policy["poll_interval"] == base["poll_interval"] / 10
+    assert [s["after"] for s in policy["stages"]] == [s.get("after", 0) / 10 for s in base["stages"]]
+    assert policy["stages"][0]["hedge"] == base["stages"][0]["hedge"]
+    assert base["stages"][-1]["after"] == 180
+
+
+def test_fake_notifiers_share_call_counts():
+    calls, feishu, aliyun, voice = fake_notifiers(ack_after=0)
+    assert feishu.send_card_to_group("t", "c") == "om_replay_1"
+    assert aliyun.send_sms_to_all() and voice.call_all().ok
+    assert feishu.check_chat_reply(0)
+    assert calls == {"send_card": 1, "sms": 1, "voice": 1, "check_reply": 1}
+
+
+def test_replay_raises_one_alarm_per_fire_and_coalesces_second_track():
+    # cam0：一次持续的火情，之后同一画面另一处又出现火 (报警仍在进行，合并)；cam1：只有单帧误检
+    events = sorted(fire_episode("cam0", 0, 10) + fire_episode("cam0", 12, 6, box=[400, 300, 480, 380, 0.9, 0])
+                    + [(0.5, "cam1", 5, [FIRE])], key=lambda e: e[0])
+    report = run_replay(events, speed=100, ack_after=30, tracker_config=TrackerConfig(confirm_hits=3),
+                        sample_interval=0.05)
+    assert report["drained"]
+    assert report["replay"]["events"] == len(events)
+    assert report["alarms"]["confirmed_by_tracker"] == 2
+    assert (report["alarms"]["raised"], report["alarms"]["coalesced"]) == (1, 1)
+    assert report["escalation"] == {"acked": 1}
+    assert report["requests"]["send_card"] == 1
+    assert "voice" not in report["requests"]
+    assert report["scheduler"]["fired"] >= 1
+    assert report["memory"]["peak_mb"] > 0
+
+
+def test_unacked_alarm_escalates_to_voice():
+    report = run_replay(fire_episode("cam0", 0, 5), speed=100, ack_after=None, sample_interval=0.05)
+    assert report["escalation"] == {"timeout": 1}
+    assert report["requests"]["voice"] == 1
+    assert report["requests"]["urgent_phone"] == 1
+
+
+def test_video_frames_are_detected_in_batches():
+    sources = {f"cam{i}": SyntheticSource(fps=0, seed=i) for i in range(2)}
+    with BatchInferenceEngine(FakeBackend(), max_batch=2, max_delay_ms=50, imgsz=IMGSZ) as engine:
+        events = video_events(sources, engine, frame_shape=(IMGSZ, IMGSZ, 3), fps=10)
+        first = [next(events) for _ in range(6)]
+        events.close()
+    assert [(t, cid, seq) for t, cid, seq, _ in first] == [
+        (0.0, "cam0", 0), (0.0, "cam1", 0), (0.1, "cam0", 1), (0.1, "cam1", 1), (0.2, "cam0", 2), (0.2, "cam1", 2)]
+    assert first[0][3].shape[1] == 6
+
+
+def test_memory_growth_slope():
+    samples = [{"t": t, "rss_mb": 100 + t / 60} for t in range(0, 600, 10)]
+    growth = memory_growth(samples)
+    assert growth["start_mb"] == 100 and growth["peak_mb"] == pytest.approx(109.83, abs=0.01)
+    assert growth["slope_mb_per_min"] == pytest.approx(1.0)
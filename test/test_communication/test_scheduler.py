@@ -0,0 +1,38 @@
+import threading
+import time
+
+from core.communication.scheduler import TimerScheduler
+
+
+def test_cancel_after_fire_does_not_leak():
+    scheduler = TimerScheduler(max_workers=1, io_workers=1)
+    fired = threading.Event()
+    try:
+        handle = scheduler.call_later(0, fired.set)
+        assert fired.wait(1)
+        # 已经执行过的句柄：取消无效，也不影响 pending 计数
+        assert scheduler.cancel(handle) is False
+        later = scheduler.call_later(60, fired.set)
+        assert scheduler.pending() == 1
+        assert scheduler.cancel(later) is True
+        assert scheduler.cancel(later) is False
+        assert scheduler.pending() == 0
+        assert scheduler.stats()["pending"] == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_blocking_io_does_not_delay_timer_callbacks():
+    scheduler = TimerScheduler(max_workers=1, io_workers=2)
+    release = threading.Event()
+    fired = threading.Event()
+    try:
+        # 两个阻塞在网络上的任务占满 I/O 线程池
+        for _ in range(2):
+            scheduler.call_later(0, release.wait, 5, io=True)
+        time.sleep(0.05)
+        scheduler.call_later(0, fired.set)
+        assert fired.wait(1)
+    finally:
+        release.set()
+        scheduler.shutdown()
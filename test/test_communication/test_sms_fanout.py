@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+
+from core.communication.sms_fanout import SmsFanout
+
+
+class Body:
+    def __init__(self, code, biz_id="biz"):
+        self.code = code
+        self.message = code
+        self.biz_id = biz_id
+
+
+class Resp:
+    def __init__(self, code):
+        self.body = Body(code)
+
+
+class FakeClient:
+    """按号码决定返回码；throttle_once 里的号码第一次返回限流"""
+
+    def __init__(self, bad=(), throttle_once=()):
+        self.bad = set(bad)
+        self.throttle_once = set(throttle_once)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def send_sms_with_options(self, request, runtime):
+        phones = request.phone_numbers.split(",")
+        return self._respond(phones)
+
+    def send_batch_sms_with_options(self, request, runtime):
+        phones = json.loads(request.phone_number_json)
+        params = json.loads(request.template_param_json)
+        assert len(params) == len(phones)
+        return self._respond(phones, params)
+
+    async def send_sms_with_options_async(self, request, runtime):
+        return self.send_sms_with_options(request, runtime)
+
+    async def send_batch_sms_with_options_async(self, request, runtime):
+        return self.send_batch_sms_with_options(request, runtime)
+
+    def _respond(self, phones, params=None):
+        with self._lock:
+            self.requests.append((phones, params))
+            if self.bad & set(phones):
+                return Resp("isv.MOBILE_NUMBER_ILLEGAL")
+            throttled = self.throttle_once & set(phones)
+            if throttled:
+                self.throttle_once -= throttled
+                return Resp("isv.BUSINESS_LIMIT_CONTROL")
+            return Resp("OK")
+
+
+def make_fanout(client, **kwargs):
+    fanout = SmsFanout(client, "签名", "SMS_1", **kwargs)
+    fanout._sleep = lambda s: None
+    return fanout
+
+
+def test_chunks_sent_concurrently_with_per_number_result():
+    client = FakeClient()
+    phones = [f"138{i:08d}" for i in range(25)]
+    result = make_fanout(client, chunk_size=10).send(phones, {"time": "12:00"})
+
+    assert sorted(len(r[0]) for r in client.requests) == [5, 10, 10]
+    assert result.ok and len(result) == 25
+    assert result[phones[0]].attempts == 1
+
+
+def test_only_failed_chunk_is_retried():
+    client = FakeClient(throttle_once={"13800000015"})
+    phones = [f"138{i:08d}" for i in range(20)]
+    result = make_fanout(client, chunk_size=10).send(phones)
+
+    assert result.ok
+    assert len(client.requests) == 3
+    assert result["13800000015"].attempts == 2
+    assert result["13800000001"].attempts == 1
+
+
+def test_non_retryable_error_fails_only_its_chunk():
+    client = FakeClient(bad={"13800000003"})
+    phones = [f"138{i:08d}" for i in range(20)]
+    result = make_fanout(client, chunk_size=10).send(phones)
+
+    assert not result.ok
+    assert len(result.failed) == 10 and len(result.succeeded) == 10
+    assert result["13800000003"].code == "isv.MOBILE_NUMBER_ILLEGAL"
+    assert len(client.requests) == 2
+
+
+def test_per_number_params_use_batch_api():
+    client = FakeClient()
+    params = {"13800000001": {"name": "张三"}, "13800000002": {"name": "李四"}}
+    result = make_fanout(client).send(list(params), per_number_params=params)
+
+    assert result.ok
+    phones, sent_params = client.requests[0]
+    assert sent_params == [params[p] for p in phones]
+
+
+def test_async_send_uses_sdk_async_api_and_retries():
+    client = FakeClient(throttle_once={"13800000015"}, bad={"13800000003"})
+    phones = [f"138{i:08d}" for i in range(25)]
+    result = asyncio.run(make_fanout(client, chunk_size=10, backoff_base=0.001).send_async(phones))
+
+    assert len(result) == 25
+    assert result["13800000015"].attempts == 2
+    assert len(result.failed) == 10 and result["13800000003"].code == "isv.MOBILE_NUMBER_ILLEGAL"
+    assert len(client.requests) == 4
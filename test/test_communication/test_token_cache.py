@@ -0,0 +1,70 @@
+import threading
+
+from core.communication.token_cache import TenantTokenCache
+
+
+class FakeTokenCache(TenantTokenCache):
+    """不走网络，只记录请求次数"""
+
+    def __init__(self, expire=7200):
+        super().__init__("app_id", "app_secret")
+        self.expire = expire
+        self.calls = 0
+
+    def _request_token(self):
+        self.calls += 1
+        return f"token-{self.calls}", self.expire
+
+
+def test_token_reused_until_expire():
+    cache = FakeTokenCache()
+    try:
+        tokens = [cache.get() for _ in range(20)]
+        assert tokens == ["token-1"] * 20
+        assert cache.calls == 1
+    finally:
+        cache.close()
+
+
+def test_token_refreshed_when_close_to_expire():
+    # expire 小于安全余量，每次都应该视为过期
+    cache = FakeTokenCache(expire=TenantTokenCache.EXPIRE_SAFETY_SECONDS)
+    try:
+        assert cache.get() == "token-1"
+        assert cache.get() == "token-2"
+    finally:
+        cache.close()
+
+
+def test_force_refresh_and_invalidate():
+    cache = FakeTokenCache()
+    try:
+        cache.get()
+        assert cache.get(force_refresh=True) == "token-2"
+        cache.invalidate()
+        assert cache.get() == "token-3"
+    finally:
+        cache.close()
+
+
+def test_concurrent_get_only_fetches_once():
+    cache = FakeTokenCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(16)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert set(results) == {"token-1"}
+        assert cache.calls == 1
+    finally:
+        cache.close()
+
+
+def test_shared_instance_per_app():
+    a = TenantTokenCache.shared("app_x", "secret_x")
+    b = TenantTokenCache.shared("app_x", "secret_x")
+    c = TenantTokenCache.shared("app_y", "secret_y")
+    assert a is b
+    assert a is not c
@@ -0,0 +1,189 @@
+import time
+
+import pytest
+import requests
+
+import config
+
+from benchmark.bench_alarm import mock_environment
+from benchmark.mock_server import MockServer
+from core.communication import http_session
+from core.communication.aliyun import AliyunNotifier, AliyunVoiceNotifier
+from core.communication.escalation import EscalationEngine, EscalationState, FAILED, TIMEOUT
+from core.communication.feishu import FeishuNotifier
+from core.communication.scheduler import TimerScheduler
+from core.communication.watchdog import HealthWatchdog, FEISHU, ALIYUN_SMS, ALIYUN_VOICE, api_call, report
+from test_communication.fakes import FakeNotifier, FakeAliyun, FakeVoice
+
+
+def test_rolling_health_marks_and_recovers_degraded_channel():
+    watchdog = HealthWatchdog(interval=60, window=4)
+    results = iter([True, False, False, True, True, True, True])
+    watchdog.add_channel(FEISHU, lambda: next(results))
+
+    watchdog.probe_all()
+    assert watchdog.is_healthy(FEISHU)
+    watchdog.probe_all()
+    watchdog.probe_all()
+    # 连续两次失败 -> 降级
+    assert not watchdog.is_healthy(FEISHU)
+    assert not watchdog.action_healthy("group_card")
+    assert watchdog.action_healthy("sms")
+    for _ in range(4):
+        watchdog.probe_all()
+    assert watchdog.is_healthy(FEISHU)
+    assert watchdog.snapshot()[FEISHU]["success_rate"] == 1.0
+
+
+def test_probe_exception_counts_as_failure():
+    watchdog = HealthWatchdog(interval=60)
+
+    def broken():
+        raise ConnectionError("dns")
+
+    watchdog.add_channel(ALIYUN_SMS, broken)
+    assert watchdog.probe(ALIYUN_SMS, broken) is False
+    assert "dns" in watchdog.snapshot()[ALIYUN_SMS]["last_error"]
+
+
+def test_probes_against_mock_server():
+    with MockServer() as server:
+        with mock_environment(server):
+            watchdog = HealthWatchdog(interval=0.05)
+            watchdog.add_notifiers(FeishuNotifier(), AliyunNotifier(), AliyunVoiceNotifier())
+            watchdog.start()
+            try:
+                time.sleep(0.2)
+                assert all(h["healthy"] for h in watchdog.snapshot().values())
+                assert server.counts["bot_info"] >= 2
+                assert server.counts["aliyun_QuerySmsSign"] >= 2
+            finally:
+                watchdog.stop()
+
+
+def test_api_calls_are_reported_per_call():
+    watchdog = HealthWatchdog(interval=60).add_channel(FEISHU).add_channel(ALIYUN_SMS)
+    # 没启动的看门狗不接收上报
+    report(ALIYUN_SMS, False, 0.01)
+    assert watchdog.snapshot()[ALIYUN_SMS]["consecutive_failures"] == 0
+
+    watchdog.start()
+    try:
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                with api_call(ALIYUN_SMS):
+                    raise ConnectionError("reset")
+        assert not watchdog.is_healthy(ALIYUN_SMS)
+        assert "reset" in watchdog.snapshot()[ALIYUN_SMS]["last_error"]
+
+        with MockServer(error_rate=1.0) as server:
+            for _ in range(2):
+                assert http_session.get(f"{server.feishu_api_base}/bot/v3/info", op="probe").status_code == 500
+        assert not watchdog.is_healthy(FEISHU)
+        with MockServer() as server:
+            for _ in range(4):
+                http_session.get(f"{server.feishu_api_base}/bot/v3/info", op="probe")
+            # 上传大图只计成败，30 秒的读取超时不算进渠道平均耗时
+            latency = watchdog.snapshot()[FEISHU]["latency_ms"]
+            report(FEISHU, True, None)
+            assert watchdog.snapshot()[FEISHU]["latency_ms"] == latency
+        assert watchdog.is_healthy(FEISHU)
+        with pytest.raises(requests.ConnectionError):
+            http_session.get("http://127.0.0.1:1/bot/v3/info", op="probe")
+        assert watchdog.snapshot()[FEISHU]["consecutive_failures"] == 1
+    finally:
+        watchdog.stop()
+        http_session.close()
+
+
+POLICY = {
+    "poll_interval": 0.02,
+    "ack_timeout": 0.2,
+    "stages": [
+        {"after": 0, "action": "group_card", "required": True},
+        {"after": 0, "action": "sms"},
+        {"after": 0.1, "action": "voice"},
+    ],
+}
+
+
+def test_degraded_feishu_routes_around_failed_card():
+    notifier = FakeNotifier(card_ok=False)
+    aliyun = FakeAliyun()
+    watchdog = HealthWatchdog(interval=60)
+    watchdog.add_channel(FEISHU, lambda: False)
+    watchdog.probe_all()
+    watchdog.probe_all()
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(notifier, aliyun, policy=POLICY, scheduler=scheduler, voice=FakeVoice(),
+                              watchdog=watchdog)
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        # 飞书降级：短信先发，卡片失败不终止报警，语音电话照常升级
+        assert state.status == TIMEOUT
+        assert aliyun.sent == 1
+        assert engine.voice.calls == 1
+    finally:
+        scheduler.shutdown()
+
+    # 没有看门狗时保持原来的行为：卡片失败直接终止
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(FakeNotifier(card_ok=False), FakeAliyun(), policy=POLICY, scheduler=scheduler,
+                              voice=FakeVoice())
+    try:
+        state = engine.start("fire.jpg")
+        assert engine.wait(state, timeout=2)
+        assert state.status == FAILED
+        assert engine.voice.calls == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_stage_failures_do_not_degrade_channel():
+    watchdog = HealthWatchdog(interval=60).add_channel(FEISHU)
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(FakeNotifier(card_ok=False), FakeAliyun(), policy=POLICY, scheduler=scheduler,
+                              watchdog=watchdog)
+    try:
+        for _ in range(3):
+            state = engine.start("fire.jpg")
+            assert engine.wait(state, timeout=2)
+        # 报警阶段整体失败 (这里是卡片没发出去) 不代表渠道不可用，只有接口层逐次上报才计入
+        assert watchdog.is_healthy(FEISHU)
+        assert watchdog.snapshot()[FEISHU]["consecutive_failures"] == 0
+    finally:
+        scheduler.shutdown()
+
+
+def degraded_feishu_watchdog():
+    watchdog = HealthWatchdog(interval=60).add_channel(FEISHU).add_channel(ALIYUN_VOICE)
+    for _ in range(2):
+        watchdog.record(FEISHU, False, 0.01)
+    assert not watchdog.is_healthy(FEISHU) and watchdog.is_healthy(ALIYUN_VOICE)
+    return watchdog
+
+
+@pytest.mark.parametrize("hedge", [True, False])
+def test_degraded_feishu_calls_voice_without_waiting(hedge):
+    policy = config.ESCALATION_POLICY
+    if not hedge:
+        policy = dict(policy, stages=[{k: v for k, v in stage.items() if k != "hedge"} for stage in policy["stages"]])
+    voice = FakeVoice()
+    scheduler = TimerScheduler(max_workers=2)
+    engine = EscalationEngine(FakeNotifier(card_ok=False), FakeAliyun(), policy=policy, scheduler=scheduler,
+                              voice=voice, watchdog=degraded_feishu_watchdog())
+    try:
+        state = engine.start("fire.jpg")
+        deadline = time.time() + 2
+        while voice.calls == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        # 飞书降级：卡片失败不终止报警，短信照发，语音电话立即打出而不是等满 ack_timeout (180 秒)
+        assert voice.calls == 1
+        assert engine.aliyun.sent == 1
+        assert not state.done
+        time.sleep(0.1)
+        assert voice.calls == 1
+        engine.acknowledge(state.incident_id)
+    finally:
+        scheduler.shutdown()
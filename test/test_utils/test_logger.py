@@ -0,0 +1,63 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from utils import logger as logger_module
+from utils.logger import JsonFormatter, configure_logging, setup_logger, shutdown_logging
+
+
+@pytest.fixture
+def restore_logging():
+    yield
+    shutdown_logging()
+    configure_logging()
+
+
+def test_json_formatter_carries_incident_fields():
+    record = logging.LogRecord("Communication", logging.INFO, __file__, 1, "阶段 %s 完成", ("sms",), None)
+    record.incident_id = "alarm-1"
+    record.step = "sms"
+    record.elapsed_ms = 12.5
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "阶段 sms 完成"
+    assert entry["incident_id"] == "alarm-1"
+    assert entry["step"] == "sms" and entry["elapsed_ms"] == 12.5
+    assert "duration_ms" not in entry
+
+
+def test_queue_mode_writes_on_background_thread(tmp_path, restore_logging):
+    log_file = tmp_path / "logs" / "fire.log"
+    configure_logging(use_queue=True, json_format=True, log_file=log_file)
+    log = setup_logger("TestQueue")
+
+    writer_threads = []
+    target = logger_module._listener.handlers[-1]
+    original_emit = target.emit
+
+    def _emit(record):
+        writer_threads.append(threading.current_thread())
+        original_emit(record)
+
+    target.emit = _emit
+    log.info("检测到明火", extra={"incident_id": "alarm-7", "step": "group_card"})
+    shutdown_logging()
+
+    assert writer_threads and threading.current_thread() not in writer_threads
+    lines = log_file.read_text(encoding="utf-8").splitlines()
+    entry = json.loads(lines[-1])
+    assert entry["msg"] == "检测到明火" and entry["incident_id"] == "alarm-7"
+
+
+def test_below_level_is_not_queued(restore_logging):
+    configure_logging(use_queue=True, level=logging.INFO)
+    log = setup_logger("TestLevel")
+    queue = logger_module._listener.queue
+    logger_module._listener.stop()
+
+    log.debug("不会出现 %s", object())
+    assert queue.empty()
+    log.info("会出现")
+    assert queue.qsize() == 1
+    logger_module._listener.start()
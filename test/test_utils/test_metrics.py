@@ -0,0 +1,60 @@
+import json
+import urllib.request
+
+import pytest
+
+from utils.metrics import Histogram, MetricsRegistry, MetricsServer
+
+
+def test_histogram_quantiles_from_buckets():
+    hist = Histogram(buckets=(0.1, 0.5, 1, 5))
+    for value in [0.05] * 90 + [0.8] * 9 + [3]:
+        hist.observe(value)
+    assert hist.quantile(0.5) == 0.1
+    assert hist.quantile(0.99) == 1
+    assert hist.quantile(1.0) == 3
+    assert hist.summary()["count"] == 100
+
+
+def test_span_records_latency_and_result():
+    registry = MetricsRegistry()
+    with registry.span("feishu_api", op="send_card"):
+        pass
+    with registry.span("feishu_api", op="send_card") as span:
+        span.fail()
+    with pytest.raises(RuntimeError):
+        with registry.span("feishu_api", op="send_card"):
+            raise RuntimeError("timeout")
+
+    assert registry.counter_value("feishu_api_total", op="send_card", result="ok") == 1
+    assert registry.counter_value("feishu_api_total", op="send_card", result="error") == 2
+    assert registry.histogram("feishu_api_seconds", op="send_card")["count"] == 3
+    snap = registry.snapshot()
+    assert snap["counters"]["feishu_api_total"]["op=send_card,result=error"] == 2
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry(buckets=(1, 10))
+    registry.observe("alarm_time_to_ack_seconds", 4)
+    registry.inc("alarm_incidents_total", status="acked")
+    text = registry.render_prometheus()
+    assert "# TYPE alarm_incidents_total counter" in text
+    assert 'alarm_incidents_total{status="acked"} 1' in text
+    assert 'alarm_time_to_ack_seconds_bucket{le="1"} 0' in text
+    assert 'alarm_time_to_ack_seconds_bucket{le="10"} 1' in text
+    assert 'alarm_time_to_ack_seconds_bucket{le="+Inf"} 1' in text
+    assert "alarm_time_to_ack_seconds_count 1" in text
+
+
+def test_metrics_server_endpoints():
+    registry = MetricsRegistry()
+    registry.inc("aliyun_sms_retries_total", code="Throttling")
+    server = MetricsServer(port=0, registry=registry).start()
+    try:
+        base = f"http://127.0.0.1:{server.port}"
+        text = urllib.request.urlopen(f"{base}/metrics", timeout=5).read().decode()
+        assert 'aliyun_sms_retries_total{code="Throttling"} 1' in text
+        snap = json.loads(urllib.request.urlopen(f"{base}/metrics.json", timeout=5).read())
+        assert snap["counters"]["aliyun_sms_retries_total"] == {"code=Throttling": 1}
+    finally:
+        server.stop()
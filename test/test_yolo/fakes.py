@@ -0,0 +1,39 @@
+"""
+检测模块测试共用的替身
+"""
+import time
+
+import numpy as np
+
+IMGSZ = 64
+
+
+def mean_detector():
+    """检测进程里创建的假检测器：画面均值超过阈值就报一个框"""
+    def detect(frame):
+        return [(0, 0, 1, 1, float(frame.mean()) / 255, 0)]
+    return detect
+
+
+class FakeBackend:
+    """
+    假模型：每张图输出一个居中的框，fire 分数 = 画面均值 (可以据此核对结果是否回到了对应的摄像头)
+    记录每批的批大小
+    """
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+
+    def __call__(self, batch):
+        self.calls.append(len(batch))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("boom")
+        n, _, h, w = batch.shape
+        pred = np.zeros((n, 6, 1), dtype=np.float32)
+        pred[:, :4, 0] = (w / 2, h / 2, w / 4, h / 4)
+        pred[:, 4, 0] = batch.mean(axis=(1, 2, 3))
+        return pred
@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+
+from core.yolo.capture import MultiCameraCapture, SyntheticSource
+from core.yolo.prefilter import PrefilterConfig
+from core.yolo.ring_buffer import FrameRing
+from test_yolo.fakes import mean_detector
+
+SHAPE = (48, 64, 3)
+
+
+def test_ring_returns_latest_frame_without_copying():
+    ring = FrameRing.create(SHAPE, slots=3)
+    try:
+        for value in (1, 2, 3, 4, 5):
+            ring.write(np.full(SHAPE, value, dtype=np.uint8), ts=float(value))
+        seq, ts, frame = ring.latest()
+        # 旧帧被覆盖，只拿到最新的
+        assert (seq, ts) == (5, 5.0)
+        assert frame[0, 0, 0] == 5
+        assert np.shares_memory(frame, ring.frames)
+        assert ring.latest(after_seq=5) is None
+        assert ring.is_current(5)
+        # 再写 3 帧后第 5 帧的槽位被重用
+        for value in (6, 7, 8):
+            ring.write(np.full(SHAPE, value, dtype=np.uint8), ts=float(value))
+        assert not ring.is_current(5)
+    finally:
+        ring.close()
+
+
+def test_attach_sees_writes_from_other_handle():
+    ring = FrameRing.create(SHAPE, slots=2)
+    reader = FrameRing.attach(ring.name, SHAPE, slots=2)
+    try:
+        seq, view = ring.begin_write()
+        view[:] = 7
+        # 提交前读取方看不到
+        assert reader.latest() is None
+        ring.commit(seq, 1.0)
+        assert reader.latest()[2].mean() == 7
+    finally:
+        reader.close()
+        ring.close()
+
+
+def test_multi_camera_capture_end_to_end():
+    sources = {f"cam{i}": SyntheticSource(fps=200, seed=i) for i in range(3)}
+    with MultiCameraCapture(sources, mean_detector, frame_shape=SHAPE, workers=2) as capture:
+        seen = {}
+        deadline = time.time() + 20
+        while len(seen) < 3 and time.time() < deadline:
+            result = capture.get(timeout=0.5)
+            if result is not None:
+                seen.setdefault(result.camera_id, result)
+        assert set(seen) == set(sources)
+        result = seen["cam0"]
+        assert result.seq >= 1 and result.latency >= 0
+        assert 0 < result.detections[0][4] < 1
+        assert all(n > 0 for n in capture.frames_written().values())
+
+
+def test_prefilter_skips_static_frames_in_detector_process():
+    sources = {"cam0": SyntheticSource(fps=200, fire_every=50)}
+    capture = MultiCameraCapture(sources, mean_detector, frame_shape=SHAPE, workers=1,
+                                 prefilter=PrefilterConfig(stride=2, force_interval=60))
+    with capture:
+        deadline = time.time() + 20
+        while time.time() < deadline:
+            stats = capture.stats()["cam0"]
+            if stats["filtered"] > 100 and stats["inferred"] >= 3:
+                break
+            time.sleep(0.05)
+    # 静态画面被跳过，周期出现的火焰色块 (以及色块消失时的画面变化) 才送去检测
+    assert stats["skip_rate"] > 0.5
+    assert stats["inferred"] >= 3
+    assert stats["prefilter_us"] is not None and stats["detect_us"] is not None
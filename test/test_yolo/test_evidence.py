@@ -0,0 +1,176 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from core.yolo.evidence import EvidenceRecorder, FrameHistory, RetentionPolicy, thumbnail_strip
+
+SHAPE = (24, 32, 3)
+
+
+def fake_jpeg(frame, quality):
+    """测试环境没有 OpenCV / Pillow：把画面的第一个像素值写进文件，用来核对写的是哪一帧"""
+    return b"JPEG" + bytes([int(frame[0, 0, 0])]) + bytes(frame.shape[1] // 8)
+
+
+def frame(value):
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+def make_recorder(tmp_path, **kwargs):
+    kwargs.setdefault("pre_seconds", 1)
+    kwargs.setdefault("post_seconds", 1)
+    kwargs.setdefault("fps", 10)
+    return EvidenceRecorder(directory=tmp_path, encoder=fake_jpeg, **kwargs).start()
+
+
+def test_history_overwrites_oldest_and_finds_nearest_frame():
+    history = FrameHistory(SHAPE, capacity=3)
+    for seq in range(1, 6):
+        history.push(frame(seq), seq, ts=float(seq))
+    image, seq, ts = history.snapshot(4)
+    assert (seq, ts, image[0, 0, 0]) == (4, 4.0, 4)
+    # 序号 2 已被覆盖，取不到比它更早的帧时退回最新帧
+    assert history.snapshot(2)[1] == 5
+    frames, ts = history.window(3.5, 10)
+    assert ts.tolist() == [4.0, 5.0]
+    assert frames[:, 0, 0, 0].tolist() == [4, 5]
+
+
+def test_trigger_writes_snapshot_without_blocking(tmp_path):
+    def slow_jpeg(frame, quality):
+        time.sleep(0.3)
+        return fake_jpeg(frame, quality)
+
+    recorder = EvidenceRecorder(directory=tmp_path, encoder=slow_jpeg, pre_seconds=1, post_seconds=0, fps=10).start()
+    try:
+        now = time.time()
+        for seq in range(1, 4):
+            recorder.push("cam0", frame(seq * 10), seq, ts=now - 0.3 + seq * 0.1)
+        saved = []
+        begin = time.perf_counter()
+        future = recorder.trigger("cam0", seq=2, on_alarm=saved.append)
+        assert time.perf_counter() - begin < 0.1
+        path = future.result(timeout=5)
+        assert path.endswith(".jpg") and os.path.dirname(path) == str(tmp_path)
+        assert open(path, "rb").read()[4] == 20
+        assert saved == [path]
+    finally:
+        recorder.stop()
+
+
+def test_clip_and_strip_written_after_post_event_window(tmp_path):
+    recorder = make_recorder(tmp_path)
+    try:
+        base = time.time()
+        for seq in range(1, 16):
+            recorder.push("cam0", frame(seq), seq, ts=base + seq * 0.1)
+        recorder.trigger("cam0", seq=15).result(timeout=5)
+        assert recorder.stats()["waiting"] == 1
+        # 事后 1 秒的画面录满后写录像
+        for seq in range(16, 27):
+            recorder.push("cam0", frame(seq), seq, ts=base + seq * 0.1)
+        deadline = time.time() + 5
+        while recorder.stats()["clips"] < 1 and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        recorder.stop()
+
+    clip = next(tmp_path.glob("cam0_*_clip"))
+    # 触发帧 (1.5s) 前后各 1 秒：0.5s ~ 2.5s，即序号 5 ~ 25
+    assert len(list(clip.iterdir())) == 21
+    assert next(tmp_path.glob("cam0_*_strip.jpg")).exists()
+
+
+def test_stop_flushes_pending_clips(tmp_path):
+    recorder = make_recorder(tmp_path, post_seconds=60)
+    recorder.push("cam0", frame(1), 1)
+    recorder.trigger("cam0").result(timeout=5)
+    recorder.stop()
+    assert recorder.stats()["clips"] == 1
+    assert len(list(next(tmp_path.glob("*_clip")).iterdir())) == 1
+
+
+def test_trigger_without_frames_fails_fast(tmp_path):
+    recorder = make_recorder(tmp_path)
+    try:
+        with pytest.raises(LookupError):
+            recorder.trigger("cam9").result(timeout=1)
+    finally:
+        recorder.stop()
+
+
+def test_alarm_callback_runs_even_when_snapshot_fails(tmp_path):
+    def broken_jpeg(frame, quality):
+        raise RuntimeError("需要安装 opencv-python 或 Pillow")
+
+    alarms = []
+    recorder = EvidenceRecorder(directory=tmp_path, encoder=broken_jpeg, fps=10).start()
+    try:
+        # 没有历史画面：立即回调
+        recorder.trigger("cam9", on_alarm=alarms.append)
+        assert alarms == [None]
+        # 编码失败：写盘线程里回调
+        recorder.push("cam0", frame(1), 1)
+        future = recorder.trigger("cam0", on_alarm=alarms.append)
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+        deadline = time.time() + 5
+        while len(alarms) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert alarms == [None, None]
+    finally:
+        recorder.stop()
+    # 写盘线程已停止：也不会丢报警
+    recorder.trigger("cam0", on_alarm=alarms.append)
+    assert alarms == [None, None, None]
+
+
+def test_push_samples_at_configured_fps(tmp_path):
+    recorder = EvidenceRecorder(directory=tmp_path, encoder=fake_jpeg, fps=5)
+    kept = [recorder.push("cam0", frame(i), i, ts=100 + i * 0.05) for i in range(20)]
+    assert sum(kept) == 5
+    assert recorder.histories["cam0"].capacity == (3 + 2) * 5 + 2
+
+
+def test_thumbnail_strip_shape():
+    frames = np.stack([np.full((240, 320, 3), i, dtype=np.uint8) for i in range(10)])
+    strip = thumbnail_strip(frames, count=4, height=120)
+    assert strip.shape == (120, 4 * 160, 3)
+    assert strip[0, ::160, 0].tolist() == [0, 3, 6, 9]
+
+
+def test_retention_removes_oldest_and_expired_files(tmp_path):
+    now = time.time()
+    for i in range(5):
+        path = tmp_path / f"f{i}.jpg"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (now - 100 + i, now - 100 + i))
+    old = tmp_path / "old.jpg"
+    old.write_bytes(b"x")
+    os.utime(old, (now - 40 * 86400, now - 40 * 86400))
+
+    removed = RetentionPolicy(max_bytes=300, max_age_days=30).apply(tmp_path, now=now)
+    assert removed == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["f2.jpg", "f3.jpg", "f4.jpg"]
+
+
+def test_tap_samples_frames_from_capture(tmp_path):
+    from core.yolo.capture import MultiCameraCapture, SyntheticSource
+    from test_yolo.fakes import mean_detector
+
+    recorder = make_recorder(tmp_path, fps=20)
+    sources = {"cam0": SyntheticSource(fps=100, fire_every=3)}
+    with MultiCameraCapture(sources, mean_detector, frame_shape=SHAPE, workers=1) as capture:
+        # 先停 recorder 再停 capture：采样线程读的是 capture 的共享内存
+        try:
+            recorder.tap(capture)
+            deadline = time.time() + 20
+            while recorder.histories.get("cam0") is None or recorder.histories["cam0"].count < 5:
+                assert time.time() < deadline
+                time.sleep(0.05)
+            path = recorder.trigger("cam0").result(timeout=5)
+        finally:
+            recorder.stop()
+    assert os.path.exists(path)
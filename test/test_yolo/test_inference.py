@@ -0,0 +1,122 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from core.yolo.capture import MultiCameraCapture, SyntheticSource
+from core.yolo.detector import Letterbox, decode, nms
+from core.yolo.inference import BatchInferenceEngine
+from test_yolo.fakes import IMGSZ, FakeBackend
+
+
+def frame(value, shape=(IMGSZ, IMGSZ, 3)):
+    """正方形画面，letterbox 后没有灰边，假模型算出的均值就是 value"""
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_letterbox_keeps_aspect_ratio_and_maps_boxes_back():
+    image, meta = Letterbox(64)(frame(200, (32, 64, 3)))
+    scale, top, left = meta
+    assert image.shape == (64, 64, 3)
+    assert (scale, top, left) == (1.0, 16, 0)
+    assert image[0, 0, 0] == 114 and image[32, 32, 0] == 200
+
+    # letterbox 坐标里的框 (中心 32,32 宽高 16) 换算回原图 (32x64) 应该去掉上方 16 像素的灰边
+    pred = np.array([[32], [32], [16], [16], [0.9], [0.1]], dtype=np.float32)
+    det = decode(pred, meta, (32, 64, 3))
+    np.testing.assert_allclose(det[0], [24, 8, 40, 24, 0.9, 0], atol=1e-4)
+
+
+def test_nms_suppresses_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]], dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.7], dtype=np.float32)
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+
+
+def test_frames_from_all_cameras_are_batched_and_routed_back():
+    backend = FakeBackend()
+    with BatchInferenceEngine(backend, max_batch=4, max_delay_ms=500, imgsz=IMGSZ) as engine:
+        futures = engine.submit_all({f"cam{i}": frame(80 + i * 20) for i in range(8)})
+        results = {cid: f.result(timeout=5) for cid, f in futures.items()}
+    # 8 帧凑满两批，不用等到期
+    assert backend.calls == [4, 4]
+    for i in range(8):
+        assert results[f"cam{i}"][0, 4] == pytest.approx((80 + i * 20) / 255, abs=1e-3)
+    assert engine.stats()["avg_batch"] == 4
+
+
+def test_partial_batch_runs_when_deadline_expires():
+    backend = FakeBackend()
+    with BatchInferenceEngine(backend, max_batch=8, max_delay_ms=30, imgsz=IMGSZ) as engine:
+        begin = time.perf_counter()
+        engine.submit("cam0", frame(100)).result(timeout=5)
+        elapsed = time.perf_counter() - begin
+    assert backend.calls == [1]
+    assert 0.02 <= elapsed < 1
+
+
+def test_newer_frame_replaces_pending_frame_of_same_camera():
+    backend = FakeBackend(delay=0.1)
+    with BatchInferenceEngine(backend, max_batch=1, max_delay_ms=0, imgsz=IMGSZ) as engine:
+        engine.submit("busy", frame(10))
+        time.sleep(0.03)  # 第一批正在推理
+        old = engine.submit("cam0", frame(50))
+        new = engine.submit("cam0", frame(150))
+        assert new.result(timeout=5)[0, 4] == pytest.approx(150 / 255, abs=1e-3)
+    assert old.cancelled()
+    assert engine.stats()["replaced"] == 1
+
+
+def test_backend_error_is_set_on_every_future_in_the_batch():
+    with BatchInferenceEngine(FakeBackend(fail=True), max_batch=2, max_delay_ms=500, imgsz=IMGSZ) as engine:
+        futures = engine.submit_all({"cam0": frame(1), "cam1": frame(2)})
+        for future in futures.values():
+            with pytest.raises(RuntimeError, match="boom"):
+                future.result(timeout=5)
+
+
+def test_submit_is_thread_safe_and_frames_are_copied_on_submit():
+    backend = FakeBackend(delay=0.005)
+    with BatchInferenceEngine(backend, max_batch=4, max_delay_ms=5, imgsz=IMGSZ, latest_only=False) as engine:
+        futures = []
+        lock = threading.Lock()
+
+        def camera(value):
+            image = frame(value)
+            for _ in range(10):
+                future = engine.submit(f"cam{value}", image)
+                image[:] = 0  # submit 返回后调用方可以马上覆盖画面
+                image[:] = value
+                with lock:
+                    futures.append((value, future))
+
+        threads = [threading.Thread(target=camera, args=(v,)) for v in (90, 150, 210)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        done = [(v, f.result(timeout=5)) for v, f in futures if not f.cancelled()]
+    assert done
+    for value, det in done:
+        assert det[0, 4] == pytest.approx(value / 255, abs=1e-3)
+
+
+def fake_engine():
+    """检测进程里创建的推理引擎 (假模型)"""
+    return BatchInferenceEngine(FakeBackend(), max_batch=4, max_delay_ms=20, imgsz=IMGSZ).start()
+
+
+def test_capture_batches_frames_through_engine():
+    sources = {f"cam{i}": SyntheticSource(fps=200, seed=i) for i in range(3)}
+    with MultiCameraCapture(sources, fake_engine, frame_shape=(48, 64, 3), workers=1) as capture:
+        seen = {}
+        deadline = time.time() + 20
+        while len(seen) < 3 and time.time() < deadline:
+            result = capture.get(timeout=0.5)
+            if result is not None:
+                seen.setdefault(result.camera_id, result)
+        stats = capture.stats()
+    assert set(seen) == set(sources)
+    assert seen["cam1"].detections.shape[1] == 6
+    assert all(s["inferred"] > 0 and s["detect_us"] is not None for s in stats.values())
@@ -0,0 +1,51 @@
+import numpy as np
+
+from core.yolo.prefilter import FramePrefilter, PrefilterConfig, flame_ratio, SKIP, MOTION, COLOR, FORCED, FIRST
+
+SHAPE = (480, 640, 3)
+
+
+def noisy_background(rng):
+    base = np.full(SHAPE, 70, dtype=np.uint8)
+    return base + rng.integers(0, 4, size=SHAPE, dtype=np.uint8)
+
+
+def test_flame_ratio_detects_orange_not_grey_or_blue():
+    frame = np.full((10, 10, 3), 80, dtype=np.uint8)
+    assert flame_ratio(frame) == 0
+    frame[:5] = (0, 140, 255)     # BGR 橙色
+    frame[5:7] = (255, 120, 0)    # 蓝色
+    assert flame_ratio(frame) == 0.5
+
+
+def test_static_scene_is_mostly_skipped_with_forced_safety_net():
+    rng = np.random.default_rng(0)
+    prefilter = FramePrefilter(PrefilterConfig(force_interval=1.0))
+    decisions = [prefilter.check(noisy_background(rng), now=i / 30) for i in range(300)]
+    assert decisions[0] == FIRST
+    # 10 秒静止画面：每秒兜底检测一次，其余全部跳过
+    assert decisions.count(FORCED) == 9
+    assert decisions.count(MOTION) == decisions.count(COLOR) == 0
+    assert prefilter.skip_rate > 0.95
+    stats = prefilter.stats()
+    assert set(stats["cost_us"]) == {"downscale", "motion", "color"}
+
+
+def test_motion_and_flame_colour_trigger_inference():
+    rng = np.random.default_rng(1)
+    prefilter = FramePrefilter(PrefilterConfig(force_interval=60))
+    for i in range(30):
+        prefilter.check(noisy_background(rng), now=i / 30)
+
+    # 有人走过：大块区域亮度变化
+    moved = noisy_background(rng)
+    moved[100:300, 200:400] = 200
+    assert prefilter.check(moved, now=1.1) == MOTION
+    for i in range(5):
+        prefilter.check(noisy_background(rng), now=1.2 + i / 30)
+
+    # 小块火焰：画面变化很小，但火焰色占比超过基线
+    fire = noisy_background(rng)
+    fire[200:232, 300:332] = (0, 140, 255)
+    assert prefilter.check(fire, now=2.0) == COLOR
+    assert prefilter.check(noisy_background(rng), now=2.1) in (SKIP, MOTION)
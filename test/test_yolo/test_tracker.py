@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from core.yolo.capture import FrameResult
+from core.yolo.tracker import AlarmGate, CameraTracker, TrackerConfig, iou_matrix
+
+FIRE = [100, 100, 200, 200, 0.8, 0]
+
+
+def box(x=100, y=100, size=100, conf=0.8, cls=0):
+    return [x, y, x + size, y + size, conf, cls]
+
+
+def feed(tracker, frames):
+    """依次送入每帧的检测框，返回每帧产生的报警数"""
+    return [len(tracker.update(dets, seq=i)) for i, dets in enumerate(frames)]
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [50, 50, 60, 60]], dtype=np.float32)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1, 1 / 3, 0], [0, 0, 0]], atol=1e-6)
+
+
+def test_single_frame_false_positive_never_alarms():
+    tracker = CameraTracker("cam0")
+    assert sum(feed(tracker, [[FIRE]] + [[]] * 20)) == 0
+    assert tracker.track_count == 0
+
+
+def test_persistent_detection_alarms_once_after_n_of_m():
+    tracker = CameraTracker("cam0", TrackerConfig(confirm_hits=3, confirm_window=5))
+    # 框有轻微抖动，仍关联到同一条轨迹；第 3 帧确认，之后不重复报警
+    frames = [[box(100 + i, 100 - i)] for i in range(10)]
+    assert feed(tracker, frames) == [0, 0, 1, 0, 0, 0, 0, 0, 0, 0]
+    assert tracker.track_count == 1
+
+
+def test_intermittent_detection_must_fall_inside_window():
+    cfg = TrackerConfig(confirm_hits=3, confirm_window=5, min_conf=0.1)
+    # 隔帧检测到：5 帧内 3 帧，第 5 帧确认
+    assert feed(CameraTracker("a", cfg), [[FIRE], [], [FIRE], [], [FIRE]]) == [0, 0, 0, 0, 1]
+    # 每 3 帧一次：任何 5 帧窗口里最多 2 帧，不报警
+    assert sum(feed(CameraTracker("b", cfg), [[FIRE], [], []] * 5)) == 0
+
+
+def test_low_confidence_is_gated_by_ema():
+    tracker = CameraTracker("cam0", TrackerConfig(min_conf=0.4))
+    assert sum(feed(tracker, [[box(conf=0.3)]] * 10)) == 0
+    # 置信度升高后 EMA 逐步追上，超过阈值才报警
+    events = [tracker.update([box(conf=0.9)]) for _ in range(5)]
+    first = next(e for e in events if e)
+    assert first[0].conf >= 0.4
+
+
+def test_tracks_are_separated_by_class_and_position():
+    tracker = CameraTracker("cam0", TrackerConfig(confirm_hits=2, confirm_window=3))
+    frame = [box(), box(cls=1), box(x=400)]
+    feed(tracker, [frame, frame])
+    assert tracker.track_count == 3
+    assert tracker.alarms == 3
+    assert len(set(tracker.track_ids[:3].tolist())) == 3
+
+
+def test_expired_track_alarms_again_when_fire_reappears():
+    tracker = CameraTracker("cam0", TrackerConfig(confirm_hits=2, confirm_window=3, max_age=3))
+    first = feed(tracker, [[FIRE]] * 3)
+    assert first == [0, 1, 0]
+    feed(tracker, [[]] * 4)
+    assert tracker.track_count == 0
+    assert feed(tracker, [[FIRE]] * 2) == [0, 1]
+
+
+def test_capacity_keeps_most_confident_boxes():
+    tracker = CameraTracker("cam0", TrackerConfig(max_tracks=2))
+    tracker.update([box(x=0, conf=0.3), box(x=200, conf=0.9), box(x=400, conf=0.6)])
+    assert tracker.track_count == 2
+    np.testing.assert_allclose(sorted(tracker.ema[:2].tolist()), [0.6, 0.9], atol=1e-6)
+
+
+def test_expiry_keeps_remaining_tracks_aligned():
+    tracker = CameraTracker("cam0", TrackerConfig(confirm_hits=1, confirm_window=1, max_age=1, min_conf=0.1))
+    tracker.update([box(x=0), box(x=400)])
+    # 左边的目标消失后被删除，右边的轨迹移到前面，状态保持不变
+    for _ in range(3):
+        tracker.update([box(x=400)])
+    assert tracker.track_count == 1
+    assert tracker.boxes[0, 0] == 400
+    assert tracker.track_ids[0] == 2
+    assert tracker.alarmed[0]
+
+
+def test_gate_forwards_confirmed_events_per_camera():
+    received = []
+    gate = AlarmGate(received.append, TrackerConfig(confirm_hits=2, confirm_window=3))
+    for seq in range(3):
+        gate.process(FrameResult("cam0", seq, 1000.0 + seq, np.array([FIRE], dtype=np.float32), 0, 0.01))
+        gate.update("cam1", [] if seq else [FIRE], seq=seq)
+    assert [(e.camera_id, e.seq, e.ts) for e in received] == [("cam0", 1, 1001.0)]
+    assert received[0].box == pytest.approx((100, 100, 200, 200))
+    assert gate.stats()["cam0"]["alarms"] == 1
+    assert gate.stats()["cam1"]["alarms"] == 0
+
+
+def test_gate_survives_failing_callback():
+    def boom(event):
+        raise RuntimeError("notifier down")
+
+    gate = AlarmGate(boom, TrackerConfig(confirm_hits=1, confirm_window=1))
+    assert len(gate.update("cam0", [FIRE])) == 1
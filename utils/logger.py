@@ -1,6 +1,154 @@
 # utils/logger.py
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+# 日志格式 (时间 - 模块名 - 等级 - 消息)
+# 比如: 2023-10-27 10:00:00 - Feishu - ERROR - 发送失败
+LOG_FORMAT = '%(asctime)s - %(name)s - [%(levelname)s] - %(message)s'
+
+# 日志文件默认放在项目根目录 output/logs 下
+DEFAULT_LOG_DIR = Path(__file__).resolve().parent.parent / "output" / "logs"
+DEFAULT_LOG_FILE = DEFAULT_LOG_DIR / "fire_detection.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# 报警相关的结构化字段，通过 extra={...} 传入，JSON 格式下单独输出
+CONTEXT_FIELDS = ("incident_id", "step", "elapsed_ms", "duration_ms")
+
+_lock = threading.Lock()
+_loggers = {}        # setup_logger 创建过的 logger
+_handlers = None     # 所有 logger 共用的 handler 列表
+_listener = None     # 队列模式下的后台写日志线程
+_level = logging.INFO
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    每条日志一行 JSON，方便 journald / ELK 之类的工具检索
+    带上报警 ID、步骤和耗时字段: logger.info("...", extra={"incident_id": ..., "step": ..., "elapsed_ms": ...})
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    只把日志记录放进队列，格式化 (时间、JSON、异常堆栈) 全部交给后台线程
+    默认的 QueueHandler 会在调用方线程里先格式化一遍，报警线程就白白多了这部分开销
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # 参数可能在之后被修改，先合成消息
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _build_handlers(json_format=False, log_file=None, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    formatter = JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+
+    # 控制台处理器 (输出到屏幕)
+    console_handler = logging.StreamHandler(sys.stdout)
+    handlers = [console_handler]
+
+    # 文件处理器 (按大小滚动，最多保留 backup_count 个旧文件)
+    if log_file:
+        log_file = DEFAULT_LOG_FILE if log_file is True else Path(log_file)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                            encoding="utf-8"))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(use_queue=False, level=logging.INFO, json_format=False, log_file=None,
+                      max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """
+    全局日志配置 (可选，在程序入口调用一次；不调用时与以前一样同步输出到控制台)
+    :param use_queue: 为 True 时日志先进内存队列，由后台线程写控制台 / 文件，报警线程不会被慢 IO 卡住
+    :param level: 日志级别，低于该级别的日志在调用处直接返回
+    :param json_format: 为 True 时每条日志输出一行 JSON (带 incident_id / step / elapsed_ms 等字段)
+    :param log_file: True 表示写到 output/logs/fire_detection.log，也可以传入具体路径
+    """
+    global _handlers, _listener, _level
+    with _lock:
+        for handler in _stop_listener_locked() or _handlers or ():
+            handler.close()
+        targets = _build_handlers(json_format, log_file, max_bytes, backup_count)
+        if use_queue:
+            _listener = QueueListener(queue.SimpleQueue(), *targets, respect_handler_level=False)
+            _listener.start()
+            _handlers = [_DeferredQueueHandler(_listener.queue)]
+        else:
+            _handlers = targets
+        _level = level
+
+        # 已经创建的 logger 也换成新的 handler
+        for logger in _loggers.values():
+            _attach(logger)
+
+
+def shutdown_logging():
+    """
+    停止后台写日志线程，并把队列里剩余的日志写完 (进程退出时自动调用)
+    之后的日志改回同步直接输出，不会丢失
+    """
+    global _handlers
+    with _lock:
+        targets = _stop_listener_locked()
+        if targets:
+            _handlers = targets
+            for logger in _loggers.values():
+                _attach(logger)
+
+
+def _stop_listener_locked():
+    """停止后台线程，返回它原来负责的 handler 列表"""
+    global _listener
+    if _listener is None:
+        return None
+    _listener.stop()
+    targets = list(_listener.handlers)
+    _listener = None
+    return targets
+
+
+def _attach(logger):
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    for handler in _handlers:
+        logger.addHandler(handler)
+    logger.setLevel(_level)
+
+
+atexit.register(shutdown_logging)
 
 
 # 使用方法 : self.logger = setup_logger("Feishu") 像这样创建实例,然后使用,需要先导入这个logger模块
@@ -10,27 +158,26 @@ def setup_logger(name):
     :param name: 模块名称，比如 "Feishu", "YOLO", "Main"
     :return: logger 对象
     """
+    global _handlers
     # 1. 创建 logger 实例
     logger = logging.getLogger(name)
 
-    # 2. 如果已经有 handler 了，就不要重复添加 (防止日志重复打印)
-    if logger.hasHandlers():
+    # 2. 已经配置过就直接返回 (防止日志重复打印)
+    if name in _loggers:
         return logger
 
-    # 3. 设置全局日志级别 (INFO 表示只显示 INFO, WARNING, ERROR, CRITICAL)
-    # 如果调试时想看更多细节，可以改成 logging.DEBUG
-    logger.setLevel(logging.INFO)
+    with _lock:
+        if name in _loggers:
+            return logger
+        # 3. 默认：同步输出到控制台 (所有 logger 共用同一个 handler)
+        if _handlers is None:
+            _handlers = _build_handlers()
+        _attach(logger)
+        _loggers[name] = logger
 
-    # 4. 创建控制台处理器 (输出到屏幕)
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-
-    # 5. 定义日志格式 (时间 - 模块名 - 等级 - 消息)
-    # 比如: 2023-10-27 10:00:00 - Feishu - ERROR - 发送失败
-    formatter = logging.Formatter('%(asctime)s - %(name)s - [%(levelname)s] - %(message)s')
-    console_handler.setFormatter(formatter)
+    return logger
 
-    # 6. 将处理器添加到 logger
-    logger.addHandler(console_handler)
 
-    return logger
+def elapsed_ms(start):
+    """从 start (time.time()) 到现在的毫秒数，用于日志里的耗时字段"""
+    return round((time.time() - start) * 1000, 1)
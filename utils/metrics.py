@@ -0,0 +1,272 @@
+# utils/metrics.py
+import json
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from utils.logger import setup_logger
+
+# 耗时直方图的分桶上限 (秒)：覆盖从单次接口调用 (毫秒级) 到等待人工确认 (分钟级)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 180, 300, 600)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """固定分桶的直方图 (与 Prometheus histogram 一致)，额外记录最大值"""
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """按分桶估算分位数 (返回所在桶的上限，最后一个桶返回最大值)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Span:
+    """
+    一次计时：with 块结束时记录耗时直方图 + 成功 / 失败计数
+    块内抛异常自动记为失败；接口返回错误码时调用 span.fail()
+    """
+
+    __slots__ = ("registry", "name", "labels", "start", "ok")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.start = None
+        self.ok = True
+
+    def fail(self):
+        self.ok = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        ok = self.ok and exc_type is None
+        self.registry.observe(f"{self.name}_seconds", duration, **self.labels)
+        self.registry.inc(f"{self.name}_total", result="ok" if ok else "error", **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    进程内指标登记处：计数器 + 耗时直方图
+    - 记录一次只是加锁后改几个数字，放在报警热路径上也没有负担
+    - snapshot() 给程序内部使用，render_prometheus() 给 /metrics 接口使用
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}     # name -> {label_key: value}
+        self._histograms = {}   # name -> {label_key: Histogram}
+
+    def span(self, name, **labels):
+        return Span(self, name, labels)
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(self.buckets)
+            hist.observe(value)
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def histogram(self, name, **labels):
+        """返回某个直方图的统计摘要，没有数据时返回 None"""
+        with self._lock:
+            hist = self._histograms.get(name, {}).get(_label_key(labels))
+            return hist.summary() if hist else None
+
+    def snapshot(self):
+        """
+        当前所有指标的快照 (普通 dict，可直接 json.dumps)
+        标签拼成 'op=send_card,result=ok' 形式的字符串作为 key
+        """
+        def fmt(key):
+            return ",".join(f"{k}={v}" for k, v in key)
+
+        with self._lock:
+            return {
+                "counters": {name: {fmt(k): v for k, v in series.items()}
+                             for name, series in self._counters.items()},
+                "histograms": {name: {fmt(k): h.summary() for k, h in series.items()}
+                               for name, series in self._histograms.items()},
+            }
+
+    def render_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """进程内共享的指标登记处"""
+    return _registry
+
+
+def span(name, **labels):
+    """
+    计时块，用法:
+        with metrics.span("feishu_api", op="send_card") as sp:
+            ...
+            if 出错: sp.fail()
+    """
+    return _registry.span(name, **labels)
+
+
+def inc(name, amount=1, **labels):
+    _registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    _registry.observe(name, value, **labels)
+
+
+def snapshot():
+    return _registry.snapshot()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        registry = self.server.registry
+        if self.path.split("?")[0] == "/metrics":
+            body = registry.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """
+    本地指标接口
+    - GET /metrics       Prometheus 文本格式
+    - GET /metrics.json  JSON 快照
+    默认只监听 127.0.0.1，端口取 .env 里的 metrics_port (默认 9100)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=None, registry=None):
+        self.logger = setup_logger("Metrics")
+        self.registry = registry or get_registry()
+        self._thread = None
+        if port is None:
+            port = int(config.get_env().get("metrics_port", "9100"))
+        super().__init__((host, port), _MetricsHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        self.logger.info("📈 指标接口已启动: http://%s:%s/metrics", self.server_address[0], self.port)
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)